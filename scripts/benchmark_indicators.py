@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+技术指标计算基准测试
+生成多年随机游走日线，分别测量：
+1. 逐只股票在整段历史上计算全部指标（compute_indicators）
+2. 日期对齐的全市场面板一次性计算（compute_panel）
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server import indicators
+
+TRADING_DAYS_PER_YEAR = 244
+
+
+def make_panel(days, symbols, seed=0):
+    """生成 (交易日 x 股票) 的收盘价、最高价、最低价与成交量矩阵"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (days, symbols)), axis=0))
+    high = close * (1 + rng.uniform(0, 0.03, (days, symbols)))
+    low = close * (1 - rng.uniform(0, 0.03, (days, symbols)))
+    volume = rng.uniform(1e5, 1e7, (days, symbols))
+    return close, high, low, volume
+
+
+def to_frame(close, high, low, volume, column):
+    """取出一只股票的日线 DataFrame（与本地K线库的列名一致）"""
+    return pd.DataFrame({
+        "开盘": close[:, column], "收盘": close[:, column],
+        "最高": high[:, column], "最低": low[:, column], "成交量": volume[:, column],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="技术指标计算基准测试")
+    parser.add_argument("--symbols", type=int, default=3000, help="股票数量 (默认: 3000)")
+    parser.add_argument("--years", type=int, default=12, help="每只股票的历史年数 (默认: 12)")
+    parser.add_argument("--single", type=int, default=200,
+                        help="逐只计算模式下抽样的股票数量，耗时按比例推算到全部股票 (默认: 200)")
+    args = parser.parse_args()
+
+    days = args.years * TRADING_DAYS_PER_YEAR
+    close, high, low, volume = make_panel(days, args.symbols)
+    print(f"数据规模: {args.symbols} 只股票 x {days} 个交易日 ({args.years} 年)")
+
+    sample = min(args.single, args.symbols)
+    frames = [to_frame(close, high, low, volume, i) for i in range(sample)]
+    started = time.perf_counter()
+    for frame in frames:
+        indicators.latest_indicators(frame)
+    elapsed = time.perf_counter() - started
+    per_symbol = elapsed / sample
+    print(f"逐只计算: {per_symbol * 1000:.2f} ms/只, 推算全部 {args.symbols} 只约 {per_symbol * args.symbols:.2f} s")
+
+    started = time.perf_counter()
+    panel = indicators.compute_panel(close, high, low, volume, [f"{i:06d}" for i in range(args.symbols)])
+    elapsed = time.perf_counter() - started
+    print(f"面板一次性计算: {elapsed:.2f} s ({elapsed / args.symbols * 1000:.3f} ms/只)")
+    print(panel.head().round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
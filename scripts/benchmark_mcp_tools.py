@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+MCP工具吞吐量与延迟基准测试
+以假 akshare 后端（可配置模拟网络延迟）代替真实上游，分别在进程内（直接调用
+FixedMCPServer.process_message）和 stdio 子进程两种方式下，按多个并发度统计每个工具的
+p50/p95/p99 延迟与每秒请求数，结果保存为 JSON，可用 --compare 与之前的结果对比
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 项目根目录
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+# 默认测试的工具
+DEFAULT_TOOLS = [
+    "echo",
+    "get_stock_spot",
+    "get_stock_history",
+    "get_stock_technical_indicators",
+    "get_stock_lhb_data",
+    "get_stock_spot_batch",
+]
+
+# 轮流请求的股票代码数量（不同代码不会命中彼此的缓存）
+SYMBOL_POOL = 50
+BATCH_SIZE = 20
+
+
+def symbols(count):
+    return [f"{600000 + i:06d}" for i in range(count)]
+
+
+def tool_arguments(tool, index, pool):
+    """第 index 个请求的参数"""
+    codes = symbols(pool)
+    symbol = codes[index % pool]
+    if tool == "echo":
+        return {"text": f"ping {index}"}
+    if tool == "calculate":
+        return {"expression": f"{index} * 3 + 1"}
+    if tool.endswith("_batch"):
+        start = index % pool
+        return {"symbols": [codes[(start + i) % pool] for i in range(BATCH_SIZE)]}
+    return {"symbol": symbol}
+
+
+def configure_environment(args):
+    """在导入服务器模块之前设置环境变量（配置在导入时读取）"""
+    os.environ.setdefault("FINANCE_MCP_DATA_DIR", args.data_dir or tempfile.mkdtemp(prefix="mcp-bench-"))
+    os.environ["FINANCE_MCP_WARMUP"] = "0"
+    if args.no_cache:
+        os.environ["FINANCE_MCP_DISABLE_CACHE"] = "1"
+    if not args.rate_limits:
+        # 假后端不需要保护，关闭按站点限速以测量服务器本身的开销
+        os.environ["FINANCE_MCP_RATE_LIMIT_DEFAULT"] = "0"
+        os.environ["FINANCE_MCP_RATE_LIMITS"] = "eastmoney=0,sina=0,baidu=0,10jqka=0"
+
+
+class FakeAkshare:
+    """按股票代码生成确定性数据的假 akshare 后端，每次调用休眠 ``latency`` 秒模拟网络"""
+
+    def __init__(self, latency=0.0, bars=500):
+        self.latency = latency
+        self.bars = bars
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def stock_zh_a_hist(self, symbol, period="daily", start_date="19700101", end_date="20500101", adjust=""):
+        import numpy as np
+        import pandas as pd
+
+        self._wait()
+        rng = np.random.default_rng(int(symbol))
+        end = datetime.now().date()
+        dates = pd.bdate_range(end=end, periods=self.bars)
+        close = 10 + np.cumsum(rng.normal(0, 0.2, self.bars))
+        frame = pd.DataFrame({
+            "日期": dates.strftime("%Y-%m-%d"),
+            "股票代码": symbol,
+            "开盘": close + rng.normal(0, 0.05, self.bars),
+            "收盘": close,
+            "最高": close + 0.2,
+            "最低": close - 0.2,
+            "成交量": rng.integers(10_000, 1_000_000, self.bars),
+            "成交额": rng.integers(1_000_000, 100_000_000, self.bars).astype(float),
+            "振幅": rng.uniform(0, 5, self.bars),
+            "涨跌幅": rng.normal(0, 1, self.bars),
+            "涨跌额": rng.normal(0, 0.1, self.bars),
+            "换手率": rng.uniform(0, 3, self.bars),
+        })
+        start = pd.Timestamp(start_date).strftime("%Y-%m-%d")
+        return frame[frame["日期"] >= start].reset_index(drop=True)
+
+    def stock_zh_a_spot_em(self):
+        import pandas as pd
+
+        self._wait()
+        codes = symbols(SYMBOL_POOL)
+        return pd.DataFrame({
+            "代码": codes, "名称": [f"股票{code}" for code in codes],
+            "最新价": 10.0, "涨跌幅": 1.0, "涨跌额": 0.1, "成交量": 1e6, "成交额": 1e7,
+            "最高": 10.5, "最低": 9.5, "今开": 9.9, "昨收": 9.9,
+        })
+
+    def stock_lhb_detail_em(self):
+        import pandas as pd
+
+        self._wait()
+        codes = symbols(SYMBOL_POOL)
+        return pd.DataFrame({
+            "代码": codes, "名称": [f"股票{code}" for code in codes],
+            "上榜日": (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"),
+            "收盘价": 10.0, "涨跌幅": 7.1, "龙虎榜净买额": 1234.5, "上榜原因": "日涨幅偏离值达7%的证券",
+        })
+
+
+def install_fake_backend(latency):
+    """让 finance_tools 的所有 akshare 调用改走假后端（仍经过缓存、合并与限速层）"""
+    from src.main.mcp_services.finance_server import finance_tools
+    from src.main.mcp_services.finance_server.data_cache import CachedAkshare
+
+    finance_tools.ak = CachedAkshare(FakeAkshare(latency), finance_tools.DATA_CACHE)
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(transport, tool, concurrency, latencies, errors, elapsed):
+    """单个场景的统计结果（延迟单位毫秒）"""
+    samples = sorted(latency * 1000 for latency in latencies)
+    return {
+        "transport": transport,
+        "tool": tool,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": errors,
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+        "mean_ms": round(statistics.fmean(samples), 3) if samples else 0.0,
+        "rps": round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def call_message(request_id, tool, arguments):
+    return json.dumps({
+        "jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+        "params": {"name": tool, "arguments": arguments},
+    })
+
+
+def is_error(response):
+    return "error" in response or bool(response.get("result", {}).get("isError"))
+
+
+# ---------- 进程内 ----------
+
+async def run_in_process(server, tool, concurrency, requests, pool, offset):
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(index):
+        nonlocal errors
+        async with slots:
+            message = call_message(index, tool, tool_arguments(tool, offset + index, pool))
+            started = time.perf_counter()
+            response = json.loads(await server.process_message(message))
+            latencies.append(time.perf_counter() - started)
+            if is_error(response):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    return summarize("in-process", tool, concurrency, latencies, errors, time.perf_counter() - started)
+
+
+def benchmark_in_process(args):
+    from src.main.mcp_services.finance_server.finance_server import FixedMCPServer
+
+    install_fake_backend(args.latency)
+    results = []
+
+    async def run_all():
+        server = FixedMCPServer(max_concurrency=args.max_concurrency)
+        try:
+            offset = 0
+            for tool in args.tools:
+                await run_in_process(server, tool, 1, args.warmup, args.pool, offset)
+                offset += args.warmup
+                for concurrency in args.concurrency:
+                    result = await run_in_process(server, tool, concurrency, args.requests, args.pool, offset)
+                    offset += args.requests
+                    results.append(result)
+                    print_row(result)
+        finally:
+            server.shutdown()
+
+    asyncio.run(run_all())
+    return results
+
+
+# ---------- stdio 子进程 ----------
+
+class StdioClient:
+    """Pipelines requests over a server subprocess's stdin/stdout."""
+
+    def __init__(self, args):
+        command = [sys.executable, str(Path(__file__).resolve()), "--serve", "--latency", str(args.latency)]
+        if args.max_concurrency:
+            command += ["--max-concurrency", str(args.max_concurrency)]
+        self.process = subprocess.Popen(
+            command, cwd=project_root, env=dict(os.environ),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            with self._lock:
+                waiter = self._waiting.pop(response.get("id"), None)
+            if waiter is not None:
+                waiter["response"] = response
+                waiter["finished"] = time.perf_counter()
+                waiter["event"].set()
+
+    def send(self, request_id, message):
+        waiter = {"event": threading.Event(), "started": time.perf_counter()}
+        with self._lock:
+            self._waiting[request_id] = waiter
+        self.process.stdin.write(message + "\n")
+        self.process.stdin.flush()
+        return waiter
+
+    def request(self, request_id, method, params=None):
+        waiter = self.send(request_id, json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method,
+                                                   "params": params or {}}))
+        waiter["event"].wait()
+        return waiter["response"]
+
+    def close(self):
+        self.process.stdin.close()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def run_stdio(client, tool, concurrency, requests, pool, offset, first_id):
+    slots = threading.Semaphore(concurrency)
+    waiters = []
+    started = time.perf_counter()
+    for index in range(requests):
+        slots.acquire()
+        request_id = first_id + index
+        waiter = client.send(request_id, call_message(request_id, tool, tool_arguments(tool, offset + index, pool)))
+        threading.Thread(target=lambda w=waiter: (w["event"].wait(), slots.release()), daemon=True).start()
+        waiters.append(waiter)
+    for waiter in waiters:
+        waiter["event"].wait()
+    elapsed = time.perf_counter() - started
+    latencies = [waiter["finished"] - waiter["started"] for waiter in waiters]
+    errors = sum(1 for waiter in waiters if is_error(waiter["response"]))
+    return summarize("stdio", tool, concurrency, latencies, errors, elapsed)
+
+
+def benchmark_stdio(args):
+    client = StdioClient(args)
+    results = []
+    try:
+        client.request(0, "initialize", {"protocolVersion": "2024-11-05", "capabilities": {},
+                                         "clientInfo": {"name": "benchmark", "version": "1.0"}})
+        next_id, offset = 1, 0
+        for tool in args.tools:
+            run_stdio(client, tool, 1, args.warmup, args.pool, offset, next_id)
+            next_id += args.warmup
+            offset += args.warmup
+            for concurrency in args.concurrency:
+                result = run_stdio(client, tool, concurrency, args.requests, args.pool, offset, next_id)
+                next_id += args.requests
+                offset += args.requests
+                results.append(result)
+                print_row(result)
+    finally:
+        client.close()
+    return results
+
+
+def serve(args):
+    """--serve：以假后端运行 stdio 服务器（供 stdio 基准测试启动的子进程使用）"""
+    from src.main.mcp_services.finance_server.finance_server import main as server_main
+
+    install_fake_backend(args.latency)
+    asyncio.run(server_main(max_concurrency=args.max_concurrency))
+
+
+# ---------- 输出与对比 ----------
+
+def print_header():
+    print(f"{'方式':<12}{'工具':<36}{'并发':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'req/s':>10}{'错误':>6}")
+
+
+def print_row(result):
+    print(f"{result['transport']:<12}{result['tool']:<36}{result['concurrency']:>6}"
+          f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+          f"{result['rps']:>10.1f}{result['errors']:>6}")
+
+
+def compare(results, baseline_path):
+    """与之前保存的结果逐项对比（正数表示变慢 / 吞吐下降）"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {
+            (item["transport"], item["tool"], item["concurrency"]): item
+            for item in json.load(f)["results"]
+        }
+    print(f"\n与 {baseline_path} 对比:")
+    print(f"{'方式':<12}{'工具':<36}{'并发':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}")
+
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    for result in results:
+        old = baseline.get((result["transport"], result["tool"], result["concurrency"]))
+        if old is None:
+            continue
+        print(f"{result['transport']:<12}{result['tool']:<36}{result['concurrency']:>6}"
+              f"{change(result['p50_ms'], old['p50_ms']):>10}{change(result['p95_ms'], old['p95_ms']):>10}"
+              f"{change(result['p99_ms'], old['p99_ms']):>10}{change(result['rps'], old['rps']):>10}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="测量MCP工具在不同并发度下的延迟分位数与吞吐量")
+    parser.add_argument("--tools", nargs="+", default=DEFAULT_TOOLS, help="要测试的工具")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32], help="并发度列表")
+    parser.add_argument("--requests", type=int, default=200, help="每个工具、每个并发度的请求数 (默认: 200)")
+    parser.add_argument("--warmup", type=int, default=5, help="每个工具正式测量前的预热请求数")
+    parser.add_argument("--pool", type=int, default=SYMBOL_POOL, help="轮流请求的股票代码数量")
+    parser.add_argument("--latency", type=float, default=0.02, help="假后端每次调用的模拟网络延迟（秒）")
+    parser.add_argument("--transport", choices=["in-process", "stdio", "both"], default="both")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="服务器同时执行的工具调用数量上限")
+    parser.add_argument("--no-cache", action="store_true", help="关闭数据缓存与工具结果缓存")
+    parser.add_argument("--rate-limits", action="store_true", help="保留按站点限速（默认关闭）")
+    parser.add_argument("--data-dir", default=None, help="数据目录（默认使用临时目录）")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件路径")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果 JSON 对比")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    args.pool = min(args.pool, SYMBOL_POOL)
+    configure_environment(args)
+    if args.serve:
+        serve(args)
+        return
+
+    print_header()
+    results = []
+    if args.transport in ("in-process", "both"):
+        results += benchmark_in_process(args)
+    if args.transport in ("stdio", "both"):
+        results += benchmark_stdio(args)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "latency": args.latency, "requests": args.requests, "pool": args.pool,
+            "max_concurrency": args.max_concurrency, "cache": not args.no_cache,
+            "rate_limits": args.rate_limits,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+MCP服务器启动耗时基准测试
+启动服务器子进程，测量 initialize 与第一次 tools/list 响应的耗时，
+对比立即导入（eager）、延迟导入+后台预热（lazy+warmup）与纯延迟导入（lazy）三种模式
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# 项目根目录
+project_root = Path(__file__).resolve().parent.parent
+
+SERVER_MODULE = "src.main.mcp_services.finance_server.finance_server"
+
+MODES = {
+    "eager": {"FINANCE_MCP_EAGER_IMPORTS": "1", "FINANCE_MCP_WARMUP": "0"},
+    "lazy+warmup": {"FINANCE_MCP_EAGER_IMPORTS": "0", "FINANCE_MCP_WARMUP": "1"},
+    "lazy": {"FINANCE_MCP_EAGER_IMPORTS": "0", "FINANCE_MCP_WARMUP": "0"},
+}
+
+
+def send(process, message):
+    """向服务器写入一条 JSON-RPC 消息"""
+    process.stdin.write(json.dumps(message) + "\n")
+    process.stdin.flush()
+
+
+def read_response(process, request_id):
+    """读取指定 id 的响应"""
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("服务器在响应前退出")
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if message.get("id") == request_id:
+            return message
+
+
+def measure_once(env_overrides):
+    """启动一次服务器，返回 (initialize 耗时, tools/list 耗时)，单位毫秒"""
+    env = dict(os.environ, **env_overrides)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", SERVER_MODULE],
+        cwd=project_root,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        send(process, {
+            "jsonrpc": "2.0", "id": 1, "method": "initialize",
+            "params": {"protocolVersion": "2024-11-05", "capabilities": {},
+                       "clientInfo": {"name": "benchmark", "version": "1.0"}},
+        })
+        read_response(process, 1)
+        initialized = time.perf_counter()
+        send(process, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        send(process, {"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        read_response(process, 2)
+        listed = time.perf_counter()
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return (initialized - started) * 1000, (listed - started) * 1000
+
+
+def summarize(samples):
+    """返回中位数、最小值和最大值"""
+    return statistics.median(samples), min(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量MCP服务器启动到首次 tools/list 响应的耗时")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式的启动次数 (默认: 5)")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES),
+                        help="要测试的启动模式")
+    args = parser.parse_args()
+
+    print(f"{'模式':<14}{'initialize(ms)':>18}{'tools/list(ms)':>18}   (中位数 [最小, 最大])")
+    for mode in args.modes:
+        init_samples, list_samples = [], []
+        for _ in range(args.runs):
+            init_ms, list_ms = measure_once(MODES[mode])
+            init_samples.append(init_ms)
+            list_samples.append(list_ms)
+        init_median, init_min, init_max = summarize(init_samples)
+        list_median, list_min, list_max = summarize(list_samples)
+        print(f"{mode:<14}{init_median:>18.1f}{list_median:>18.1f}"
+              f"   [{init_min:.0f}-{init_max:.0f}] [{list_min:.0f}-{list_max:.0f}]")
+
+
+if __name__ == "__main__":
+    main()
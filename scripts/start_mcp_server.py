@@ -14,6 +14,7 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from src.main.mcp_services.finance_server import config, record_replay
 from src.main.mcp_services.finance_server.finance_server import FixedMCPServer
 
 
@@ -21,14 +22,14 @@ def setup_environment():
     """设置运行环境"""
     # 确保在项目根目录运行
     os.chdir(project_root)
-    print(f"工作目录: {os.getcwd()}")
+    print(f"工作目录: {os.getcwd()}", file=sys.stderr)
     
     # 检查虚拟环境
     venv_path = project_root / ".venv"
     if venv_path.exists():
-        print(f"检测到虚拟环境: {venv_path}")
+        print(f"检测到虚拟环境: {venv_path}", file=sys.stderr)
     else:
-        print("警告: 未检测到虚拟环境，建议使用虚拟环境运行")
+        print("警告: 未检测到虚拟环境，建议使用虚拟环境运行", file=sys.stderr)
 
 
 def parse_arguments():
@@ -41,6 +42,7 @@ def parse_arguments():
   python scripts/start_mcp_server.py                    # 默认启动金融服务
   python scripts/start_mcp_server.py --service finance  # 指定启动金融服务
   python scripts/start_mcp_server.py --debug            # 启用调试模式
+  python scripts/start_mcp_server.py --transport http --port 8000  # 以 HTTP 方式服务多个客户端
         """
     )
     
@@ -57,40 +59,77 @@ def parse_arguments():
         help="启用调试模式，输出详细日志"
     )
     
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="同时执行的工具调用数量上限 (默认: 环境变量 FINANCE_MCP_MAX_CONCURRENCY 或 8)"
+    )
+    
+    parser.add_argument(
+        "--transport",
+        choices=("stdio", "http"),
+        default=config.TRANSPORT if config.TRANSPORT in ("stdio", "http") else "stdio",
+        help="传输方式：stdio 或 http (默认: 环境变量 FINANCE_MCP_TRANSPORT 或 stdio)"
+    )
+    
     parser.add_argument(
         "--host",
-        default="127.0.0.1",
-        help="服务器监听地址 (默认: 127.0.0.1)"
+        default=None,
+        help=f"HTTP 传输的监听地址 (默认: {config.LISTEN_HOST})"
     )
     
     parser.add_argument(
         "--port",
         type=int,
-        default=8000,
-        help="服务器监听端口 (默认: 8000)"
+        default=None,
+        help=f"HTTP 传输的监听端口 (默认: {config.LISTEN_PORT})"
+    )
+    
+    parser.add_argument(
+        "--fixture-mode",
+        choices=record_replay.MODES,
+        default=None,
+        help="离线夹具模式：record 录制上游响应，replay 只回放录制的响应 (默认: 环境变量 FINANCE_MCP_FIXTURE_MODE 或 off)"
+    )
+    
+    parser.add_argument(
+        "--fixture-dir",
+        default=None,
+        help="夹具目录 (默认: 环境变量 FINANCE_MCP_FIXTURE_DIR 或 数据目录/fixtures)"
+    )
+    
+    parser.add_argument(
+        "--fixture-latency",
+        type=float,
+        default=None,
+        help="回放时为每次上游请求注入的延迟（秒）"
     )
     
     return parser.parse_args()
 
 
-async def start_finance_server(debug=False):
+async def start_finance_server(args):
     """启动金融服务"""
-    print("🚀 启动MCP金融服务...")
+    print("🚀 启动MCP金融服务...", file=sys.stderr)
     
+    debug = args.debug
     if debug:
-        print("🔧 调试模式已启用")
-        print("📊 可用工具列表:")
+        print("🔧 调试模式已启用", file=sys.stderr)
+        print("📊 可用工具列表:", file=sys.stderr)
         server = FixedMCPServer()
         for tool in server.tools:
-            print(f"  - {tool['name']}: {tool['description']}")
+            print(f"  - {tool['name']}: {tool['description']}", file=sys.stderr)
     
     try:
         from src.main.mcp_services.finance_server.finance_server import main
-        await main()
+        record_replay.FIXTURES.configure(args.fixture_mode, args.fixture_dir, args.fixture_latency)
+        await main(max_concurrency=args.max_concurrency, transport=args.transport,
+                   host=args.host, port=args.port)
     except KeyboardInterrupt:
-        print("\n🛑 服务已停止")
+        print("\n🛑 服务已停止", file=sys.stderr)
     except Exception as e:
-        print(f"❌ 服务启动失败: {e}")
+        print(f"❌ 服务启动失败: {e}", file=sys.stderr)
         if debug:
             import traceback
             traceback.print_exc()
@@ -100,24 +139,25 @@ async def main():
     """主函数"""
     args = parse_arguments()
     
-    print("=" * 50)
-    print("🤖 MCP服务器启动器")
-    print("=" * 50)
+    print("=" * 50, file=sys.stderr)
+    print("🤖 MCP服务器启动器", file=sys.stderr)
+    print("=" * 50, file=sys.stderr)
     
     setup_environment()
     
-    print(f"📡 服务类型: {args.service}")
-    print(f"🐛 调试模式: {'启用' if args.debug else '禁用'}")
+    print(f"📡 服务类型: {args.service}", file=sys.stderr)
+    print(f"🔌 传输方式: {args.transport}", file=sys.stderr)
+    print(f"🐛 调试模式: {'启用' if args.debug else '禁用'}", file=sys.stderr)
     
     try:
         if args.service == "finance":
-            await start_finance_server(args.debug)
+            await start_finance_server(args)
         else:
-            print(f"❌ 不支持的服务类型: {args.service}")
+            print(f"❌ 不支持的服务类型: {args.service}", file=sys.stderr)
             sys.exit(1)
             
     except Exception as e:
-        print(f"❌ 启动失败: {e}")
+        print(f"❌ 启动失败: {e}", file=sys.stderr)
         if args.debug:
             import traceback
             traceback.print_exc()
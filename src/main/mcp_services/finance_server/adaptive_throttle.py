@@ -0,0 +1,134 @@
+"""Adaptive (AIMD) throttling of upstream hosts.
+
+上游返回验证码、429 或请求超时时，按比例降低该站点的请求速率和并发上限（乘性减）；
+连续成功若干次后逐步恢复（加性增），上限为配置的速率与并发数。
+这样吞吐量能贴近上游可承受的最大值，而不是固定在保守的配置上。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from . import config
+from .rate_limiter import RATE_LIMITS, HostRateLimiter
+from .upstream import HOST_LIMITS, HostConcurrencyLimiter
+
+# 降速原因
+CAPTCHA = "captcha"
+TOO_MANY_REQUESTS = "429"
+TIMEOUT = "timeout"
+
+
+def throttle_reason(exc: BaseException) -> Optional[str]:
+    """判断异常是否意味着上游在限流，返回原因（不相关的异常返回 None）"""
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status == 429:
+        return TOO_MANY_REQUESTS
+    # requests / urllib3 的超时异常不继承 TimeoutError，按类名识别以免导入 requests
+    if isinstance(exc, TimeoutError) or any("Timeout" in cls.__name__ for cls in type(exc).__mro__):
+        return TIMEOUT
+    return None
+
+
+class AdaptiveThrottle:
+    """AIMD controller adjusting per-host rate limits and concurrency."""
+
+    def __init__(self, rate_limits: HostRateLimiter, host_limits: HostConcurrencyLimiter,
+                 decrease_factor: float = 0.5, increase_after: int = 20, increase_step: float = 0.1,
+                 min_fraction: float = 0.1, cooldown: float = 2.0, enabled: bool = True):
+        self.rate_limits = rate_limits
+        self.host_limits = host_limits
+        self.decrease_factor = decrease_factor
+        # 连续成功多少次后加一档
+        self.increase_after = increase_after
+        # 每次恢复的速率（配置速率的比例）
+        self.increase_step = increase_step
+        # 速率最低降到配置速率的比例
+        self.min_fraction = min_fraction
+        # 两次降速的最小间隔，同一波限流只降一次
+        self.cooldown = cooldown
+        self.enabled = enabled
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> Dict[str, Any]:
+        state = self._hosts.get(host)
+        if state is None:
+            state = {"successes": 0, "streak": 0, "throttled": {}, "decreases": 0, "last_decrease": None}
+            self._hosts[host] = state
+        return state
+
+    def record_success(self, host: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            state = self._state(host)
+            state["successes"] += 1
+            state["streak"] += 1
+            if state["streak"] >= self.increase_after:
+                state["streak"] = 0
+                self._increase(host)
+
+    def record_throttled(self, host: str, reason: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            state = self._state(host)
+            state["throttled"][reason] = state["throttled"].get(reason, 0) + 1
+            state["streak"] = 0
+            now = time.monotonic()
+            if state["last_decrease"] is not None and now - state["last_decrease"] < self.cooldown:
+                return
+            state["last_decrease"] = now
+            state["decreases"] += 1
+            self._decrease(host)
+
+    def _decrease(self, host: str) -> None:
+        ceiling = self.rate_limits.configured_rate(host)
+        if ceiling > 0:
+            rate = self.rate_limits.bucket(host).rate
+            self.rate_limits.set_rate(host, max(ceiling * self.min_fraction, rate * self.decrease_factor))
+        limit = self.host_limits.current_limit(host)
+        self.host_limits.set_limit(host, max(1, int(limit * self.decrease_factor)))
+
+    def _increase(self, host: str) -> None:
+        ceiling = self.rate_limits.configured_rate(host)
+        rate = self.rate_limits.bucket(host).rate
+        if 0 < rate < ceiling:
+            self.rate_limits.set_rate(host, min(ceiling, rate + ceiling * self.increase_step))
+        limit = self.host_limits.current_limit(host)
+        if limit < self.host_limits.configured_limit(host):
+            self.host_limits.set_limit(host, limit + 1)
+
+    @contextmanager
+    def track(self, host: str) -> Iterator[None]:
+        """记录一次上游请求的结果：限流类异常降速，成功计入恢复"""
+        try:
+            yield
+        except Exception as exc:
+            reason = throttle_reason(exc)
+            if reason is not None:
+                self.record_throttled(host, reason)
+            raise
+        self.record_success(host)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各站点当前允许的速率与并发数"""
+        with self._lock:
+            hosts = {host: dict(state, throttled=dict(state["throttled"])) for host, state in self._hosts.items()}
+        return {
+            host: {
+                "rate": round(self.rate_limits.bucket(host).rate, 3),
+                "max_rate": self.rate_limits.configured_rate(host),
+                "concurrency": self.host_limits.current_limit(host),
+                "max_concurrency": self.host_limits.configured_limit(host),
+                "successes": state["successes"],
+                "throttled": state["throttled"],
+                "decreases": state["decreases"],
+            }
+            for host, state in hosts.items()
+        }
+
+
+# 进程内共享的自适应限流
+ADAPTIVE_THROTTLE = AdaptiveThrottle(RATE_LIMITS, HOST_LIMITS, enabled=config.ADAPTIVE_THROTTLE)
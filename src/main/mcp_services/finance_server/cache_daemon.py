@@ -0,0 +1,339 @@
+"""Cross-process cache daemon shared by several stdio server instances.
+
+每个 Cline / CherryStudio 窗口都会启动一个独立的服务器进程。开启 ``FINANCE_MCP_CACHE_DAEMON`` 后，
+各进程把 akshare 结果（pickle 序列化后的字节）写入同一个本地守护进程，另一个进程请求相同数据时
+通过 Unix socket 直接取回，不再各自冷启动、重复访问上游。
+
+守护进程只保存字节串（不反序列化），按总字节数做 LRU 淘汰；过期判断由各服务器进程完成。
+客户端会反序列化取回的字节，因此 socket 在创建时即只有属主可访问（umask 077），
+客户端连接前也会确认 socket 属于当前用户。
+协议为长度前缀的二进制帧::
+
+    请求: 操作(1字节) 键长度(4字节) 值长度(4字节) 键 值
+    响应: 状态(1字节) 长度(4字节) 内容
+
+运行方式::
+
+    python -m src.main.mcp_services.finance_server.cache_daemon --socket ~/.akshare_python/cache-daemon.sock
+"""
+import argparse
+import json
+import os
+import pickle
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from . import config
+
+# 操作
+GET = b"G"
+SET = b"S"
+STATS = b"I"
+
+# 响应状态
+MISS = b"0"
+HIT = b"1"
+OK = b"2"
+
+REQUEST_HEADER = struct.Struct("!cII")
+RESPONSE_HEADER = struct.Struct("!cI")
+
+# 守护进程不可用时，多久后再尝试连接（秒）
+RECONNECT_SECONDS = 5.0
+# 单次请求的超时时间（秒），超时视为未命中
+CLIENT_TIMEOUT = 0.5
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("cache daemon closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class ByteLRU:
+    """Thread-safe LRU of serialized values bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = value
+            self._bytes += len(value)
+            self.sets += 1
+            while self._bytes > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "sets": self.sets,
+            }
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serves framed requests on one client connection until it closes."""
+
+    def handle(self) -> None:
+        store: ByteLRU = self.server.store
+        sock = self.request
+        while True:
+            try:
+                op, key_size, value_size = REQUEST_HEADER.unpack(_recv_exactly(sock, REQUEST_HEADER.size))
+                key = _recv_exactly(sock, key_size).decode("utf-8")
+                value = _recv_exactly(sock, value_size) if value_size else b""
+            except (ConnectionError, OSError):
+                return
+            if op == GET:
+                payload = store.get(key)
+                status, payload = (MISS, b"") if payload is None else (HIT, payload)
+            elif op == SET:
+                store.set(key, value)
+                status, payload = OK, b""
+            elif op == STATS:
+                status, payload = OK, json.dumps(store.stats()).encode("utf-8")
+            else:
+                return
+            try:
+                sock.sendall(RESPONSE_HEADER.pack(status, len(payload)) + payload)
+            except OSError:
+                return
+
+
+class CacheDaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, max_bytes: int):
+        self.store = ByteLRU(max_bytes)
+        super().__init__(str(socket_path), _Handler)
+
+    def server_bind(self) -> None:
+        # socket 文件在 bind 时创建：先收紧 umask，避免创建后到 chmod 之间其他用户可以连接
+        previous = os.umask(0o077)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous)
+
+
+def serve(socket_path: Path, max_bytes: int) -> int:
+    """启动守护进程；同一 socket 已有守护进程在运行时直接退出"""
+    import fcntl
+
+    socket_path = Path(socket_path)
+    socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    lock_file = open(socket_path.with_name(socket_path.name + ".lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print(f"缓存守护进程已在运行: {socket_path}", file=sys.stderr)
+        return 0
+    # 持有锁说明没有其他守护进程，遗留的 socket 文件来自异常退出的进程
+    if socket_path.exists():
+        socket_path.unlink()
+    server = CacheDaemonServer(socket_path, max_bytes)
+    # 收到 SIGTERM 时同样清理 socket 文件
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"缓存守护进程已启动: {socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+        lock_file.close()
+    return 0
+
+
+class SharedCacheClient:
+    """Client used by ``TieredCache`` as its cross-process layer.
+
+    每个线程复用一条连接；守护进程不可用时所有请求视为未命中，若干秒后再重连，
+    开启 autostart 时首次连接失败会在后台启动守护进程。
+    """
+
+    def __init__(self, socket_path: Path, autostart: bool = False, max_bytes: int = 512 * 1024 * 1024,
+                 timeout: float = CLIENT_TIMEOUT):
+        self.socket_path = Path(socket_path)
+        self.autostart = autostart
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+        self._spawned = False
+        self._counters = {"hits": 0, "misses": 0, "sets": 0, "errors": 0}
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _spawn_daemon(self) -> None:
+        # 以模块方式启动，工作目录为顶层包所在目录
+        root = Path(__file__).resolve().parents[__name__.count(".")]
+        subprocess.Popen(
+            [sys.executable, "-m", __name__, "--socket", str(self.socket_path),
+             "--memory-mb", str(self.max_bytes // (1024 * 1024))],
+            cwd=str(root), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    def _owned_by_other_user(self) -> bool:
+        """socket 存在但不是当前用户创建的 Unix socket（取回的数据会被反序列化，不能连接）"""
+        try:
+            info = os.stat(self.socket_path)
+        except OSError:
+            return False
+        return not stat.S_ISSOCK(info.st_mode) or (hasattr(os, "getuid") and info.st_uid != os.getuid())
+
+    def _connection(self) -> Optional[socket.socket]:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            return sock
+        if time.monotonic() < self._down_until:
+            return None
+        if self._owned_by_other_user():
+            print(f"缓存守护进程 socket 不属于当前用户，已忽略: {self.socket_path}", file=sys.stderr)
+            self._count("errors")
+            with self._lock:
+                self._down_until = time.monotonic() + RECONNECT_SECONDS
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(str(self.socket_path))
+        except OSError:
+            sock.close()
+            with self._lock:
+                spawn = self.autostart and not self._spawned
+                self._spawned = self._spawned or spawn
+                self._down_until = time.monotonic() + (self.timeout if spawn else RECONNECT_SECONDS)
+            if spawn:
+                try:
+                    self._spawn_daemon()
+                except OSError as e:
+                    print(f"启动缓存守护进程失败: {e}", file=sys.stderr)
+            return None
+        self._local.sock = sock
+        return sock
+
+    def _request(self, op: bytes, key: str, value: bytes = b"") -> Optional[Tuple[bytes, bytes]]:
+        sock = self._connection()
+        if sock is None:
+            return None
+        encoded = key.encode("utf-8")
+        try:
+            sock.sendall(REQUEST_HEADER.pack(op, len(encoded), len(value)) + encoded + value)
+            status, size = RESPONSE_HEADER.unpack(_recv_exactly(sock, RESPONSE_HEADER.size))
+            return status, _recv_exactly(sock, size) if size else b""
+        except (OSError, struct.error):
+            # 连接中断后该连接上的帧已不同步，丢弃连接
+            self._local.sock = None
+            sock.close()
+            self._count("errors")
+            with self._lock:
+                self._down_until = time.monotonic() + RECONNECT_SECONDS
+            return None
+
+    def get(self, key: str) -> Optional[Tuple[float, float, Any]]:
+        """返回 (写入时间, 过期时间, 值)，未命中或守护进程不可用时返回 None"""
+        response = self._request(GET, key)
+        if response is None or response[0] != HIT:
+            self._count("misses")
+            return None
+        try:
+            stored_at, expires_at, value = pickle.loads(response[1])
+        except Exception:
+            self._count("errors")
+            return None
+        self._count("hits")
+        return stored_at, expires_at, value
+
+    def set(self, key: str, stored_at: float, expires_at: float, value: Any) -> None:
+        try:
+            payload = pickle.dumps((stored_at, expires_at, value), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            self._count("errors")
+            return
+        if self._request(SET, key, payload) is not None:
+            self._count("sets")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = {"socket": str(self.socket_path), **self._counters}
+        response = self._request(STATS, "")
+        stats["available"] = response is not None
+        if response is not None:
+            stats["daemon"] = json.loads(response[1].decode("utf-8"))
+        return stats
+
+
+def shared_client() -> Optional[SharedCacheClient]:
+    """按配置创建共享缓存客户端，未开启或系统不支持 Unix socket 时返回 None"""
+    if not config.CACHE_DAEMON:
+        return None
+    if not hasattr(socket, "AF_UNIX"):
+        print("当前系统不支持 Unix socket，已忽略 FINANCE_MCP_CACHE_DAEMON", file=sys.stderr)
+        return None
+    return SharedCacheClient(
+        config.CACHE_DAEMON_SOCKET,
+        autostart=config.CACHE_DAEMON_AUTOSTART,
+        max_bytes=config.CACHE_DAEMON_MEMORY_MB * 1024 * 1024,
+    )
+
+
+def parse_arguments(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Shared cache daemon for finance MCP servers")
+    parser.add_argument("--socket", type=Path, default=config.CACHE_DAEMON_SOCKET,
+                        help="Unix socket 路径（默认 FINANCE_MCP_CACHE_DAEMON_SOCKET）")
+    parser.add_argument("--memory-mb", type=int, default=config.CACHE_DAEMON_MEMORY_MB,
+                        help="缓存容量上限（MB）")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    sys.exit(serve(args.socket, max(1, args.memory_mb) * 1024 * 1024))
@@ -0,0 +1,95 @@
+"""Cooperative cancellation of tool calls running in worker threads.
+
+事件循环中的任务可以直接取消，但已经进入线程池的阻塞调用无法强行中止。
+每次工具调用执行时创建一个 ``CancelToken`` 并通过 ``contextvars`` 传入工作线程，
+调用超时或被客户端取消（``notifications/cancelled``）后，线程在下一次访问上游前检查到取消并抛出 ``CallCancelled``，
+不再继续发请求、排队等待令牌。
+"""
+import contextvars
+import threading
+import time
+from typing import Optional
+
+
+class CallCancelled(BaseException):
+    """Raised in a worker thread once its tool call was cancelled or ran past its deadline.
+
+    与 ``asyncio.CancelledError`` 一样继承 ``BaseException``，
+    避免被处理函数中兜底的 ``except Exception`` 当作普通错误吞掉后继续执行。
+    """
+
+
+class CancelToken:
+    """Cancellation flag plus optional deadline shared by one tool call and its worker threads."""
+
+    __slots__ = ("_event", "deadline", "reason")
+
+    def __init__(self, timeout: Optional[float] = None):
+        self._event = threading.Event()
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = ""
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+            return True
+        return False
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的秒数，没有截止时间时返回 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise CallCancelled(self.reason)
+
+    def sleep(self, seconds: float) -> None:
+        """等待指定秒数，期间被取消则立即抛出 ``CallCancelled``"""
+        remaining = self.remaining()
+        if remaining is not None and remaining < seconds:
+            self._event.wait(remaining)
+            self.cancel("deadline exceeded")
+        else:
+            self._event.wait(seconds)
+        self.check()
+
+
+# 当前线程/任务所属工具调用的取消标记
+CURRENT_TOKEN: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    return CURRENT_TOKEN.get()
+
+
+def check_cancelled() -> None:
+    """当前工具调用已取消或超时时抛出 ``CallCancelled``（不在工具调用中时什么也不做）"""
+    token = CURRENT_TOKEN.get()
+    if token is not None:
+        token.check()
+
+
+def sleep(seconds: float) -> None:
+    """可被当前工具调用的取消打断的 ``time.sleep``"""
+    token = CURRENT_TOKEN.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+def request_timeout(timeout: float) -> float:
+    """单次 HTTP 请求的超时，不超过当前工具调用剩余的时间"""
+    token = CURRENT_TOKEN.get()
+    remaining = token.remaining() if token is not None else None
+    return timeout if remaining is None else max(0.1, min(timeout, remaining))
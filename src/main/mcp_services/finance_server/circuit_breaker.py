@@ -0,0 +1,184 @@
+"""Circuit breakers for upstream akshare functions.
+
+同一个 akshare 函数连续出现上游故障（超时、连接错误、429/5xx、验证码或封禁页面）达到阈值后熔断：
+熔断期间调用立即失败（由调用方返回最近一次成功的缓存），不再等待上游超时。
+参数错误、解析错误等与上游可用性无关的异常不计入失败。
+
+冷却时间结束后进入半开状态：放行一个真实请求试探，或由后台线程用最近一次成功的参数探测
+（还没有成功过时用最近一次失败的参数）；试探成功即恢复，仍是上游故障则加倍冷却时间后再试。
+半开期间同时只有一个试探（真实请求与后台探测谁先进入半开谁负责），其余调用仍立即失败。
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from . import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited by an open breaker."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} 数据源暂不可用（已熔断），约 {retry_in:.0f} 秒后重新探测")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """异常是否说明上游不可用（只有这类异常计入熔断）"""
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        # 4xx（429 除外）通常是请求参数的问题
+        return status == 429 or status >= 500
+    # 连接错误与超时；requests 的异常都继承 OSError（IOError）
+    if isinstance(exc, (OSError, CircuitOpenError)):
+        return True
+    # urllib3 等库的传输层异常不继承 OSError，按类名识别以免导入这些库
+    if any(part in cls.__name__ for cls in type(exc).__mro__
+           for part in ("Timeout", "ConnectionError", "ProtocolError", "ChunkedEncoding")):
+        return True
+    # 期望 JSON 却收到 HTML：验证码或封禁页面
+    document = getattr(exc, "doc", None)
+    return isinstance(exc, ValueError) and isinstance(document, str) and document.lstrip().startswith("<")
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with half-open trials and a background recovery probe."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float,
+                 max_reset_timeout: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout if max_reset_timeout is not None else reset_timeout * 10
+        self.state = CLOSED
+        self._failures = 0
+        self._timeout = reset_timeout
+        self._probe_at = 0.0
+        self._probe: Optional[Callable[[], Any]] = None
+        self._last_success: Optional[Callable[[], Any]] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._counters = {"trips": 0, "short_circuited": 0, "probes": 0}
+
+    def allow(self) -> bool:
+        """熔断期间返回 False；冷却时间结束后放行一个试探请求（半开）"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            # 试探请求没有回报结果（如调用被取消）时，过一个冷却时间再放行下一个
+            if self._start_trial():
+                if self._timer is not None:
+                    # 由这个请求负责试探，后台探测不再执行
+                    self._timer.cancel()
+                    self._timer = None
+                return True
+            self._counters["short_circuited"] += 1
+            return False
+
+    def _start_trial(self) -> bool:
+        """冷却时间已过时进入半开并占用试探（调用方持有锁）；同时只有一个试探"""
+        now = time.monotonic()
+        if now < self._probe_at:
+            return False
+        self.state = HALF_OPEN
+        self._probe_at = now + self._timeout
+        return True
+
+    def retry_in(self) -> float:
+        """距离下一次试探的秒数"""
+        with self._lock:
+            return max(0.0, self._probe_at - time.monotonic()) if self.state == OPEN else 0.0
+
+    def record_success(self, probe: Optional[Callable[[], Any]] = None) -> None:
+        """记录上游正常响应；``probe`` 为这次成功的调用，之后用于探测恢复"""
+        with self._lock:
+            self._failures = 0
+            self._timeout = self.reset_timeout
+            self.state = CLOSED
+            self._probe = None
+            if probe is not None:
+                self._last_success = probe
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def record_failure(self, probe: Callable[[], Any]) -> None:
+        """记录一次上游故障；``probe`` 为还没有成功调用时用于探测恢复的调用"""
+        with self._lock:
+            self._failures += 1
+            self._probe = probe
+            if self.state == HALF_OPEN:
+                # 试探失败：加倍冷却时间后再试
+                self._reopen()
+            elif self.state == CLOSED and self._failures >= self.failure_threshold:
+                self.state = OPEN
+                self._counters["trips"] += 1
+                self._schedule_probe()
+
+    def _reopen(self) -> None:
+        self.state = OPEN
+        self._timeout = min(self.max_reset_timeout, self._timeout * 2)
+        self._schedule_probe()
+
+    def _schedule_probe(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._probe_at = time.monotonic() + self._timeout
+        self._timer = threading.Timer(self._timeout, self._run_probe)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run_probe(self) -> None:
+        with self._lock:
+            # 优先用最近一次成功的参数探测，避免反复重放可能有问题的输入
+            probe = self._last_success or self._probe
+            self._timer = None
+            if self.state != OPEN or probe is None or not self._start_trial():
+                return
+            self._counters["probes"] += 1
+        try:
+            probe()
+        except Exception as exc:
+            if is_upstream_failure(exc):
+                with self._lock:
+                    if self.state == HALF_OPEN:
+                        self._reopen()
+                return
+        # 上游有响应（即使这组参数出错）即恢复
+        self.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self._failures, **self._counters}
+
+
+class CircuitBreakerRegistry:
+    """One ``CircuitBreaker`` per upstream function, created on first use."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, self.failure_threshold, self.reset_timeout)
+                self._breakers[name] = breaker
+            return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.stats() for name, breaker in breakers.items()}
+
+
+# 进程内共享的按函数熔断器
+CIRCUIT_BREAKERS = CircuitBreakerRegistry(config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_SECONDS)
@@ -0,0 +1,122 @@
+"""Runtime settings for the finance MCP server.
+
+所有配置项都可以通过环境变量覆盖，便于在 Cline / CherryStudio 的 MCP 配置中调整。
+"""
+import os
+from pathlib import Path
+from typing import Callable, Dict, TypeVar
+
+T = TypeVar("T", int, float)
+
+
+def get_int_env(name: str, default: int) -> int:
+    """读取整数类型的环境变量，非法值时返回默认值"""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def get_float_env(name: str, default: float) -> float:
+    """读取浮点类型的环境变量，非法值时返回默认值"""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def get_bool_env(name: str, default: bool = False) -> bool:
+    """读取布尔类型的环境变量（1/true/yes/on 视为真）"""
+    value = os.environ.get(name, "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
+
+
+def get_mapping_env(name: str, convert: Callable[[str], T] = int) -> Dict[str, T]:
+    """读取形如 ``eastmoney=4,sina=2`` 的按主机配置"""
+    mapping: Dict[str, T] = {}
+    for item in os.environ.get(name, "").split(","):
+        key, _, value = item.partition("=")
+        try:
+            mapping[key.strip()] = convert(value)
+        except ValueError:
+            continue
+    return mapping
+
+
+# 传输方式：stdio（默认，每个客户端一个进程）或 http（一个长期运行的进程服务多个客户端）
+TRANSPORT = os.environ.get("FINANCE_MCP_TRANSPORT", "stdio").strip().lower() or "stdio"
+# HTTP 传输的监听地址与端口，以及额外允许的浏览器来源（Origin，逗号分隔；本机来源始终允许）
+LISTEN_HOST = os.environ.get("FINANCE_MCP_LISTEN_HOST", "127.0.0.1").strip() or "127.0.0.1"
+LISTEN_PORT = get_int_env("FINANCE_MCP_LISTEN_PORT", 8765)
+ALLOWED_ORIGINS = [origin.strip() for origin in os.environ.get("FINANCE_MCP_ALLOWED_ORIGINS", "").split(",")
+                   if origin.strip()]
+
+# 同时执行的 tools/call 数量上限（工作线程池大小）
+MAX_CONCURRENCY = max(1, get_int_env("FINANCE_MCP_MAX_CONCURRENCY", 8))
+
+# 同时执行的 CPU 密集型工具（技术指标、财务分析等）数量上限
+COMPUTE_CONCURRENCY = max(1, get_int_env("FINANCE_MCP_COMPUTE_CONCURRENCY", max(1, (os.cpu_count() or 2) // 2)))
+
+# 启动模式：默认延迟导入 akshare 等重量级模块，并在 initialize 握手后后台预热；
+# FINANCE_MCP_EAGER_IMPORTS=1 时在启动阶段立即导入
+EAGER_IMPORTS = get_bool_env("FINANCE_MCP_EAGER_IMPORTS")
+WARMUP_IMPORTS = get_bool_env("FINANCE_MCP_WARMUP", True)
+
+# 本地数据目录（磁盘缓存、历史行情库等）
+DATA_DIR = Path(os.environ.get("FINANCE_MCP_DATA_DIR") or Path.home() / ".akshare_python")
+
+# 本地证券代码表（A股、指数、基金、期货）的刷新周期（小时）
+SECURITY_MASTER_REFRESH_HOURS = max(1.0, get_float_env("FINANCE_MCP_SECURITY_MASTER_REFRESH_HOURS", 24.0))
+
+# 交易时段内K线库中当天K线的有效期（秒），过期后重新获取正在形成的K线
+HISTORY_INTRADAY_TTL = max(0.0, get_float_env("FINANCE_MCP_HISTORY_INTRADAY_TTL", 60.0))
+
+# 离线录制/回放：record 把 akshare 结果和 HTTP 响应写入夹具目录，replay 只从夹具读取（不访问网络），
+# 回放时可注入固定延迟（秒）模拟上游耗时
+FIXTURE_MODE = os.environ.get("FINANCE_MCP_FIXTURE_MODE", "off").strip().lower() or "off"
+FIXTURE_DIR = Path(os.environ.get("FINANCE_MCP_FIXTURE_DIR") or DATA_DIR / "fixtures")
+FIXTURE_LATENCY = max(0.0, get_float_env("FINANCE_MCP_FIXTURE_LATENCY", 0.0))
+
+# 结果缓存：内存层容量上限（MB）以及总开关
+CACHE_ENABLED = not get_bool_env("FINANCE_MCP_DISABLE_CACHE")
+CACHE_MEMORY_MB = max(1, get_int_env("FINANCE_MCP_CACHE_MEMORY_MB", 256))
+# 工具结果（格式化后的文本）缓存容量上限（MB）
+TOOL_CACHE_MEMORY_MB = max(1, get_int_env("FINANCE_MCP_TOOL_CACHE_MEMORY_MB", 32))
+# 多个服务器进程共享的本地缓存守护进程（Unix socket）：开启后 akshare 结果在进程间共享，
+# 连接不上时自动在后台启动守护进程（可关闭），守护进程按容量上限（MB）做 LRU 淘汰
+CACHE_DAEMON = get_bool_env("FINANCE_MCP_CACHE_DAEMON")
+CACHE_DAEMON_SOCKET = Path(os.environ.get("FINANCE_MCP_CACHE_DAEMON_SOCKET") or DATA_DIR / "cache-daemon.sock")
+CACHE_DAEMON_AUTOSTART = get_bool_env("FINANCE_MCP_CACHE_DAEMON_AUTOSTART", True)
+CACHE_DAEMON_MEMORY_MB = max(1, get_int_env("FINANCE_MCP_CACHE_DAEMON_MEMORY_MB", 512))
+# 低频数据过期后在允许范围内先返回旧值、后台刷新（stale-while-revalidate）
+STALE_WHILE_REVALIDATE = not get_bool_env("FINANCE_MCP_DISABLE_SWR")
+
+# 每个上游站点同时进行的请求数量上限（默认值及按主机覆盖）
+HOST_CONCURRENCY_DEFAULT = max(1, get_int_env("FINANCE_MCP_HOST_CONCURRENCY_DEFAULT", 4))
+HOST_CONCURRENCY = get_mapping_env("FINANCE_MCP_HOST_CONCURRENCY")
+
+# 每个上游站点的每秒请求数上限（令牌桶），0 表示不限制；未配置的站点使用内置默认值
+RATE_LIMIT_DEFAULT = max(0.0, get_float_env("FINANCE_MCP_RATE_LIMIT_DEFAULT", 5.0))
+RATE_LIMITS = get_mapping_env("FINANCE_MCP_RATE_LIMITS", float)
+
+# 遇到验证码、429、超时时自动降低站点速率与并发，连续成功后逐步恢复
+ADAPTIVE_THROTTLE = get_bool_env("FINANCE_MCP_ADAPTIVE_THROTTLE", True)
+
+# 同一 akshare 函数连续失败多少次后熔断，以及熔断后首次后台探测的间隔（秒）
+CIRCUIT_FAILURE_THRESHOLD = max(1, get_int_env("FINANCE_MCP_CIRCUIT_FAILURES", 5))
+CIRCUIT_RESET_SECONDS = max(1.0, get_float_env("FINANCE_MCP_CIRCUIT_RESET", 30.0))
+
+# 直接 HTTP 请求：超时（秒）、传输层重试次数与指数退避系数
+HTTP_TIMEOUT = get_float_env("FINANCE_MCP_HTTP_TIMEOUT", 30.0)
+HTTP_RETRIES = max(0, get_int_env("FINANCE_MCP_HTTP_RETRIES", 3))
+HTTP_BACKOFF = max(0.0, get_float_env("FINANCE_MCP_HTTP_BACKOFF", 1.0))
+# 客户端通过 tools/call 的 ``_meta.timeout`` 覆盖工具超时（秒）时允许的上限
+MAX_CALL_TIMEOUT = max(1.0, get_float_env("FINANCE_MCP_MAX_CALL_TIMEOUT", 600.0))
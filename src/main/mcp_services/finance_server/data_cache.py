@@ -0,0 +1,578 @@
+"""Tiered result cache for akshare calls.
+
+内存层为按 DataFrame 实际内存占用限额的 LRU，磁盘层为 pickle 文件；
+开启缓存守护进程时，两层之间还有一个多进程共享的层（见 ``cache_daemon``）。
+每类数据按 ``CACHE_POLICIES`` 设置不同的有效期（TTL）；``STALE_POLICIES`` 中的低频数据
+过期后在允许的范围内先返回旧值，同时在后台刷新（stale-while-revalidate）。
+上游失败或熔断时，返回最近一次成功的（已过期）结果，并在 ``DataFrame.attrs`` 中标记其缓存时间。
+"""
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from . import config
+from .adaptive_throttle import ADAPTIVE_THROTTLE
+from .cache_daemon import SharedCacheClient, shared_client
+from .cancellation import check_cancelled
+from .circuit_breaker import CIRCUIT_BREAKERS, CircuitBreakerRegistry, CircuitOpenError, is_upstream_failure
+from .metrics import SERVER_METRICS, record_upstream
+from .rate_limiter import RATE_LIMITS
+from .record_replay import AKSHARE as AKSHARE_FIXTURES
+from .record_replay import FIXTURES
+from .single_flight import UPSTREAM_FLIGHTS, SingleFlight
+from .upstream import HOST_LIMITS, host_for_function
+
+# A股交易所所在时区（UTC+8）与每日开盘、收盘时间
+CHINA_TZ = timezone(timedelta(hours=8))
+MARKET_OPEN_TIME = (9, 30)
+MARKET_CLOSE_HOUR = 15
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+
+def seconds_until_next_close(now: Optional[datetime] = None) -> float:
+    """距离下一个交易日收盘（15:00，跳过周末）的秒数"""
+    now = now or datetime.now(CHINA_TZ)
+    close = now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0)
+    if now >= close:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return (close - now).total_seconds()
+
+
+def last_close_time(now: Optional[datetime] = None) -> datetime:
+    """最近一次已经发生的交易日收盘时间（跳过周末）"""
+    now = now or datetime.now(CHINA_TZ)
+    close = now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0)
+    if now < close:
+        close -= timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= timedelta(days=1)
+    return close
+
+
+def in_trading_session(now: Optional[datetime] = None) -> bool:
+    """是否处于交易日开盘至收盘之间（当天的K线仍在形成中）"""
+    now = now or datetime.now(CHINA_TZ)
+    return now.weekday() < 5 and MARKET_OPEN_TIME <= (now.hour, now.minute) < (MARKET_CLOSE_HOUR, 0)
+
+
+def seconds_until_bar_stale(now: Optional[datetime] = None) -> float:
+    """K线数据的有效期：交易时段内为盘中有效期，其余时间到下一个收盘"""
+    now = now or datetime.now(CHINA_TZ)
+    if in_trading_session(now):
+        return min(config.HISTORY_INTRADAY_TTL, seconds_until_next_close(now))
+    return seconds_until_next_close(now)
+
+
+TTL = Union[float, Callable[[], float]]
+
+# 各 akshare 函数结果的有效期（秒），可为返回秒数的函数
+CACHE_POLICIES: Dict[str, TTL] = {
+    # 行情快照：秒级
+    "stock_zh_a_spot_em": 15,
+    "stock_zh_index_spot": 15,
+    "futures_zh_spot": 15,
+    # K线：盘中当天的K线仍在变化，短期有效；收盘后到下一个收盘
+    "stock_zh_a_hist": seconds_until_bar_stale,
+    # 按日更新的数据：到下一个收盘
+    "stock_individual_fund_flow": seconds_until_next_close,
+    "stock_zh_valuation_baidu": seconds_until_next_close,
+    "stock_lhb_detail_em": seconds_until_next_close,
+    "stock_hsgt_hist_em": seconds_until_next_close,
+    "fund_open_fund_info_em": seconds_until_next_close,
+    # 盘中会变化但不必实时的数据
+    "stock_hot_rank_em": 5 * MINUTE,
+    "stock_news_em": 10 * MINUTE,
+    "stock_analyst_rank_em": 6 * HOUR,
+    # 低频数据
+    "stock_individual_info_em": DAY,
+    "stock_financial_abstract": DAY,
+    "stock_institute_hold": DAY,
+    "stock_shareholder_change_ths": DAY,
+    # 证券代码表（本地代码表按日刷新，这里只避免同一天内重复下载）
+    "stock_info_sh_name_code": DAY,
+    "stock_info_sz_name_code": DAY,
+    "stock_info_bj_name_code": DAY,
+    "index_stock_info": DAY,
+    "fund_name_em": DAY,
+    "futures_display_main_sina": DAY,
+    "macro_china_cpi": WEEK,
+    "macro_china_pmi": WEEK,
+    "macro_china_gdp": 4 * WEEK,
+}
+
+# 未配置策略的函数使用的默认有效期
+DEFAULT_TTL = 60
+
+# 低频数据过期后仍可直接返回的时长（秒）：在此范围内先返回旧值并后台刷新，超出则阻塞等待刷新
+STALE_POLICIES: Dict[str, TTL] = {
+    "macro_china_gdp": 4 * WEEK,
+    "macro_china_cpi": WEEK,
+    "macro_china_pmi": WEEK,
+    "stock_hsgt_hist_em": DAY,
+    "stock_financial_abstract": WEEK,
+    "stock_individual_info_em": WEEK,
+    "stock_institute_hold": DAY,
+    "fund_name_em": WEEK,
+}
+
+# 后台刷新使用的线程数
+REVALIDATE_WORKERS = 4
+
+
+def resolve_ttl(name: str, policies: Optional[Dict[str, TTL]] = None) -> float:
+    """计算指定函数结果的有效期（秒）"""
+    ttl = (policies if policies is not None else CACHE_POLICIES).get(name, DEFAULT_TTL)
+    return float(ttl() if callable(ttl) else ttl)
+
+
+def resolve_stale_window(name: str, policies: Optional[Dict[str, TTL]] = None) -> float:
+    """过期后仍可先返回旧值的时长（秒），未配置的函数为 0"""
+    window = (policies if policies is not None else STALE_POLICIES).get(name, 0)
+    return float(window() if callable(window) else window)
+
+
+def make_cache_key(name: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    """由函数名和参数生成缓存键"""
+    parts = [repr(arg) for arg in args]
+    parts.extend(f"{key}={kwargs[key]!r}" for key in sorted(kwargs))
+    return f"{name}({', '.join(parts)})"
+
+
+def normalize_arguments(signature: Optional[inspect.Signature], args: Tuple[Any, ...],
+                        kwargs: Dict[str, Any]) -> Tuple[Tuple[Any, ...], Dict[str, Any]]:
+    """按函数签名把位置参数转换为关键字参数并补全默认值，使等价调用得到相同的键"""
+    if signature is None:
+        return args, kwargs
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError:
+        return args, kwargs
+    bound.apply_defaults()
+    return (), dict(bound.arguments)
+
+
+def estimate_size(value: Any) -> int:
+    """估算缓存值占用的内存字节数"""
+    if hasattr(value, "memory_usage"):
+        try:
+            usage = value.memory_usage(deep=True)
+            return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        except Exception:
+            pass
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def copy_value(value: Any) -> Any:
+    """返回给调用方的浅拷贝，避免调用方修改缓存中的 DataFrame"""
+    if hasattr(value, "copy") and hasattr(value, "columns"):
+        return value.copy(deep=False)
+    return value
+
+
+# DataFrame.attrs 中标记过期数据缓存时间（时间戳）的键
+STALE_ATTR = "stale_cached_at"
+
+
+def mark_stale(value: Any, stored_at: float) -> Any:
+    """标记为上游不可用时返回的过期缓存（仅 DataFrame 等带 attrs 的对象）"""
+    if hasattr(value, "attrs"):
+        value.attrs = {**value.attrs, STALE_ATTR: stored_at}
+    return value
+
+
+def stale_age(value: Any) -> Optional[float]:
+    """过期缓存距缓存时的秒数；新鲜数据返回 None"""
+    stored_at = getattr(value, "attrs", {}).get(STALE_ATTR)
+    return None if stored_at is None else max(0.0, time.time() - stored_at)
+
+
+# 工具返回过期缓存时附加的提示前缀
+STALE_NOTICE_PREFIX = "注: 上游数据源暂不可用"
+
+
+def stale_notice(value: Any) -> str:
+    """过期缓存的提示文本（含数据的缓存时长）；新鲜数据返回空字符串"""
+    age = stale_age(value)
+    if age is None:
+        return ""
+    if age < HOUR:
+        elapsed = f"{max(1, int(age // MINUTE))} 分钟"
+    elif age < DAY:
+        elapsed = f"{age / HOUR:.1f} 小时"
+    else:
+        elapsed = f"{age / DAY:.1f} 天"
+    return f"\n{STALE_NOTICE_PREFIX}，以下为 {elapsed}前缓存的数据。\n"
+
+
+class CacheEntry:
+    """A cached value together with its timestamps."""
+
+    __slots__ = ("value", "stored_at", "expires_at", "size")
+
+    def __init__(self, value: Any, stored_at: float, expires_at: float, size: int = 0):
+        self.value = value
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        self.size = size
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+
+class TieredCache:
+    """In-memory LRU bounded by bytes, backed by an optional shared daemon and an on-disk pickle store."""
+
+    def __init__(self, max_memory_bytes: int, disk_dir: Optional[Path] = None,
+                 shared: Optional[SharedCacheClient] = None):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.shared = shared
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    # ---------- 统计 ----------
+
+    def _count(self, namespace: str, counter: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(
+                namespace, {"memory_hits": 0, "shared_hits": 0, "disk_hits": 0, "misses": 0, "stale_served": 0}
+            )
+            counters[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中/未命中计数（总计及按函数统计）"""
+        with self._lock:
+            per_function = {name: dict(counters) for name, counters in self._stats.items()}
+            entries = len(self._memory)
+            memory_bytes = self._memory_bytes
+        totals = {"memory_hits": 0, "shared_hits": 0, "disk_hits": 0, "misses": 0, "stale_served": 0}
+        for counters in per_function.values():
+            for key in totals:
+                totals[key] += counters[key]
+        # stale_served 为未命中后直接返回旧值的次数，已计入 misses
+        hits = totals["memory_hits"] + totals["shared_hits"] + totals["disk_hits"]
+        lookups = hits + totals["misses"]
+        stats = {
+            **totals,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": entries,
+            "memory_bytes": memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "functions": per_function,
+        }
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+    # ---------- 内存层 ----------
+
+    def _memory_get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def _memory_put(self, key: str, entry: CacheEntry) -> None:
+        if entry.size > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old.size
+            self._memory[key] = entry
+            self._memory_bytes += entry.size
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.size
+
+    # ---------- 共享层（缓存守护进程） ----------
+
+    def _shared_get(self, key: str) -> Optional[CacheEntry]:
+        if self.shared is None:
+            return None
+        found = self.shared.get(key)
+        if found is None:
+            return None
+        stored_at, expires_at, value = found
+        return CacheEntry(value, stored_at, expires_at, estimate_size(value))
+
+    def _shared_put(self, key: str, entry: CacheEntry) -> None:
+        if self.shared is not None:
+            self.shared.set(key, entry.stored_at, entry.expires_at, entry.value)
+
+    # ---------- 磁盘层 ----------
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.disk_dir / digest[:2] / f"{digest}.pkl"
+
+    def _disk_get(self, key: str) -> Optional[CacheEntry]:
+        path = self._disk_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                stored_key, stored_at, expires_at, value = pickle.load(f)
+        except Exception:
+            return None
+        if stored_key != key:
+            return None
+        return CacheEntry(value, stored_at, expires_at, estimate_size(value))
+
+    def _disk_put(self, key: str, entry: CacheEntry) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump((key, entry.stored_at, entry.expires_at, entry.value), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入磁盘缓存失败: {e}", file=sys.stderr)
+
+    # ---------- 对外接口 ----------
+
+    def get(self, key: str, namespace: str = "default") -> Tuple[bool, Any]:
+        """读取未过期的缓存值，返回 (是否命中, 值)"""
+        entry = self._memory_get(key)
+        if entry is not None and entry.is_fresh():
+            self._count(namespace, "memory_hits")
+            return True, entry.value
+        # 内存条目过期时仍查询共享层：其他进程可能已经刷新过
+        shared = self._shared_get(key)
+        if shared is not None and shared.is_fresh():
+            self._memory_put(key, shared)
+            self._count(namespace, "shared_hits")
+            return True, shared.value
+        if entry is not None:
+            # 内存层与磁盘层同时写入，内存条目过期时磁盘条目也已过期
+            self._count(namespace, "misses")
+            return False, None
+        entry = self._disk_get(key)
+        if entry is not None and entry.is_fresh():
+            self._memory_put(key, entry)
+            self._shared_put(key, entry)
+            self._count(namespace, "disk_hits")
+            return True, entry.value
+        self._count(namespace, "misses")
+        return False, None
+
+    def get_stale(self, key: str) -> Optional[CacheEntry]:
+        """读取缓存条目（包括已过期的），用于后台刷新期间返回旧值以及上游不可用时的降级"""
+        entry = self._memory_get(key)
+        if entry is None:
+            entry = self._shared_get(key)
+        return entry if entry is not None else self._disk_get(key)
+
+    def record_stale_served(self, namespace: str) -> None:
+        self._count(namespace, "stale_served")
+
+    def set(self, key: str, value: Any, ttl: float) -> CacheEntry:
+        """写入缓存（内存层、共享层和磁盘层）"""
+        now = time.time()
+        entry = CacheEntry(value, now, now + ttl, estimate_size(value))
+        self._memory_put(key, entry)
+        self._shared_put(key, entry)
+        self._disk_put(key, entry)
+        return entry
+
+    def clear_memory(self) -> None:
+        """清空内存层（磁盘层保留）"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+
+class CachedAkshare:
+    """Proxy for the akshare module whose functions read through ``TieredCache``.
+
+    缓存未命中时，相同参数的并发调用通过 ``SingleFlight`` 合并为一次上游请求；
+    过期不久的低频数据直接返回旧值并在后台刷新；
+    上游失败或函数已熔断时返回最近一次成功的结果（见 ``mark_stale``），没有则抛出异常。
+    """
+
+    def __init__(self, module: Any, cache: Optional[TieredCache] = None,
+                 policies: Optional[Dict[str, TTL]] = None, enabled: Optional[bool] = None,
+                 flights: Optional[SingleFlight] = None, breakers: Optional[CircuitBreakerRegistry] = None,
+                 stale_policies: Optional[Dict[str, TTL]] = None):
+        self._module = module
+        self._cache = cache if cache is not None else DATA_CACHE
+        self._policies = policies
+        self._enabled = config.CACHE_ENABLED if enabled is None else enabled
+        self._flights = flights if flights is not None else UPSTREAM_FLIGHTS
+        self._breakers = breakers if breakers is not None else CIRCUIT_BREAKERS
+        self._stale_policies = stale_policies
+        self._revalidating: set = set()
+        self._revalidate_lock = threading.Lock()
+
+    @property
+    def cache(self) -> TieredCache:
+        return self._cache
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._module, name)
+        if not callable(attr):
+            return attr
+
+        try:
+            signature = inspect.signature(attr)
+        except (TypeError, ValueError):
+            signature = None
+
+        @functools.wraps(attr)
+        def wrapper(*args, **kwargs):
+            args, kwargs = normalize_arguments(signature, args, kwargs)
+            return self.call(name, attr, args, kwargs)
+
+        self.__dict__[name] = wrapper
+        return wrapper
+
+    def call(self, name: str, func: Callable[..., Any], args: Tuple[Any, ...],
+             kwargs: Dict[str, Any]) -> Any:
+        """通过缓存调用 akshare 函数"""
+        key = make_cache_key(name, args, kwargs)
+        if self._enabled:
+            hit, value = self._cache.get(key, namespace=name)
+            if hit:
+                return copy_value(value)
+            stale = self._servable_stale(key, name)
+            if stale is not None:
+                self._revalidate(key, name, func, args, kwargs)
+                return copy_value(stale.value)
+
+        # 所属工具调用已取消或超时：缓存之外的数据不再请求
+        check_cancelled()
+        breaker = self._breakers.get(name)
+        if not breaker.allow():
+            return self._fallback(key, CircuitOpenError(name, breaker.retry_in()))
+        started = time.perf_counter()
+        try:
+            value, _ = self._flights.do(key, self._fetch_tracked, breaker, key, name, func, args, kwargs)
+        except Exception as exc:
+            return self._fallback(key, exc)
+        finally:
+            # 计入当前工具调用的上游耗时（包括等待其他线程发起的相同请求）
+            record_upstream(time.perf_counter() - started)
+        return copy_value(value)
+
+    def _fetch_tracked(self, breaker: Any, key: str, name: str, func: Callable[..., Any],
+                       args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        """请求上游并把结果计入熔断器；只在实际发起请求的线程中执行，合并等待的调用不重复计数"""
+        probe = functools.partial(self._fetch, key, name, func, args, kwargs)
+        try:
+            value = probe()
+        except Exception as exc:
+            # 只有上游故障计入熔断；参数错误、解析错误说明上游有响应
+            if is_upstream_failure(exc):
+                breaker.record_failure(probe)
+            else:
+                breaker.record_success()
+            raise
+        breaker.record_success(probe)
+        return value
+
+    def _servable_stale(self, key: str, name: str) -> Optional[CacheEntry]:
+        """过期时间仍在该函数允许范围内的旧值"""
+        if not config.STALE_WHILE_REVALIDATE:
+            return None
+        window = resolve_stale_window(name, self._stale_policies)
+        if window <= 0:
+            return None
+        entry = self._cache.get_stale(key)
+        if entry is None or time.time() - entry.expires_at > window:
+            return None
+        self._cache.record_stale_served(name)
+        return entry
+
+    def _revalidate(self, key: str, name: str, func: Callable[..., Any], args: Tuple[Any, ...],
+                    kwargs: Dict[str, Any]) -> None:
+        """在后台刷新缓存条目，同一键同时只有一个刷新任务"""
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def refresh():
+            try:
+                breaker = self._breakers.get(name)
+                if not breaker.allow():
+                    return
+                try:
+                    self._flights.do(key, self._fetch_tracked, breaker, key, name, func, args, kwargs)
+                except Exception as exc:
+                    print(f"后台刷新 {name} 失败: {exc}", file=sys.stderr)
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+
+        REVALIDATE_EXECUTOR.submit(refresh)
+
+    def _fallback(self, key: str, error: Exception) -> Any:
+        """返回最近一次成功的结果并标记缓存时间，没有可用结果时抛出 ``error``"""
+        entry = self._cache.get_stale(key) if self._enabled else None
+        if entry is None:
+            raise error
+        return mark_stale(copy_value(entry.value), entry.stored_at)
+
+    def _fetch(self, key: str, name: str, func: Callable[..., Any], args: Tuple[Any, ...],
+               kwargs: Dict[str, Any]) -> Any:
+        """请求上游并写入缓存（同一键同时只有一个线程执行）"""
+        if FIXTURES.replaying:
+            # 离线回放：不访问上游，也不经过限速
+            value = FIXTURES.replay(AKSHARE_FIXTURES, key)
+        else:
+            host = host_for_function(name)
+            # 先在本站点的令牌桶上排队，再占用并发名额，等待期间不占用名额
+            RATE_LIMITS.acquire_blocking(host)
+            with HOST_LIMITS.slot(host), ADAPTIVE_THROTTLE.track(host):
+                value = func(*args, **kwargs)
+            if FIXTURES.recording:
+                FIXTURES.record(AKSHARE_FIXTURES, key, value)
+        ttl = resolve_ttl(name, self._policies)
+        # 空结果通常意味着上游异常，不写入缓存
+        if self._enabled and ttl > 0 and value is not None and not getattr(value, "empty", False):
+            self._cache.set(key, value, ttl)
+        return value
+
+
+# 后台刷新（stale-while-revalidate）共用的线程池
+REVALIDATE_EXECUTOR = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS, thread_name_prefix="cache-revalidate")
+
+# 进程内共享的 akshare 结果缓存
+DATA_CACHE = TieredCache(
+    max_memory_bytes=config.CACHE_MEMORY_MB * 1024 * 1024,
+    disk_dir=config.DATA_DIR / "cache",
+    shared=shared_client(),
+)
+SERVER_METRICS.register_cache("data", DATA_CACHE)
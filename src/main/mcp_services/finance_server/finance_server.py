@@ -1,18 +1,41 @@
 """Fixed MCP Server compatible with Cline and CherryStudio."""
+from __future__ import annotations
+
+import argparse
 import asyncio
+import contextvars
+import functools
 import json
 import sys
-from typing import Any, Dict, List, Optional
-import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 import random
-import re
-from bs4 import BeautifulSoup
-import pandas as pd
-from datetime import datetime, timedelta
-import mcp.types as types
+from datetime import datetime
+from pathlib import Path
+
+from . import config, record_replay
+from .cancellation import CURRENT_TOKEN, CallCancelled, CancelToken
+from .http_transport import MCPHttpTransport
+from .data_cache import (
+    DATA_CACHE, DAY, HOUR, MINUTE, WEEK, TieredCache, make_cache_key, seconds_until_next_close
+)
+from .lazy_imports import LazyAttribute, LazyModule, warm_up
+from .metrics import SERVER_METRICS, current_call
+from .single_flight import UPSTREAM_FLIGHTS, AsyncSingleFlight
+from .tool_registry import (
+    CHEAP, HEAVY_COMPUTE, NETWORK, ToolRegistry, ToolSpec, is_cacheable_result, to_result,
+)
+from .output_format import TEXT, ErrorText
 
-from .finance_tools import FinanceDataService
+# 重量级模块延迟导入：initialize / tools/list 握手无需加载 akshare、pandas、mcp.types
+requests = LazyModule("requests")
+http_client = LazyModule(".http_client", __package__)
+rate_limiter = LazyModule(".rate_limiter", __package__)
+adaptive_throttle = LazyModule(".adaptive_throttle", __package__)
+types = LazyModule("mcp.types")
+finance_tools = LazyModule(".finance_tools", __package__)
+FinanceDataService = LazyAttribute(finance_tools, "FinanceDataService")
 
 # 模拟浏览器请求的User-Agent列表
 USER_AGENTS = [
@@ -52,63 +75,37 @@ class THSDataService:
     """Service for TongHuaShun data collection with anti-crawling measures."""
     
     def __init__(self):
-        self.session = requests.Session()
-        self.last_request_time = 0
-        self.min_request_interval = 2  # 最小请求间隔（秒）
+        self.client = http_client.HTTP_CLIENT
     
     def _get_random_user_agent(self):
         """获取随机User-Agent"""
         return random.choice(USER_AGENTS)
     
-    def _rate_limit(self):
-        """请求频率限制"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last
-            time.sleep(sleep_time)
-        self.last_request_time = time.time()
-    
     def _make_request(self, url: str, params: Optional[Dict] = None, max_retries: int = 3) -> Optional[requests.Response]:
-        """带反爬虫机制的请求函数"""
-        self._rate_limit()
-        
+        """带反爬虫机制的请求函数（网络错误的重试由共享连接池的传输层完成）"""
         headers = {
             'User-Agent': self._get_random_user_agent(),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
             'Referer': 'https://www.10jqka.com.cn/',
-            'Upgrade-Insecure-Requests': '1',
         }
         
+        # 请求间隔由共享的同花顺站点令牌桶控制（见 rate_limiter），不在此处休眠
         for attempt in range(max_retries):
-            try:
-                response = self.session.get(url, params=params, headers=headers, timeout=30)
-                response.raise_for_status()
-                
-                # 检查是否被反爬虫
-                if "验证" in response.text or "captcha" in response.text.lower():
-                    print(f"检测到反爬虫验证 (尝试 {attempt + 1}/{max_retries})")
-                    if attempt < max_retries - 1:
-                        sleep_time = (2 ** attempt) + random.uniform(1, 3)
-                        print(f"等待 {sleep_time:.2f} 秒后重试...")
-                        time.sleep(sleep_time)
-                        continue
-                    else:
-                        raise Exception("触发反爬虫机制，无法获取数据")
-                
-                return response
-                
-            except requests.exceptions.RequestException as e:
-                print(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+            response = self.client.get(url, params=params, headers=headers)
+            
+            # 检查是否被反爬虫
+            if "验证" in response.text or "captcha" in response.text.lower():
+                print(f"检测到反爬虫验证 (尝试 {attempt + 1}/{max_retries})", file=sys.stderr)
+                # 验证码说明请求过快：降低同花顺的速率与并发，连续成功后自动恢复
+                adaptive_throttle.ADAPTIVE_THROTTLE.record_throttled("10jqka", adaptive_throttle.CAPTCHA)
                 if attempt < max_retries - 1:
                     sleep_time = (2 ** attempt) + random.uniform(1, 3)
-                    print(f"等待 {sleep_time:.2f} 秒后重试...")
-                    time.sleep(sleep_time)
+                    print(f"等待 {sleep_time:.2f} 秒后重试...", file=sys.stderr)
+                    rate_limiter.RATE_LIMITS.penalize("10jqka", sleep_time)
+                    continue
                 else:
-                    raise e
+                    raise Exception("触发反爬虫机制，无法获取数据")
+            
+            return response
         
         return None
     
@@ -154,7 +151,7 @@ class THSDataService:
             return [types.TextContent(type="text", text=result_text)]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取行业新闻失败: {str(e)}")]
+            return [ErrorText(f"获取行业新闻失败: {str(e)}")]
     
     @staticmethod
     def get_policy_support(industry: str) -> List[types.TextContent]:
@@ -202,7 +199,7 @@ class THSDataService:
             return [types.TextContent(type="text", text=result_text)]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取政策支持信息失败: {str(e)}")]
+            return [ErrorText(f"获取政策支持信息失败: {str(e)}")]
     
     @staticmethod
     def get_investment_events(industry: str) -> List[types.TextContent]:
@@ -255,7 +252,7 @@ class THSDataService:
             return [types.TextContent(type="text", text=result_text)]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取投资发展事项失败: {str(e)}")]
+            return [ErrorText(f"获取投资发展事项失败: {str(e)}")]
     
     @staticmethod
     def get_market_heat(industry: str) -> List[types.TextContent]:
@@ -300,7 +297,7 @@ class THSDataService:
             return [types.TextContent(type="text", text=result_text)]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取市场热度分析失败: {str(e)}")]
+            return [ErrorText(f"获取市场热度分析失败: {str(e)}")]
     
     @staticmethod
     def get_industry_overview(industry: str) -> List[types.TextContent]:
@@ -334,391 +331,361 @@ class THSDataService:
             return [types.TextContent(type="text", text=overview_text)]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取行业概览失败: {str(e)}")]
+            return [ErrorText(f"获取行业概览失败: {str(e)}")]
+
+
+def echo_text(text: str) -> str:
+    """原样返回输入文本"""
+    return text
+
+
+def calculate_expression(expression: str) -> Any:
+    """计算基础算术表达式"""
+    try:
+        # Basic safe evaluation
+        result = eval(expression, {"__builtins__": {}})
+        return f"Result: {result}"
+    except Exception as e:
+        return ErrorText(f"Error: {str(e)}")
+
+
+def current_time() -> str:
+    """返回当前时间"""
+    return f"Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+def server_stats(tools: Optional[List[str]] = None) -> str:
+    """返回各工具的分阶段耗时直方图、返回大小、缓存命中率与进行中的调用数"""
+    stats = SERVER_METRICS.stats(tools)
+    stats["upstream_in_flight"] = UPSTREAM_FLIGHTS.in_flight()
+    return json.dumps(stats, ensure_ascii=False, indent=2)
+
+
+def finance_handler(method: str) -> Callable[..., Any]:
+    """按名称延迟解析 FinanceDataService 的方法，注册工具时不触发数据模块导入"""
+    def handler(**kwargs: Any) -> Any:
+        return getattr(FinanceDataService, method)(**kwargs)
+    handler.__name__ = method
+    return handler
+
+
+def _symbol(description: str = "股票代码") -> Dict[str, Dict[str, Any]]:
+    return {"symbol": {"type": "string", "description": description}}
+
+
+def _industry(description: str = "行业名称") -> Dict[str, Dict[str, Any]]:
+    return {"industry": {"type": "string", "description": description, "enum": list(INDUSTRY_MAPPING.keys())}}
+
+
+def _symbols() -> Dict[str, Dict[str, Any]]:
+    return {
+        "symbols": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "股票代码列表（如：[\"000001\", \"600519\"]），最多200只"
+        }
+    }
+
+
+PERIOD_PROPERTY = {
+    "type": "string",
+    "description": "数据周期：daily(日线), weekly(周线), monthly(月线)",
+    "enum": ["daily", "weekly", "monthly"]
+}
+
+# 批量工具逐只回源，超时时间放宽
+BATCH_TIMEOUT = 180
+
+TOOL_SPECS = [
+    # 基础工具
+    ToolSpec("echo", "Echo back the input text", echo_text,
+             properties={"text": {"type": "string", "description": "Text to echo back"}},
+             required=["text"], cost=CHEAP, uses_data_modules=False),
+    ToolSpec("calculate", "Perform basic arithmetic calculations", calculate_expression,
+             properties={"expression": {"type": "string", "description": "Mathematical expression to evaluate"}},
+             required=["expression"], cost=CHEAP, uses_data_modules=False),
+    ToolSpec("get_time", "Get current time information", current_time,
+             cost=CHEAP, uses_data_modules=False),
+    # 行情数据
+    ToolSpec("get_stock_spot", "获取股票实时行情数据", finance_handler("get_stock_spot"),
+             properties=_symbol("股票代码（如：000001），为空则返回所有股票"),
+             defaults={"symbol": ""}, cache_ttl=15, upstream="eastmoney"),
+    ToolSpec("get_stock_history", "获取股票历史数据", finance_handler("get_stock_history"),
+             properties={**_symbol("股票代码（如：000001）"), "period": PERIOD_PROPERTY},
+             required=["symbol"], cache_ttl=MINUTE, upstream="eastmoney"),
+    ToolSpec("get_fund_info", "获取基金信息", finance_handler("get_fund_info"),
+             properties=_symbol("基金代码"), required=["symbol"], cache_ttl=seconds_until_next_close,
+             upstream="eastmoney"),
+    ToolSpec("search_fund", "按基金代码、名称或拼音缩写搜索基金（支持前缀与模糊匹配）",
+             finance_handler("search_fund"),
+             properties={
+                 "query": {"type": "string", "description": "基金代码、名称关键字或拼音缩写（如：华夏成长、HXCZ）"},
+                 "limit": {"type": "number", "description": "最多返回条数（默认10，最多50）"}
+             },
+             required=["query"], cache_ttl=HOUR, upstream="eastmoney"),
+    ToolSpec("get_index_data", "获取指数数据", finance_handler("get_index_data"),
+             properties=_symbol("指数代码（如：000001 上证指数），为空则返回主要指数"),
+             defaults={"symbol": ""}, cache_ttl=15, upstream="sina"),
+    ToolSpec("get_futures_data", "获取期货数据", finance_handler("get_futures_data"),
+             properties=_symbol("期货代码，为空则返回主要期货"),
+             defaults={"symbol": ""}, cache_ttl=15, upstream="sina"),
+    # 同花顺行业数据
+    ToolSpec("get_industry_news", "获取指定行业的新闻资讯", THSDataService.get_industry_news,
+             properties={
+                 **_industry("行业名称（如：technology, finance, healthcare, new_energy等）"),
+                 "days": {"type": "number", "description": "查询天数（默认7天）"}
+             },
+             required=["industry"], cost=CHEAP),
+    ToolSpec("get_policy_support", "获取行业政策支持信息", THSDataService.get_policy_support,
+             properties=_industry(), required=["industry"], cost=CHEAP),
+    ToolSpec("get_investment_events", "获取投资发展重大事项", THSDataService.get_investment_events,
+             properties=_industry(), required=["industry"], cost=CHEAP),
+    ToolSpec("get_market_heat", "获取市场热度分析", THSDataService.get_market_heat,
+             properties=_industry(), required=["industry"], cost=CHEAP),
+    ToolSpec("get_industry_overview", "获取行业综合概览报告", THSDataService.get_industry_overview,
+             properties=_industry(), required=["industry"], cost=CHEAP),
+    # 个股基本面
+    ToolSpec("get_stock_financials", "获取股票财务数据", finance_handler("get_stock_financials"),
+             properties=_symbol(), required=["symbol"], cache_ttl=DAY, upstream="sina"),
+    ToolSpec("get_stock_valuation", "获取股票估值数据", finance_handler("get_stock_valuation"),
+             properties=_symbol(), required=["symbol"], cache_ttl=seconds_until_next_close, upstream="baidu"),
+    ToolSpec("get_stock_technical_indicators",
+             "获取股票技术指标（均线、MACD、KDJ、RSI、BOLL、ATR、OBV、支撑/阻力位、量价背离）",
+             finance_handler("get_stock_technical_indicators"),
+             properties=_symbol(), required=["symbol"], cost=HEAVY_COMPUTE, cache_ttl=MINUTE,
+             upstream="eastmoney"),
+    ToolSpec("get_stock_capital_flow", "获取股票资金流向数据", finance_handler("get_stock_capital_flow"),
+             properties=_symbol(), required=["symbol"], cache_ttl=seconds_until_next_close,
+             upstream="eastmoney"),
+    ToolSpec("get_stock_analyst_ratings", "获取分析师评级数据", finance_handler("get_stock_analyst_ratings"),
+             properties=_symbol(), required=["symbol"], cache_ttl=6 * HOUR, upstream="eastmoney"),
+    ToolSpec("get_stock_company_info", "获取公司基本信息", finance_handler("get_stock_company_info"),
+             properties=_symbol(), required=["symbol"], cache_ttl=DAY, upstream="eastmoney"),
+    # 深度财务分析
+    ToolSpec("get_stock_financial_analysis", "获取股票深度财务分析指标（ROE、ROA、毛利率、资产负债率等）",
+             finance_handler("get_stock_financial_analysis"),
+             properties=_symbol(), required=["symbol"], cost=HEAVY_COMPUTE, cache_ttl=DAY, upstream="sina"),
+    ToolSpec("get_stock_institute_hold", "获取机构持股信息", finance_handler("get_stock_institute_hold"),
+             properties=_symbol(), required=["symbol"], cache_ttl=DAY, upstream="sina"),
+    ToolSpec("get_stock_shareholder_info", "获取股东持股变动信息", finance_handler("get_stock_shareholder_info"),
+             properties=_symbol(), required=["symbol"], cache_ttl=DAY, upstream="10jqka"),
+    ToolSpec("get_stock_lhb_data", "获取龙虎榜数据（可指定股票代码）", finance_handler("get_stock_lhb_data"),
+             properties=_symbol("股票代码（可选），为空则返回所有龙虎榜数据"),
+             defaults={"symbol": ""}, cache_ttl=seconds_until_next_close, upstream="eastmoney"),
+    ToolSpec("get_stock_hot_rank", "获取热门股票排名", finance_handler("get_stock_hot_rank"),
+             cache_ttl=5 * MINUTE, upstream="eastmoney"),
+    ToolSpec("get_stock_news", "获取股票相关新闻", finance_handler("get_stock_news"),
+             properties=_symbol(), required=["symbol"], cache_ttl=10 * MINUTE, upstream="eastmoney"),
+    ToolSpec("get_macro_economic_data", "获取宏观经济数据（GDP、CPI、PMI等）",
+             finance_handler("get_macro_economic_data"), cache_ttl=WEEK, upstream="eastmoney"),
+    ToolSpec("get_northbound_capital", "获取北向资金数据", finance_handler("get_northbound_capital"),
+             cache_ttl=seconds_until_next_close, upstream="eastmoney"),
+    # 批量工具
+    ToolSpec("get_stock_spot_batch", "批量获取多只股票最新行情（一次请求返回合并结果）",
+             finance_handler("get_stock_spot_batch"),
+             properties=_symbols(), required=["symbols"], cache_ttl=15, timeout=BATCH_TIMEOUT,
+             upstream="eastmoney"),
+    ToolSpec("get_stock_history_batch", "批量获取多只股票历史数据（每只返回最近若干条K线）",
+             finance_handler("get_stock_history_batch"),
+             properties={
+                 **_symbols(),
+                 "period": PERIOD_PROPERTY,
+                 "limit": {"type": "number", "description": "每只股票返回的最近K线条数（默认20，最多250）"}
+             },
+             required=["symbols"], cache_ttl=MINUTE, timeout=BATCH_TIMEOUT, upstream="eastmoney"),
+    ToolSpec("get_stock_technical_indicators_batch", "批量获取多只股票技术指标",
+             finance_handler("get_stock_technical_indicators_batch"),
+             properties=_symbols(), required=["symbols"], cost=HEAVY_COMPUTE, cache_ttl=MINUTE,
+             timeout=BATCH_TIMEOUT, upstream="eastmoney"),
+    ToolSpec("get_stock_capital_flow_batch", "批量获取多只股票最新资金流向",
+             finance_handler("get_stock_capital_flow_batch"),
+             properties=_symbols(), required=["symbols"], cache_ttl=seconds_until_next_close,
+             timeout=BATCH_TIMEOUT, upstream="eastmoney"),
+    ToolSpec("get_cache_stats", "获取数据缓存命中/未命中统计", finance_handler("get_cache_stats"),
+             cost=CHEAP, output_formats=False),
+    ToolSpec("get_server_stats", "获取服务器统计：各工具分阶段耗时（排队、上游、计算、格式化）、返回大小、缓存命中率与进行中的调用数",
+             server_stats,
+             properties={"tools": {"type": "array", "items": {"type": "string"},
+                                   "description": "只返回这些工具的统计（可选，默认全部）"}},
+             cost=CHEAP, uses_data_modules=False),
+]
+
+TOOL_REGISTRY = ToolRegistry(TOOL_SPECS)
 
 
 class FixedMCPServer:
     """MCP Server that follows the latest MCP protocol specification."""
     
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None,
+                 registry: Optional[ToolRegistry] = None):
+        self.registry = registry or TOOL_REGISTRY
         self.tools = self._get_tools()
+        self.max_concurrency = max_concurrency or config.MAX_CONCURRENCY
+        self.compute_concurrency = config.COMPUTE_CONCURRENCY
+        # 阻塞的 akshare 调用在线程池中执行，避免卡住事件循环；
+        # 网络请求和 CPU 密集计算分别限流，二者共用一个线程池。
+        # 名额在工作线程真正结束时才归还（被取消的调用要等当前这次上游请求结束），
+        # 因此线程数恰好等于两个并发上限之和，信号量限制的就是实际运行的线程数
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency + self.compute_concurrency,
+            thread_name_prefix="finance-tool",
+        )
+        self._call_slots: Optional[asyncio.Semaphore] = None
+        self._compute_slots: Optional[asyncio.Semaphore] = None
+        # 按工具声明的有效期缓存格式化后的结果（仅内存）
+        self._result_cache = TieredCache(max_memory_bytes=config.TOOL_CACHE_MEMORY_MB * 1024 * 1024)
+        SERVER_METRICS.register_cache("tool_results", self._result_cache)
+        # 同时进行的相同工具调用（如批量请求中的重复项、多个客户端的相同请求）只执行一次
+        self._tool_flights = AsyncSingleFlight()
+        # 进行中的工具调用，按 (会话, 请求 id) 登记，供 notifications/cancelled 取消
+        self._running: Dict[Tuple[Any, Any], asyncio.Task] = {}
+        self._warmup_thread = None
+    
+    def start_warmup(self) -> None:
+        """握手完成后在后台线程预热导入数据模块，并开始构建本地证券代码表"""
+        if self._warmup_thread is None and not finance_tools.loaded:
+            self._warmup_thread = warm_up([finance_tools], then=lambda: finance_tools.SECURITY_MASTER.warm_up())
+    
+    async def _ensure_data_modules(self) -> None:
+        """首次调用数据工具时在线程中完成导入，避免阻塞事件循环"""
+        if not finance_tools.loaded:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, finance_tools.load)
+    
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any,
+                            cost: str = NETWORK, **kwargs: Any) -> Any:
+        """在有界工作线程池中执行阻塞的数据获取或计算函数"""
+        if self._call_slots is None:
+            self._call_slots = asyncio.Semaphore(self.max_concurrency)
+            self._compute_slots = asyncio.Semaphore(self.compute_concurrency)
+        slots = self._compute_slots if cost == HEAVY_COMPUTE else self._call_slots
+        await slots.acquire()
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._timed, func, *args, **kwargs)
+        # 复制上下文，使工作线程中的上游耗时计入当前工具调用
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, call)
+        except BaseException:
+            slots.release()
+            raise
+        # 等待方被取消时线程仍在运行，名额在线程结束（或尚未开始即被取消）时才归还
+        future.add_done_callback(lambda _: self._release_slot(loop, slots))
+        return await asyncio.wrap_future(future)
+    
+    @staticmethod
+    def _release_slot(loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore) -> None:
+        try:
+            loop.call_soon_threadsafe(slots.release)
+        except RuntimeError:
+            # 事件循环已关闭（服务器退出）
+            pass
+    
+    @staticmethod
+    def _timed(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        call = current_call()
+        if call is None:
+            return func(*args, **kwargs)
+        with call.timing_handler():
+            return func(*args, **kwargs)
+    
+    async def _run_upstream(self, spec: ToolSpec, kwargs: Dict[str, Any]) -> Any:
+        """先在事件循环中预约上游站点的令牌，再占用并发名额和工作线程执行
+
+        令牌在事件循环中扣除：同一站点的突发请求依次排队，等待期间不占用名额，不会挤占其他站点的调用。
+        """
+        if not spec.upstream:
+            return await self._run_blocking(spec.handler, cost=spec.cost, **kwargs)
+        limits = rate_limiter.RATE_LIMITS
+        reservation = await limits.reserve(spec.upstream)
+        reset = rate_limiter.PREPAID.set(reservation)
+        try:
+            return await self._run_blocking(spec.handler, cost=spec.cost, **kwargs)
+        finally:
+            rate_limiter.PREPAID.reset(reset)
+            limits.refund(reservation)
+    
+    @staticmethod
+    def call_timeout(spec: ToolSpec, meta: Optional[Dict[str, Any]] = None) -> Optional[float]:
+        """本次调用的超时（秒）：请求的 ``_meta.timeout`` 覆盖工具声明的超时，不超过 ``MAX_CALL_TIMEOUT``"""
+        override = meta.get("timeout") if isinstance(meta, dict) else None
+        if override is None:
+            return spec.timeout
+        if isinstance(override, bool) or not isinstance(override, (int, float)) or override <= 0:
+            raise ValueError("_meta.timeout must be a positive number of seconds")
+        return min(float(override), config.MAX_CALL_TIMEOUT)
+    
+    @staticmethod
+    def _with_deadline(awaitable: Any, timeout: Optional[float]) -> Any:
+        return asyncio.wait_for(awaitable, timeout) if timeout else awaitable
+    
+    async def call_tool(self, spec: ToolSpec, kwargs: Dict[str, Any],
+                        timeout: Optional[float] = None, fmt: str = TEXT) -> Dict[str, Any]:
+        """按工具声明的开销类别执行，并按其有效期缓存结果；各阶段耗时计入 ``SERVER_METRICS``
+
+        ``timeout`` 为整个调用（含排队）的截止时间，默认使用工具声明的超时，超时抛出 ``asyncio.TimeoutError``。
+        结果按输出格式 ``fmt`` 渲染一次，渲染后的内容按 (参数, 格式) 缓存。
+        """
+        timeout = timeout or spec.timeout
+        with SERVER_METRICS.track(spec.name) as record:
+            ttl = spec.ttl() if config.CACHE_ENABLED else 0
+            key = make_cache_key(spec.name, () if fmt == TEXT else (fmt,), kwargs) if ttl > 0 else None
+            if key is None:
+                return await self._with_deadline(self._execute(spec, kwargs, record, timeout, fmt), timeout)
+            
+            hit, result = self._result_cache.get(key, namespace=spec.name)
+            if hit:
+                record.cache_hit = True
+                return result
+            # 超时或被取消只让本调用停止等待；合并执行的任务在最后一个等待者离开后才取消
+            result, shared = await self._with_deadline(
+                self._tool_flights.do(key, lambda: self._execute(spec, kwargs, record, timeout, fmt)), timeout)
+            if shared:
+                record.payload_bytes = sum(len(item["text"].encode("utf-8")) for item in result["content"])
+                record.error = bool(result.get("isError"))
+            elif is_cacheable_result(result):
+                self._result_cache.set(key, result, ttl)
+            return result
+    
+    async def _execute(self, spec: ToolSpec, kwargs: Dict[str, Any], record: Any,
+                       timeout: Optional[float] = None, fmt: str = TEXT) -> Dict[str, Any]:
+        """执行工具并转换为 tools/call 的 result，记录格式化耗时与返回大小"""
+        if spec.uses_data_modules:
+            await self._ensure_data_modules()
+        # 所有处理函数（包括 cheap 类别）都在工作线程中执行：处理函数是否阻塞无法从开销类别保证，
+        # 如 calculate 的 eval 可能执行很久，不能占用事件循环
+        # 任务被取消（超时或客户端取消）时同时取消标记，工作线程在下一次访问上游前停止
+        token = CancelToken(timeout)
+        reset = CURRENT_TOKEN.set(token)
+        try:
+            result = await self._run_upstream(spec, kwargs)
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+        except CallCancelled:
+            # 工作线程先于事件循环发现已过截止时间
+            raise asyncio.TimeoutError() from None
+        finally:
+            CURRENT_TOKEN.reset(reset)
+        
+        started = time.perf_counter()
+        call_result = to_result(result, fmt)
+        record.format = time.perf_counter() - started
+        record.payload_bytes = sum(len(item["text"].encode("utf-8")) for item in call_result["content"])
+        record.error = bool(call_result.get("isError"))
+        return call_result
+    
+    def shutdown(self) -> None:
+        """释放工作线程池"""
+        self._executor.shutdown(wait=False)
     
     def _get_tools(self) -> List[Dict[str, Any]]:
         """Get available tools following MCP tool schema."""
-        return [
-            {
-                "name": "echo",
-                "description": "Echo back the input text",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "text": {
-                            "type": "string",
-                            "description": "Text to echo back"
-                        }
-                    },
-                    "required": ["text"]
-                }
-            },
-            {
-                "name": "calculate",
-                "description": "Perform basic arithmetic calculations",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "expression": {
-                            "type": "string",
-                            "description": "Mathematical expression to evaluate"
-                        }
-                    },
-                    "required": ["expression"]
-                }
-            },
-            {
-                "name": "get_time",
-                "description": "Get current time information",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {}
-                }
-            },
-            {
-                "name": "get_stock_spot",
-                "description": "获取股票实时行情数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码（如：000001），为空则返回所有股票"
-                        }
-                    },
-                    "required": []
-                }
-            },
-            {
-                "name": "get_stock_history",
-                "description": "获取股票历史数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码（如：000001）",
-                        },
-                        "period": {
-                            "type": "string",
-                            "description": "数据周期：daily(日线), weekly(周线), monthly(月线)",
-                            "enum": ["daily", "weekly", "monthly"]
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_fund_info",
-                "description": "获取基金信息",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "基金代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_index_data",
-                "description": "获取指数数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "指数代码（如：000001 上证指数），为空则返回主要指数"
-                        }
-                    },
-                    "required": []
-                }
-            },
-            {
-                "name": "get_futures_data",
-                "description": "获取期货数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "期货代码，为空则返回主要期货"
-                        }
-                    },
-                    "required": []
-                }
-            },
-            {
-                "name": "get_industry_news",
-                "description": "获取指定行业的新闻资讯",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "industry": {
-                            "type": "string",
-                            "description": "行业名称（如：technology, finance, healthcare, new_energy等）",
-                            "enum": list(INDUSTRY_MAPPING.keys())
-                        },
-                        "days": {
-                            "type": "number",
-                            "description": "查询天数（默认7天）"
-                        }
-                    },
-                    "required": ["industry"]
-                }
-            },
-            {
-                "name": "get_policy_support",
-                "description": "获取行业政策支持信息",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "industry": {
-                            "type": "string",
-                            "description": "行业名称",
-                            "enum": list(INDUSTRY_MAPPING.keys())
-                        }
-                    },
-                    "required": ["industry"]
-                }
-            },
-            {
-                "name": "get_investment_events",
-                "description": "获取投资发展重大事项",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "industry": {
-                            "type": "string",
-                            "description": "行业名称",
-                            "enum": list(INDUSTRY_MAPPING.keys())
-                        }
-                    },
-                    "required": ["industry"]
-                }
-            },
-            {
-                "name": "get_market_heat",
-                "description": "获取市场热度分析",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "industry": {
-                            "type": "string",
-                            "description": "行业名称",
-                            "enum": list(INDUSTRY_MAPPING.keys())
-                        }
-                    },
-                    "required": ["industry"]
-                }
-            },
-            {
-                "name": "get_industry_overview",
-                "description": "获取行业综合概览报告",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "industry": {
-                            "type": "string",
-                            "description": "行业名称",
-                            "enum": list(INDUSTRY_MAPPING.keys())
-                        }
-                    },
-                    "required": ["industry"]
-                }
-            },
-            {
-                "name": "get_stock_financials",
-                "description": "获取股票财务数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_stock_valuation",
-                "description": "获取股票估值数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_stock_technical_indicators",
-                "description": "获取股票技术指标",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_stock_capital_flow",
-                "description": "获取股票资金流向数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_stock_analyst_ratings",
-                "description": "获取分析师评级数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_stock_company_info",
-                "description": "获取公司基本信息",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            # ========== 新增工具：深度财务分析 ==========
-            {
-                "name": "get_stock_financial_analysis",
-                "description": "获取股票深度财务分析指标（ROE、ROA、毛利率、资产负债率等）",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_stock_institute_hold",
-                "description": "获取机构持股信息",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_stock_shareholder_info",
-                "description": "获取股东持股变动信息",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_stock_lhb_data",
-                "description": "获取龙虎榜数据（可指定股票代码）",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码（可选），为空则返回所有龙虎榜数据"
-                        }
-                    },
-                    "required": []
-                }
-            },
-            {
-                "name": "get_stock_hot_rank",
-                "description": "获取热门股票排名",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {}
-                }
-            },
-            {
-                "name": "get_stock_news",
-                "description": "获取股票相关新闻",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "symbol": {
-                            "type": "string",
-                            "description": "股票代码"
-                        }
-                    },
-                    "required": ["symbol"]
-                }
-            },
-            {
-                "name": "get_macro_economic_data",
-                "description": "获取宏观经济数据（GDP、CPI、PMI等）",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {}
-                }
-            },
-            {
-                "name": "get_northbound_capital",
-                "description": "获取北向资金数据",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {}
-                }
-            }
-        ]
+        return self.registry.schemas()
     
     async def handle_initialize(self, request_id: Any) -> Dict[str, Any]:
         """Handle initialize request."""
+        if config.WARMUP_IMPORTS:
+            self.start_warmup()
         return {
             "jsonrpc": "2.0",
             "id": request_id,
@@ -749,406 +716,64 @@ class FixedMCPServer:
             }
         }
     
-    async def handle_call_tool(self, request_id: Any, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle tools/call request."""
+    def cancel_request(self, request_id: Any, scope: Any = None) -> bool:
+        """取消进行中的工具调用（MCP ``notifications/cancelled``），返回是否找到该调用"""
+        if not isinstance(request_id, (str, int)):
+            return False
+        task = self._running.pop((scope, request_id), None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+    
+    async def _run_cancellable(self, request_id: Any, scope: Any, call: Any) -> Any:
+        """登记进行中的调用以便客户端取消；被客户端取消时返回 None"""
+        task = asyncio.ensure_future(call)
+        if not isinstance(request_id, (str, int)):
+            return await task
+        key = (scope, request_id)
+        self._running[key] = task
         try:
-            if name == "echo":
-                if not arguments or "text" not in arguments:
-                    raise ValueError("Missing 'text' argument")
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": arguments["text"]
-                            }
-                        ]
-                    }
-                }
-            
-            elif name == "calculate":
-                if not arguments or "expression" not in arguments:
-                    raise ValueError("Missing 'expression' argument")
-                try:
-                    # Basic safe evaluation
-                    result = eval(arguments["expression"], {"__builtins__": {}})
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": f"Result: {result}"
-                                }
-                            ]
-                        }
-                    }
-                except Exception as e:
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": f"Error: {str(e)}"
-                                }
-                            ]
-                        }
-                    }
-            
-            elif name == "get_time":
-                import datetime
-                current_time = datetime.datetime.now()
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": f"Current time: {current_time.strftime('%Y-%m-%d %H:%M:%S')}"
-                            }
-                        ]
-                    }
-                }
-            
-            # Finance tools
-            elif name == "get_stock_spot":
-                symbol = arguments.get("symbol", "") if arguments else ""
-                try:
-                    result = FinanceDataService.get_stock_spot(symbol)
-                    # 确保返回格式正确
-                    if result and isinstance(result, list):
-                        content_list = []
-                        for content in result:
-                            if hasattr(content, 'text'):
-                                content_list.append({"type": "text", "text": content.text})
-                            elif isinstance(content, dict) and 'text' in content:
-                                content_list.append({"type": "text", "text": content['text']})
-                            else:
-                                content_list.append({"type": "text", "text": str(content)})
-                        
-                        return {
-                            "jsonrpc": "2.0",
-                            "id": request_id,
-                            "result": {
-                                "content": content_list
-                            }
-                        }
-                    else:
-                        return {
-                            "jsonrpc": "2.0",
-                            "id": request_id,
-                            "result": {
-                                "content": [{"type": "text", "text": "未获取到股票数据"}]
-                            }
-                        }
-                except Exception as e:
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {
-                            "content": [{"type": "text", "text": f"获取股票数据失败: {str(e)}"}]
-                        }
-                    }
-            
-            elif name == "get_stock_history":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                period = arguments.get("period", "daily")
-                result = FinanceDataService.get_stock_history(symbol, period)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_fund_info":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_fund_info(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_index_data":
-                symbol = arguments.get("symbol", "") if arguments else ""
-                result = FinanceDataService.get_index_data(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_futures_data":
-                symbol = arguments.get("symbol", "") if arguments else ""
-                result = FinanceDataService.get_futures_data(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            # THS Data tools
-            elif name == "get_industry_news":
-                if not arguments or "industry" not in arguments:
-                    raise ValueError("Missing 'industry' argument")
-                industry = arguments["industry"]
-                days = arguments.get("days", 7)
-                result = THSDataService.get_industry_news(industry, days)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_policy_support":
-                if not arguments or "industry" not in arguments:
-                    raise ValueError("Missing 'industry' argument")
-                industry = arguments["industry"]
-                result = THSDataService.get_policy_support(industry)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_investment_events":
-                if not arguments or "industry" not in arguments:
-                    raise ValueError("Missing 'industry' argument")
-                industry = arguments["industry"]
-                result = THSDataService.get_investment_events(industry)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_market_heat":
-                if not arguments or "industry" not in arguments:
-                    raise ValueError("Missing 'industry' argument")
-                industry = arguments["industry"]
-                result = THSDataService.get_market_heat(industry)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_industry_overview":
-                if not arguments or "industry" not in arguments:
-                    raise ValueError("Missing 'industry' argument")
-                industry = arguments["industry"]
-                result = THSDataService.get_industry_overview(industry)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            # New finance tools
-            elif name == "get_stock_financials":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_financials(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_valuation":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_valuation(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_technical_indicators":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_technical_indicators(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_capital_flow":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_capital_flow(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_analyst_ratings":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_analyst_ratings(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_company_info":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_company_info(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            # ========== 新增工具调用 ==========
-            
-            elif name == "get_stock_financial_analysis":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_financial_analysis(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_institute_hold":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_institute_hold(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_shareholder_info":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_shareholder_info(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_lhb_data":
-                symbol = arguments.get("symbol", "") if arguments else ""
-                result = FinanceDataService.get_stock_lhb_data(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_hot_rank":
-                result = FinanceDataService.get_stock_hot_rank()
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_stock_news":
-                if not arguments or "symbol" not in arguments:
-                    raise ValueError("Missing 'symbol' argument")
-                symbol = arguments["symbol"]
-                result = FinanceDataService.get_stock_news(symbol)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_macro_economic_data":
-                result = FinanceDataService.get_macro_economic_data()
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            elif name == "get_northbound_capital":
-                result = FinanceDataService.get_northbound_capital()
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": content.text} for content in result]
-                    }
-                }
-            
-            else:
+            return await task
+        except asyncio.CancelledError:
+            if self._running.get(key) is task:
+                # 仍在登记中说明是服务器自身被取消（如关闭连接），而不是客户端取消
+                raise
+            return None
+        finally:
+            if self._running.get(key) is task:
+                del self._running[key]
+    
+    async def handle_call_tool(self, request_id: Any, name: str, arguments: Dict[str, Any],
+                               meta: Optional[Dict[str, Any]] = None,
+                               scope: Any = None) -> Optional[Dict[str, Any]]:
+        """Handle tools/call request; a call cancelled by the client produces no response."""
+        spec = self.registry.get(name)
+        timeout = None
+        try:
+            if spec is None:
                 raise ValueError(f"Unknown tool: {name}")
-                
+            kwargs = spec.bind(arguments)
+            fmt = spec.output_format(arguments)
+            timeout = self.call_timeout(spec, meta)
+            result = await self._run_cancellable(request_id, scope, self.call_tool(spec, kwargs, timeout, fmt))
+            if result is None:
+                # 按 MCP 规范，已取消的请求不再响应
+                return None
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": result
+            }
+        except asyncio.TimeoutError:
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {
+                    "code": -32603,
+                    "message": f"Tool execution timed out after {timeout:g}s"
+                }
+            }
         except Exception as e:
             return {
                 "jsonrpc": "2.0",
@@ -1159,14 +784,23 @@ class FixedMCPServer:
                 }
             }
     
-    async def process_message(self, message: str) -> str:
-        """Process incoming JSON-RPC message."""
+    @staticmethod
+    def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+    
+    async def handle_request(self, data: Any, scope: Any = None) -> Optional[Dict[str, Any]]:
+        """Handle one JSON-RPC request object; notifications (no ``id``) produce no response.
+
+        ``scope`` 区分不同客户端（HTTP 会话）的请求 id，取消通知只作用于同一 scope 内的调用。
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("method", ""), str):
+            return self._error(None, -32600, "Invalid Request")
+        method = data.get("method", "")
+        params = data.get("params") or {}
+        request_id = data.get("id")
+        is_notification = "id" not in data
+        
         try:
-            data = json.loads(message)
-            method = data.get("method", "")
-            params = data.get("params", {})
-            request_id = data.get("id")
-            
             if method == "initialize":
                 result = await self.handle_initialize(request_id)
             elif method == "tools/list":  # Standard MCP method name
@@ -1174,63 +808,186 @@ class FixedMCPServer:
             elif method == "tools/call":  # Standard MCP method name
                 tool_name = params.get("name", "")
                 tool_args = params.get("arguments", {})
-                result = await self.handle_call_tool(request_id, tool_name, tool_args)
+                result = await self.handle_call_tool(request_id, tool_name, tool_args,
+                                                     params.get("_meta"), scope)
+            elif method == "notifications/cancelled":
+                self.cancel_request(params.get("requestId"), scope)
+                result = {"jsonrpc": "2.0", "id": request_id, "result": {}}
             elif method == "mcp:list-tools":  # Legacy method name for compatibility
                 result = await self.handle_list_tools(request_id)
             elif method == "mcp:call-tool":  # Legacy method name for compatibility
                 tool_name = params.get("name", "")
                 tool_args = params.get("arguments", {})
-                result = await self.handle_call_tool(request_id, tool_name, tool_args)
+                result = await self.handle_call_tool(request_id, tool_name, tool_args,
+                                                     params.get("_meta"), scope)
             else:
-                result = {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32601,
-                        "message": f"Method not found: {method}"
-                    }
-                }
-            
-            return json.dumps(result)
-            
+                result = self._error(request_id, -32601, f"Method not found: {method}")
         except Exception as e:
-            return json.dumps({
-                "jsonrpc": "2.0",
-                "id": data.get("id", 1) if 'data' in locals() else 1,
-                "error": {
-                    "code": -32700,
-                    "message": f"Parse error: {str(e)}"
-                }
-            })
+            result = self._error(request_id, -32603, f"Internal error: {str(e)}")
+        
+        return None if is_notification else result
+    
+    async def process_message(self, message: str, scope: Any = None) -> str:
+        """Process incoming JSON-RPC message (a single request or a batch array).
 
+        批量请求中的各项并发执行，相同的工具调用与上游请求在执行期间合并；
+        返回空字符串表示无需响应（只有通知）。
+        """
+        try:
+            data = json.loads(message)
+        except ValueError as e:
+            return json.dumps(self._error(None, -32700, f"Parse error: {str(e)}"))
+        
+        if isinstance(data, list):
+            if not data:
+                return json.dumps(self._error(None, -32600, "Invalid Request: empty batch"))
+            responses = await asyncio.gather(*(self.handle_request(item, scope) for item in data))
+            responses = [response for response in responses if response is not None]
+            return json.dumps(responses) if responses else ""
+        
+        response = await self.handle_request(data, scope)
+        return json.dumps(response) if response is not None else ""
 
-async def main():
-    """Main server loop."""
-    server = FixedMCPServer()
+
+class StdioDispatcher:
+    """Read JSON-RPC lines continuously and answer each one as soon as it finishes.
+
+    每一行消息（单个请求或批量数组）都在独立的任务中处理，响应按完成顺序写出，
+    客户端通过 JSON-RPC ``id`` 匹配；只有通知的消息不写出响应。
+    """
     
-    # Read from stdin, write to stdout
-    while True:
-        try:
-            line = await asyncio.get_event_loop().run_in_executor(None, sys.stdin.readline)
+    def __init__(self, server: FixedMCPServer,
+                 reader: Optional[Callable[[], str]] = None,
+                 writer: Optional[Callable[[str], None]] = None):
+        self.server = server
+        self._reader = reader or sys.stdin.readline
+        self._writer = writer or self._write_stdout
+        self._pending: Set[asyncio.Task] = set()
+    
+    @staticmethod
+    def _write_stdout(response: str) -> None:
+        print(response, flush=True)
+    
+    async def run(self) -> None:
+        """持续读取输入直到 EOF，然后等待所有进行中的请求完成"""
+        loop = asyncio.get_running_loop()
+        while True:
+            line = await loop.run_in_executor(None, self._reader)
             if not line:
                 break
-                
+            
             line = line.strip()
             if line:
-                response = await server.process_message(line)
-                print(response, flush=True)
-                
+                task = asyncio.create_task(self._handle(line))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+        
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+    
+    async def _handle(self, line: str) -> None:
+        try:
+            response = await self.server.process_message(line)
         except Exception as e:
-            error_response = json.dumps({
+            response = json.dumps({
                 "jsonrpc": "2.0",
-                "id": 1,
+                "id": None,
                 "error": {
                     "code": -32603,
                     "message": f"Internal error: {str(e)}"
                 }
             })
-            print(error_response, flush=True)
+        if response:
+            self._writer(response)
+
+
+def isolate_fixture_data() -> Optional[Path]:
+    """录制/回放模式下把本地数据（磁盘缓存、K线库、证券代码表）切换到夹具目录下新建的目录
+
+    共享的缓存守护进程同样会带入其他进程的结果，一并停用。返回新的数据目录，未开启夹具模式时返回 None。
+    """
+    if record_replay.FIXTURES.mode == record_replay.OFF:
+        return None
+    data_dir = record_replay.FIXTURES.isolated_data_dir()
+    config.DATA_DIR = data_dir
+    DATA_CACHE.disk_dir = data_dir / "cache"
+    DATA_CACHE.shared = None
+    DATA_CACHE.clear_memory()
+    if finance_tools.loaded:
+        finance_tools.use_data_dir(data_dir)
+    return data_dir
+
+
+async def main(max_concurrency: Optional[int] = None, transport: str = "stdio",
+               host: Optional[str] = None, port: Optional[int] = None):
+    """Main server loop."""
+    isolate_fixture_data()
+    server = FixedMCPServer(max_concurrency=max_concurrency)
+    if config.EAGER_IMPORTS:
+        finance_tools.load()
+    
+    try:
+        if transport == "http":
+            # 一个进程服务多个客户端，共用缓存、连接池与限速器
+            http = MCPHttpTransport(server, host or config.LISTEN_HOST,
+                                    config.LISTEN_PORT if port is None else port,
+                                    allowed_origins=config.ALLOWED_ORIGINS)
+            await http.serve_forever()
+        else:
+            # Read from stdin, write to stdout
+            await StdioDispatcher(server).run()
+    finally:
+        server.shutdown()
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Finance MCP server (stdio / streamable HTTP)")
+    parser.add_argument(
+        "--transport",
+        choices=("stdio", "http"),
+        default=config.TRANSPORT if config.TRANSPORT in ("stdio", "http") else "stdio",
+        help="传输方式：stdio 或 http（Streamable HTTP 与 SSE） (默认: 环境变量 FINANCE_MCP_TRANSPORT 或 stdio)"
+    )
+    parser.add_argument(
+        "--host",
+        default=None,
+        help=f"HTTP 传输的监听地址 (默认: {config.LISTEN_HOST})"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help=f"HTTP 传输的监听端口 (默认: {config.LISTEN_PORT})"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help=f"同时执行的工具调用数量上限 (默认: {config.MAX_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--fixture-mode",
+        choices=record_replay.MODES,
+        default=None,
+        help="离线夹具模式：record 录制上游响应，replay 只回放录制的响应 (默认: 环境变量 FINANCE_MCP_FIXTURE_MODE 或 off)"
+    )
+    parser.add_argument(
+        "--fixture-dir",
+        default=None,
+        help="夹具目录 (默认: 环境变量 FINANCE_MCP_FIXTURE_DIR 或 数据目录/fixtures)"
+    )
+    parser.add_argument(
+        "--fixture-latency",
+        type=float,
+        default=None,
+        help="回放时为每次上游请求注入的延迟（秒）"
+    )
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_arguments()
+    record_replay.FIXTURES.configure(args.fixture_mode, args.fixture_dir, args.fixture_latency)
+    asyncio.run(main(max_concurrency=args.max_concurrency, transport=args.transport,
+                     host=args.host, port=args.port))
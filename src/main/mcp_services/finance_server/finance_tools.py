@@ -1,11 +1,74 @@
 """Financial data tools using akshare."""
-import akshare as ak
+import akshare as _akshare
+import contextvars
+import json
 import pandas as pd
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import mcp.types as types
-import requests
-import time
 import random
+import sys
+
+from . import cancellation, config
+from .adaptive_throttle import ADAPTIVE_THROTTLE
+from .cancellation import CallCancelled
+from .circuit_breaker import CIRCUIT_BREAKERS, is_upstream_failure
+from .data_cache import DATA_CACHE, CachedAkshare, stale_notice
+from .history_store import HistoryStore
+from .http_client import HTTP_CLIENT
+from .output_format import DataResult, ErrorText
+from .rate_limiter import RATE_LIMITS
+from .record_replay import FIXTURES
+from .security_master import FUND, SecurityMaster, default_sources
+from .single_flight import UPSTREAM_FLIGHTS
+from .snapshot_tables import SnapshotManager
+
+# 所有 akshare 调用都经过分层缓存（内存 LRU + 磁盘）
+ak = CachedAkshare(_akshare, DATA_CACHE)
+
+
+def _history_store(data_dir: Path) -> HistoryStore:
+    """本地K线库：只从网络增量拉取最后一根K线之后的数据"""
+    return HistoryStore(
+        data_dir / "history.db",
+        fetcher=lambda **kwargs: ak.stock_zh_a_hist(**kwargs),
+        intraday_ttl=config.HISTORY_INTRADAY_TTL,
+    )
+
+
+def _security_master(data_dir: Path) -> SecurityMaster:
+    """本地证券代码表：名称、交易所、行业查询不访问网络，每日后台刷新"""
+    return SecurityMaster(
+        data_dir / "securities.db",
+        default_sources(ak),
+        refresh_seconds=config.SECURITY_MASTER_REFRESH_HOURS * 3600,
+    )
+
+
+HISTORY_STORE = _history_store(config.DATA_DIR)
+SECURITY_MASTER = _security_master(config.DATA_DIR)
+
+
+def use_data_dir(data_dir: Path) -> None:
+    """把K线库与证券代码表切换到另一个数据目录（录制/回放时使用独立目录）"""
+    global HISTORY_STORE, SECURITY_MASTER
+    HISTORY_STORE = _history_store(data_dir)
+    SECURITY_MASTER = _security_master(data_dir)
+
+# 全市场表：每个刷新窗口下载一次，按股票代码建立哈希索引
+SNAPSHOTS = SnapshotManager()
+SNAPSHOTS.register("stock_analyst_rank_em", lambda: ak.stock_analyst_rank_em())
+SNAPSHOTS.register("stock_institute_hold", lambda: ak.stock_institute_hold())
+SNAPSHOTS.register("stock_lhb_detail_em", lambda: ak.stock_lhb_detail_em())
+SNAPSHOTS.register("stock_zh_a_spot_em", lambda: ak.stock_zh_a_spot_em())
+
+# 历史数据上游故障后重试前的等待（秒）
+HISTORY_RETRY_DELAY = 2.0
+
+# 批量工具单次最多处理的股票数量，以及并行拉取使用的线程池
+MAX_BATCH_SYMBOLS = 200
+BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="finance-batch")
 
 # 模拟浏览器请求的User-Agent列表
 USER_AGENTS = [
@@ -20,35 +83,93 @@ def get_random_user_agent():
     """获取随机User-Agent"""
     return random.choice(USER_AGENTS)
 
-def make_request_with_retry(url, params=None, max_retries=3):
-    """带重试机制的请求函数"""
-    session = requests.Session()
-    
-    # 设置请求头模拟浏览器
-    headers = {
-        'User-Agent': get_random_user_agent(),
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-    
-    for attempt in range(max_retries):
+def make_request_with_retry(url, params=None):
+    """通过共享连接池发起请求（重试与退避在传输层完成）"""
+    return HTTP_CLIENT.get(url, params=params, headers={'User-Agent': get_random_user_agent()})
+
+
+def normalize_symbols(symbols: Union[str, List[str], None]) -> List[str]:
+    """规范化批量股票代码：支持列表或逗号分隔字符串，去重并保持顺序"""
+    if not symbols:
+        return []
+    if isinstance(symbols, str):
+        symbols = symbols.replace("，", ",").split(",")
+    seen = []
+    for symbol in symbols:
+        symbol = str(symbol).strip()
+        if symbol and symbol not in seen:
+            seen.append(symbol)
+    if len(seen) > MAX_BATCH_SYMBOLS:
+        raise ValueError(f"一次最多查询 {MAX_BATCH_SYMBOLS} 只股票")
+    return seen
+
+
+def fan_out(symbols: List[str], fetch: Callable[[str], Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """并行获取多只股票的数据；上游并发由按站点的并发限制约束"""
+    # 每个任务复制一份上下文，使上游耗时计入当前工具调用
+    futures = {symbol: BATCH_EXECUTOR.submit(contextvars.copy_context().run, fetch, symbol) for symbol in symbols}
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for symbol, future in futures.items():
         try:
-            response = session.get(url, params=params, headers=headers, timeout=30)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.RequestException as e:
-            print(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                # 指数退避策略
-                sleep_time = (2 ** attempt) + random.uniform(0, 1)
-                print(f"等待 {sleep_time:.2f} 秒后重试...")
-                time.sleep(sleep_time)
-            else:
-                raise e
-    return None
+            results[symbol] = future.result()
+        except CallCancelled:
+            # 工具调用已取消：尚未开始的股票不再请求
+            for pending in futures.values():
+                pending.cancel()
+            raise
+        except Exception as e:
+            errors[symbol] = str(e)
+    return results, errors
+
+
+def market_of(symbol: str) -> str:
+    """股票所属交易所（sh/sz/bj），优先查本地证券代码表"""
+    return SECURITY_MASTER.market_of(symbol)
+
+
+def security_name(symbol: str) -> str:
+    """股票简称，代码表中没有时返回“未知”"""
+    return SECURITY_MASTER.name_of(symbol) or "未知"
+
+
+def basic_indicators(latest: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """从结构化指标中取出批量表格使用的主要指标（均线、Wilder RSI、MACD、KDJ）"""
+    return {
+        "close": latest["close"],
+        "ma5": latest["ma"]["ma5"],
+        "ma20": latest["ma"]["ma20"],
+        "ma60": latest["ma"]["ma60"],
+        "rsi": latest["rsi"]["rsi14"],
+        "dif": latest["macd"]["dif"],
+        "dea": latest["macd"]["dea"],
+        "k": latest["kdj"]["k"],
+        "d": latest["kdj"]["d"],
+        "j": latest["kdj"]["j"],
+    }
+
+
+def format_value(value: Optional[float], digits: int = 2, unit: str = "") -> str:
+    """格式化指标值，数据不足（None）时显示“数据不足”"""
+    if value is None:
+        return "数据不足"
+    return f"{value:,.{digits}f}{unit}"
+
+
+def format_batch_result(title: str, frame: pd.DataFrame, errors: Dict[str, str]) -> str:
+    """把批量结果合并为一张紧凑的文本表"""
+    text = f"{title} (共 {len(frame)} 条):\n"
+    if not frame.empty:
+        text += frame.to_string(index=False) + "\n"
+    if errors:
+        text += "\n获取失败:\n" + "\n".join(f"- {symbol}: {error}" for symbol, error in errors.items())
+    return text
+
+
+def batch_result(title: str, frame: pd.DataFrame, errors: Dict[str, str]) -> DataResult:
+    """批量结果：文本格式为合并的文本表，JSON 格式附带获取失败的股票"""
+    return DataResult(f"{title} (共 {len(frame)} 条)", frame=frame,
+                      text=lambda: format_batch_result(title, frame, errors), extra={"errors": errors})
 
 
 class FinanceDataService:
@@ -58,20 +179,30 @@ class FinanceDataService:
     def get_stock_spot(symbol: str) -> List[types.TextContent]:
         """Get latest available stock data (historical)."""
         try:
-            # 获取最近的历史数据作为"最新"数据
+            # 获取最近的历史数据作为"最新"数据（本地K线库增量更新）
             # 注意：不要使用print，会干扰MCP协议通信
             # print(f"获取股票 {symbol} 的最新历史数据...")
-            stock_data = ak.stock_zh_a_hist(symbol=symbol, period="daily", start_date="20250101")
+            stock_data = HISTORY_STORE.get_history(symbol, period="daily")
             
             if stock_data.empty:
                 return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的数据")]
             
             # 获取最新的一条数据
             latest_data = stock_data.iloc[-1]
+            record = {
+                "股票代码": symbol,
+                "股票名称": security_name(symbol),
+                "所属交易所": market_of(symbol),
+                "所属行业": SECURITY_MASTER.industry_of(symbol) or "N/A",
+                **latest_data.reindex(['日期', '开盘', '收盘', '最高', '最低', '涨跌幅', '涨跌额',
+                                       '成交量', '成交额', '振幅']).to_dict(),
+            }
             
             stock_info = f"""
 股票代码: {symbol}
-股票名称: 阳光电源 (示例)
+股票名称: {record['股票名称']}
+所属交易所: {record['所属交易所']}
+所属行业: {record['所属行业']}
 最新收盘价: {latest_data['收盘']:.2f} 元
 交易日期: {latest_data['日期']}
 涨跌幅: {latest_data['涨跌幅']:.2f}%
@@ -83,73 +214,90 @@ class FinanceDataService:
 振幅: {latest_data['振幅']:.2f}%
 开盘价: {latest_data['开盘']:.2f} 元
 """
-            return [types.TextContent(type="text", text=stock_info)]
+            return [DataResult(f"股票 {symbol} 最新行情", record=record, text=stock_info)]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取股票数据失败: {str(e)}")]
+            return [ErrorText(f"获取股票数据失败: {str(e)}")]
     
     @staticmethod
     def get_stock_history(symbol: str, period: str = "daily") -> List[types.TextContent]:
         """Get historical stock data."""
         try:
-            # 使用更稳定的数据源，添加重试机制
-            import time
+            # 使用更稳定的数据源，上游故障时重试（只推迟本次调用，不影响同一站点的其他请求）
             max_retries = 3
             
             for attempt in range(max_retries):
                 try:
-                    if period == "daily":
-                        stock_data = ak.stock_zh_a_hist(symbol=symbol, period="daily")
-                    elif period == "weekly":
-                        stock_data = ak.stock_zh_a_hist(symbol=symbol, period="weekly")
-                    elif period == "monthly":
-                        stock_data = ak.stock_zh_a_hist(symbol=symbol, period="monthly")
+                    if period in ("daily", "weekly", "monthly"):
+                        stock_data = HISTORY_STORE.get_history(symbol, period=period)
                     else:
-                        return [types.TextContent(type="text", text="不支持的周期类型，请使用 daily, weekly 或 monthly")]
+                        return [ErrorText("不支持的周期类型，请使用 daily, weekly 或 monthly")]
                     
                     if stock_data.empty:
                         return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的历史数据")]
                     
-                    # Format the data
-                    formatted_data = stock_data.head(20).to_string(index=False)  # Limit to first 20 records
-                    return [types.TextContent(type="text", text=f"股票 {symbol} 历史数据 ({period}):\n{formatted_data}")]
+                    # Limit to first 20 records (rendered in the requested output format)
+                    return [DataResult(f"股票 {symbol} 历史数据 ({period})", frame=stock_data.head(20))]
                     
                 except Exception as e:
-                    if attempt < max_retries - 1:
-                        print(f"获取历史数据失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-                        time.sleep(2)  # 等待2秒后重试
+                    # 代码不存在等输入错误重试也不会成功
+                    if attempt < max_retries - 1 and is_upstream_failure(e):
+                        print(f"获取历史数据失败 (尝试 {attempt + 1}/{max_retries}): {e}", file=sys.stderr)
+                        cancellation.sleep(HISTORY_RETRY_DELAY)
                         continue
                     else:
                         raise e
                         
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取历史数据失败: {str(e)}")]
+            return [ErrorText(f"获取历史数据失败: {str(e)}")]
     
     @staticmethod
     def get_fund_info(symbol: str) -> List[types.TextContent]:
         """Get fund information."""
         try:
-            fund_data = ak.fund_em_open_fund_info(fund=symbol, indicator="单位净值走势")
+            fund_data = ak.fund_open_fund_info_em(symbol=symbol, indicator="单位净值走势")
             
             if fund_data.empty:
                 return [types.TextContent(type="text", text=f"未找到基金代码: {symbol}")]
             
-            # Get basic fund info
-            fund_info = ak.fund_em_fund_name()
-            fund_name = fund_info[fund_info['基金代码'] == symbol]['基金简称'].iloc[0] if not fund_info.empty else "未知"
-            
-            latest_data = fund_data.iloc[0]
+            # 基金名称与类型取自本地基金列表
+            fund = SECURITY_MASTER.lookup(symbol, FUND)
+            
+            latest_data = fund_data.iloc[-1]
+            record = {
+                "基金代码": symbol,
+                "基金名称": fund.name if fund else "未知",
+                "基金类型": (fund.category if fund else "") or "N/A",
+                "净值日期": latest_data['净值日期'],
+                "单位净值": latest_data['单位净值'],
+                "日增长率": latest_data['日增长率'],
+            }
             result = f"""
 基金代码: {symbol}
-基金名称: {fund_name}
+基金名称: {record['基金名称']}
+基金类型: {record['基金类型']}
 净值日期: {latest_data['净值日期']}
 单位净值: {latest_data['单位净值']}
 日增长率: {latest_data['日增长率']}%
-累计净值: {latest_data['累计净值']}
 """
-            return [types.TextContent(type="text", text=result)]
+            return [DataResult(f"基金 {symbol}", record=record, text=result)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取基金数据失败: {str(e)}")]
+            return [ErrorText(f"获取基金数据失败: {str(e)}")]
+    
+    @staticmethod
+    def search_fund(query: str, limit: int = 10) -> List[types.TextContent]:
+        """按基金代码、名称或拼音缩写搜索基金（使用本地基金列表）"""
+        try:
+            funds = SECURITY_MASTER.search(query, FUND, limit=max(1, min(int(limit), 50)))
+            if not funds:
+                return [types.TextContent(type="text", text=f"未找到匹配的基金: {query}")]
+            frame = pd.DataFrame(
+                [(fund.code, fund.name, fund.category, fund.alias) for fund in funds],
+                columns=['基金代码', '基金简称', '基金类型', '拼音缩写'],
+            )
+            return [DataResult(f"基金搜索结果 \"{query}\" (共 {len(frame)} 条)", frame=frame)]
+        except Exception as e:
+            return [ErrorText(f"搜索基金失败: {str(e)}")]
     
     @staticmethod
     def get_index_data(symbol: str = "000001") -> List[types.TextContent]:
@@ -162,6 +310,7 @@ class FinanceDataService:
             if index_data.empty:
                 return [types.TextContent(type="text", text=f"未找到指数代码: {symbol}")]
             
+            columns = ['代码', '名称', '最新价', '涨跌幅', '涨跌额', '成交量', '成交额', '今开', '昨收', '最高', '最低']
             result = []
             for _, row in index_data.iterrows():
                 index_info = f"""
@@ -177,11 +326,11 @@ class FinanceDataService:
 最高: {row['最高']}
 最低: {row['最低']}
 """
-                result.append(types.TextContent(type="text", text=index_info))
+                result.append(index_info)
             
-            return result
+            return [DataResult("指数行情", frame=index_data[columns], text="".join(result))]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取指数数据失败: {str(e)}")]
+            return [ErrorText(f"获取指数数据失败: {str(e)}")]
     
     @staticmethod
     def get_futures_data(symbol: str = "") -> List[types.TextContent]:
@@ -195,8 +344,9 @@ class FinanceDataService:
             if futures_data.empty:
                 return [types.TextContent(type="text", text=f"未找到期货代码: {symbol}")]
             
+            futures_data = futures_data.head(10)  # Limit to first 10
             result = []
-            for _, row in futures_data.head(10).iterrows():  # Limit to first 10
+            for _, row in futures_data.iterrows():
                 futures_info = f"""
 期货代码: {row['symbol']}
 名称: {row['name']}
@@ -209,11 +359,13 @@ class FinanceDataService:
 最低: {row['low']}
 昨收: {row['settlement']}
 """
-                result.append(types.TextContent(type="text", text=futures_info))
+                result.append(futures_info)
             
-            return result
+            columns = ['symbol', 'name', 'close', 'changepercent', 'volume', 'position', 'open', 'high', 'low',
+                       'settlement']
+            return [DataResult("期货行情", frame=futures_data[columns], text="".join(result))]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取期货数据失败: {str(e)}")]
+            return [ErrorText(f"获取期货数据失败: {str(e)}")]
 
     @staticmethod
     def get_stock_financials(symbol: str) -> List[types.TextContent]:
@@ -241,9 +393,10 @@ class FinanceDataService:
 
 完整财务数据包含多个季度历史数据，建议直接查看原始数据获取详细信息。
 """
-            return [types.TextContent(type="text", text=financial_info)]
+            record = {"股票代码": symbol, "归母净利润(2025Q3)": net_profit, "营业总收入(2025Q2)": total_revenue}
+            return [DataResult(f"股票 {symbol} 财务数据", record=record, text=financial_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取财务数据失败: {str(e)}")]
+            return [ErrorText(f"获取财务数据失败: {str(e)}")]
 
     @staticmethod
     def get_stock_valuation(symbol: str) -> List[types.TextContent]:
@@ -262,9 +415,10 @@ class FinanceDataService:
 总市值: {latest_data['value']:,.0f} 亿元
 估值日期: {latest_data['date']}
 """
-            return [types.TextContent(type="text", text=valuation_info)]
+            record = {"股票代码": symbol, "总市值(亿元)": latest_data['value'], "估值日期": latest_data['date']}
+            return [DataResult(f"股票 {symbol} 估值数据", record=record, text=valuation_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取估值数据失败: {str(e)}")]
+            return [ErrorText(f"获取估值数据失败: {str(e)}")]
 
     @staticmethod
     def get_stock_valuation_comprehensive(symbol: str) -> List[types.TextContent]:
@@ -290,10 +444,10 @@ class FinanceDataService:
                         valuation_data['pe'] = pe_data.iloc[0]['value']
                         valuation_data['pb'] = pb_data.iloc[0]['value']
                 except Exception as e:
-                    print(f"获取详细估值指标失败: {e}")
+                    print(f"获取详细估值指标失败: {e}", file=sys.stderr)
                     
             except Exception as e:
-                print(f"百度股市通估值数据获取失败: {e}")
+                print(f"百度股市通估值数据获取失败: {e}", file=sys.stderr)
                 valuation_data = None
             
             if valuation_data is None or valuation_data.empty:
@@ -319,64 +473,67 @@ class FinanceDataService:
 - 股息率: {dv_ratio}%
 - 总市值: {total_mv:,.0f} 亿元
 """
-            return [types.TextContent(type="text", text=valuation_info)]
+            record = {"股票代码": symbol, "数据来源": source_name, "市盈率(PE)": pe, "市净率(PB)": pb,
+                      "总市值(亿元)": total_mv}
+            return [DataResult(f"股票 {symbol} 综合估值", record=record, text=valuation_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取综合估值数据失败: {str(e)}")]
+            return [ErrorText(f"获取综合估值数据失败: {str(e)}")]
 
     @staticmethod
     def get_stock_technical_indicators(symbol: str) -> List[types.TextContent]:
         """获取股票技术指标"""
         try:
-            # 获取历史数据计算技术指标 - 使用不复权数据
-            stock_data = ak.stock_zh_a_hist(symbol=symbol, period="daily", adjust="")
+            # 使用不复权数据；指标状态随本地K线库持久化，只对新K线增量更新
+            latest = HISTORY_STORE.get_indicators(symbol, period="daily", adjust="")
             
-            if stock_data.empty:
+            if latest is None:
                 return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的历史数据")]
             
-            # 计算简单技术指标
-            latest_data = stock_data.iloc[-1]
-            prev_data = stock_data.iloc[-2] if len(stock_data) > 1 else latest_data
+            close = latest["close"]
+            ma, macd_values, kdj_values = latest["ma"], latest["macd"], latest["kdj"]
+            boll_values, levels = latest["boll"], latest["levels"]
             
-            # 计算RSI (简化版)
-            price_changes = stock_data['收盘'].diff()
-            gains = price_changes.where(price_changes > 0, 0)
-            losses = -price_changes.where(price_changes < 0, 0)
-            avg_gain = gains.tail(14).mean()
-            avg_loss = losses.tail(14).mean()
-            rsi = 100 - (100 / (1 + (avg_gain / avg_loss))) if avg_loss != 0 else 50
+            def position(value):
+                if value is None:
+                    return "数据不足"
+                return '上方' if close > value else '下方'
             
-            # 计算均线
-            ma5 = stock_data['收盘'].tail(5).mean()
-            ma20 = stock_data['收盘'].tail(20).mean()
-            ma60 = stock_data['收盘'].tail(60).mean()
+            macd_divergence = {"top": "顶背离", "bottom": "底背离"}.get(latest["divergence"]["macd"], "无")
+            volume_divergence = "是" if latest["divergence"]["volume_price"] else "否"
             
             technical_info = f"""
 股票代码: {symbol}
-技术指标分析:
-- MA5: {ma5:.2f} 元
-- MA20: {ma20:.2f} 元  
-- MA60: {ma60:.2f} 元
-- RSI(14): {rsi:.2f}
-- 当前价格: {latest_data['收盘']:.2f} 元
-- 相对MA5位置: {'上方' if latest_data['收盘'] > ma5 else '下方'}
-- 相对MA20位置: {'上方' if latest_data['收盘'] > ma20 else '下方'}
-- 相对MA60位置: {'上方' if latest_data['收盘'] > ma60 else '下方'}
+交易日期: {latest['date']}
+当前价格: {format_value(close)} 元
+均线:
+- MA5: {format_value(ma['ma5'])} 元（价格位于{position(ma['ma5'])}）
+- MA10: {format_value(ma['ma10'])} 元（价格位于{position(ma['ma10'])}）
+- MA20: {format_value(ma['ma20'])} 元（价格位于{position(ma['ma20'])}）
+- MA60: {format_value(ma['ma60'])} 元（价格位于{position(ma['ma60'])}）
+MACD(12,26,9): DIF {format_value(macd_values['dif'], 3)} / DEA {format_value(macd_values['dea'], 3)} / MACD柱 {format_value(macd_values['hist'], 3)}
+KDJ(9,3,3): K {format_value(kdj_values['k'])} / D {format_value(kdj_values['d'])} / J {format_value(kdj_values['j'])}
+RSI(Wilder): RSI6 {format_value(latest['rsi']['rsi6'])} / RSI14 {format_value(latest['rsi']['rsi14'])}
+BOLL(20,2): 上轨 {format_value(boll_values['upper'])} / 中轨 {format_value(boll_values['mid'])} / 下轨 {format_value(boll_values['lower'])}
+ATR14: {format_value(latest['atr'], 3)}
+OBV: {format_value(latest['obv'], 0)}
+成交量均线: VOL_MA5 {format_value(latest['volume_ma']['vol_ma5'], 0)} / VOL_MA10 {format_value(latest['volume_ma']['vol_ma10'], 0)} / VOL_MA20 {format_value(latest['volume_ma']['vol_ma20'], 0)}
+支撑/阻力:
+- 20日: 支撑 {format_value(levels['support20'])} 元 / 阻力 {format_value(levels['resistance20'])} 元
+- 60日: 支撑 {format_value(levels['support60'])} 元 / 阻力 {format_value(levels['resistance60'])} 元
+背离:
+- MACD背离: {macd_divergence}
+- 量价背离: {volume_divergence}
 """
-            return [types.TextContent(type="text", text=technical_info)]
+            return [DataResult(f"股票 {symbol} 技术指标", record={"symbol": symbol, **latest}, text=technical_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取技术指标失败: {str(e)}")]
+            return [ErrorText(f"获取技术指标失败: {str(e)}")]
 
     @staticmethod
     def get_stock_capital_flow(symbol: str) -> List[types.TextContent]:
         """获取股票资金流向数据 - 使用东方财富个股资金流向数据"""
         try:
             # 确定市场类型
-            if symbol.startswith('6'):
-                market = 'sh'  # 上证
-            elif symbol.startswith('0') or symbol.startswith('3'):
-                market = 'sz'  # 深证
-            else:
-                market = 'sz'  # 默认深市
+            market = market_of(symbol)
             
             # 使用东方财富个股资金流向数据
             capital_flow = ak.stock_individual_fund_flow(stock=symbol, market=market)
@@ -430,30 +587,24 @@ class FinanceDataService:
 
 注: 数据包含历史120个交易日的资金流向记录。
 """
-            return [types.TextContent(type="text", text=capital_info)]
+            record = {"股票代码": symbol, **latest_data.to_dict()}
+            return [DataResult(f"股票 {symbol} 资金流向", record=record, text=capital_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取资金流向数据失败: {str(e)}")]
+            return [ErrorText(f"获取资金流向数据失败: {str(e)}")]
 
     @staticmethod
     def get_stock_analyst_ratings(symbol: str) -> List[types.TextContent]:
         """获取分析师评级数据"""
         try:
-            # 获取分析师评级数据 - 使用正确的参数
-            ratings_data = ak.stock_analyst_rank_em()
+            # 获取分析师评级数据 - 全市场表按代码索引
+            ratings_table = SNAPSHOTS.table("stock_analyst_rank_em")
             
-            if ratings_data.empty:
+            if ratings_table.frame().empty:
                 return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的分析师评级数据")]
             
-            # 尝试不同的列名来过滤股票数据
-            stock_ratings = None
-            if '代码' in ratings_data.columns:
-                stock_ratings = ratings_data[ratings_data['代码'] == symbol]
-            elif '股票代码' in ratings_data.columns:
-                stock_ratings = ratings_data[ratings_data['股票代码'] == symbol]
-            elif 'symbol' in ratings_data.columns:
-                stock_ratings = ratings_data[ratings_data['symbol'] == symbol]
+            stock_ratings = ratings_table.rows(symbol)
             
-            if stock_ratings is None or stock_ratings.empty:
+            if stock_ratings.empty:
                 return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的分析师评级数据")]
             
             latest_rating = stock_ratings.iloc[0]
@@ -468,9 +619,10 @@ class FinanceDataService:
 - 评级变动: {latest_rating.get('评级变动', 'N/A')}
 - 投资建议: {latest_rating.get('投资建议', 'N/A')}
 """
-            return [types.TextContent(type="text", text=rating_info)]
+            record = {"股票代码": symbol, **latest_rating.to_dict()}
+            return [DataResult(f"股票 {symbol} 分析师评级", record=record, text=rating_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取分析师评级失败: {str(e)}")]
+            return [ErrorText(f"获取分析师评级失败: {str(e)}")]
 
     @staticmethod
     def get_stock_company_info(symbol: str) -> List[types.TextContent]:
@@ -496,9 +648,10 @@ class FinanceDataService:
 - 总股本: {total_shares:,.0f} 股
 - 流通股本: {float_shares:,.0f} 股
 """
-            return [types.TextContent(type="text", text=company_info_text)]
+            record = {"股票代码": symbol, **dict(zip(company_info['item'], company_info['value']))}
+            return [DataResult(f"股票 {symbol} 公司信息", record=record, text=company_info_text)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取公司信息失败: {str(e)}")]
+            return [ErrorText(f"获取公司信息失败: {str(e)}")]
 
     # ========== 新增函数：深度财务分析 ==========
     
@@ -506,28 +659,26 @@ class FinanceDataService:
     def get_stock_financial_analysis(symbol: str) -> List[types.TextContent]:
         """获取股票深度财务分析指标"""
         try:
-            # 尝试多个数据源获取财务分析数据
-            financial_data = None
+            # 新浪财经财务摘要数据（上游不可用时为最近一次成功的缓存）
+            financial_data = ak.stock_financial_abstract(symbol=symbol)
+            if financial_data.empty:
+                return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的财务分析数据")]
             
-            # 优先使用新浪财经财务摘要数据
-            try:
-                financial_data = ak.stock_financial_abstract(symbol=symbol)
-                if not financial_data.empty:
-                    # 从财务摘要数据中提取关键指标
-                    latest_data = financial_data.iloc[0]
-                    
-                    # 模拟计算一些财务比率
-                    total_assets = latest_data.get('20250630', 0)  # 总资产
-                    total_liabilities = latest_data.get('20250331', 0)  # 总负债
-                    net_profit = latest_data.get('20250930', 0)  # 净利润
-                    revenue = latest_data.get('20250630', 0)  # 营业收入
-                    
-                    # 计算财务比率
-                    roe = (net_profit / total_assets * 100) if total_assets > 0 else 0
-                    debt_ratio = (total_liabilities / total_assets * 100) if total_assets > 0 else 0
-                    profit_margin = (net_profit / revenue * 100) if revenue > 0 else 0
-                    
-                    financial_info = f"""
+            # 从财务摘要数据中提取关键指标
+            latest_data = financial_data.iloc[0]
+            
+            # 模拟计算一些财务比率
+            total_assets = latest_data.get('20250630', 0)  # 总资产
+            total_liabilities = latest_data.get('20250331', 0)  # 总负债
+            net_profit = latest_data.get('20250930', 0)  # 净利润
+            revenue = latest_data.get('20250630', 0)  # 营业收入
+            
+            # 计算财务比率
+            roe = (net_profit / total_assets * 100) if total_assets > 0 else 0
+            debt_ratio = (total_liabilities / total_assets * 100) if total_assets > 0 else 0
+            profit_margin = (net_profit / revenue * 100) if revenue > 0 else 0
+            
+            financial_info = f"""
 股票代码: {symbol}
 数据来源: 新浪财经财务摘要
 深度财务分析指标:
@@ -540,52 +691,30 @@ class FinanceDataService:
 - 营业收入: {revenue:,.0f} 元
 
 注: 基于最新季度财务数据计算得出。
-"""
-                    return [types.TextContent(type="text", text=financial_info)]
-                    
-            except Exception as e:
-                print(f"新浪财经财务摘要数据获取失败: {e}")
-            
-            # 如果主要数据源失败，返回模拟数据
-            financial_info = f"""
-股票代码: {symbol}
-深度财务分析指标 (模拟数据):
-- 净资产收益率(ROE): 15.2%
-- 总资产报酬率(ROA): 8.7%
-- 销售毛利率: 42.5%
-- 销售净利率: 18.3%
-- 资产负债率: 35.8%
-- 流动比率: 2.1
-- 速动比率: 1.5
-- 应收账款周转率: 6.8
-- 存货周转率: 4.2
-- 总资产周转率: 0.8
-
-注: 此为模拟数据，实际数据请参考官方财务报告。
-"""
-            return [types.TextContent(type="text", text=financial_info)]
+{stale_notice(financial_data)}"""
+            record = {
+                "股票代码": symbol, "净资产收益率(ROE)": roe, "资产负债率": debt_ratio, "销售净利率": profit_margin,
+                "总资产": total_assets, "总负债": total_liabilities, "净利润": net_profit, "营业收入": revenue,
+            }
+            return [DataResult(f"股票 {symbol} 深度财务分析", record=record, text=financial_info,
+                               extra={"notice": stale_notice(financial_data).strip()})]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取深度财务分析失败: {str(e)}")]
+            return [ErrorText(f"获取深度财务分析失败: {str(e)}")]
 
     @staticmethod
     def get_stock_institute_hold(symbol: str) -> List[types.TextContent]:
         """获取机构持股信息"""
         try:
-            # 尝试获取机构持股数据
-            institute_data = None
+            # 新浪财经机构持股数据 - 全市场表按代码索引（上游不可用时为最近一次成功的缓存）
+            stock_institute = SNAPSHOTS.rows("stock_institute_hold", symbol)
+            if stock_institute.empty:
+                return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的机构持股数据")]
             
-            # 使用东方财富机构持股数据 - 使用正确的参数
-            try:
-                institute_data = ak.stock_institute_hold()
-                if not institute_data.empty:
-                    # 过滤指定股票的机构持股数据
-                    stock_institute = institute_data[institute_data['代码'] == symbol]
-                    if not stock_institute.empty:
-                        # 获取最新的机构持股数据
-                        latest_data = stock_institute.iloc[0]
-                        
-                        institute_info = f"""
+            # 获取最新的机构持股数据
+            latest_data = stock_institute.iloc[0]
+            
+            institute_info = f"""
 股票代码: {symbol}
 机构持股信息:
 - 机构数量: {latest_data.get('机构数', 'N/A')}
@@ -594,29 +723,13 @@ class FinanceDataService:
 - 持股数量: {latest_data.get('持股数量', 'N/A')} 股
 - 持股金额: {latest_data.get('持股金额', 'N/A')} 元
 - 数据日期: {latest_data.get('日期', 'N/A')}
-"""
-                        return [types.TextContent(type="text", text=institute_info)]
-                    
-            except Exception as e:
-                print(f"东方财富机构持股数据获取失败: {e}")
-            
-            # 如果主要数据源失败，返回模拟数据
-            institute_info = f"""
-股票代码: {symbol}
-机构持股信息 (模拟数据):
-- 机构数量: 125
-- 持股比例: 45.8%
-- 占流通股比例: 38.2%
-- 持股数量: 1,125,480,000 股
-- 持股金额: 112,548,000,000 元
-- 数据日期: 2025-10-31
-
-注: 此为模拟数据，实际数据请参考官方公告。
-"""
-            return [types.TextContent(type="text", text=institute_info)]
+{stale_notice(stock_institute)}"""
+            record = {"股票代码": symbol, **latest_data.to_dict()}
+            return [DataResult(f"股票 {symbol} 机构持股", record=record, text=institute_info,
+                               extra={"notice": stale_notice(stock_institute).strip()})]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取机构持股信息失败: {str(e)}")]
+            return [ErrorText(f"获取机构持股信息失败: {str(e)}")]
 
     @staticmethod
     def get_stock_shareholder_info(symbol: str) -> List[types.TextContent]:
@@ -633,7 +746,8 @@ class FinanceDataService:
 股票代码: {symbol}
 近期股东持股变动信息:
 """
-            for i, row in shareholder_data.head(10).iterrows():
+            shareholder_data = shareholder_data.head(10)
+            for i, row in shareholder_data.iterrows():
                 shareholder_info += f"""
 - 公告日期: {row.get('公告日期', 'N/A')}
 - 变动股东: {row.get('变动股东', 'N/A')}
@@ -643,35 +757,33 @@ class FinanceDataService:
 - 变动期间: {row.get('变动期间', 'N/A')}
 - 变动途径: {row.get('变动途径', 'N/A')}
 """
-            return [types.TextContent(type="text", text=shareholder_info)]
+            return [DataResult(f"股票 {symbol} 股东持股变动", frame=shareholder_data, text=shareholder_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取股东持股信息失败: {str(e)}")]
+            return [ErrorText(f"获取股东持股信息失败: {str(e)}")]
 
     @staticmethod
     def get_stock_lhb_data(symbol: str = "") -> List[types.TextContent]:
         """获取龙虎榜数据"""
         try:
-            # 尝试获取龙虎榜数据
-            lhb_data = None
+            # 东方财富龙虎榜数据（上游不可用时为最近一次成功的缓存）
+            lhb_data = SNAPSHOTS.frame("stock_lhb_detail_em")
             
-            # 使用东方财富龙虎榜数据
-            try:
-                lhb_data = ak.stock_lhb_detail_em()
-                
+            if lhb_data.empty:
+                return [types.TextContent(type="text", text="未找到龙虎榜数据")]
+            
+            # 如果指定了股票代码，则通过代码索引取该股票的数据
+            if symbol:
+                lhb_data = SNAPSHOTS.rows("stock_lhb_detail_em", symbol)
                 if lhb_data.empty:
-                    return [types.TextContent(type="text", text="未找到龙虎榜数据")]
-                
-                # 如果指定了股票代码，则过滤该股票的数据
-                if symbol:
-                    lhb_data = lhb_data[lhb_data['代码'] == symbol]
-                    if lhb_data.empty:
-                        return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的龙虎榜数据")]
-                
-                lhb_info = f"""
+                    return [types.TextContent(type="text", text=f"未找到股票代码: {symbol} 的龙虎榜数据")]
+            
+            lhb_info = f"""
 龙虎榜数据{' - 股票代码: ' + symbol if symbol else ''}:
 """
-                for i, row in lhb_data.head(10).iterrows():
-                    lhb_info += f"""
+            notice = stale_notice(lhb_data)
+            lhb_data = lhb_data.head(10)
+            for i, row in lhb_data.iterrows():
+                lhb_info += f"""
 - 股票代码: {row.get('代码', 'N/A')}
 - 股票名称: {row.get('名称', 'N/A')}
 - 上榜日期: {row.get('上榜日', 'N/A')}
@@ -680,46 +792,12 @@ class FinanceDataService:
 - 龙虎榜净买额: {row.get('龙虎榜净买额', 'N/A')} 万元
 - 上榜原因: {row.get('上榜原因', 'N/A')}
 """
-                return [types.TextContent(type="text", text=lhb_info)]
-                
-            except Exception as e:
-                print(f"东方财富龙虎榜数据获取失败: {e}")
-            
-            # 如果主要数据源失败，返回模拟数据
-            if symbol:
-                lhb_info = f"""
-股票代码: {symbol} 龙虎榜数据 (模拟数据):
-- 上榜日期: 2025-10-31
-- 收盘价: 99.40 元
-- 涨跌幅: 2.41%
-- 龙虎榜净买额: 12,548 万元
-- 上榜原因: 日涨幅偏离值达7%的证券
-
-注: 此为模拟数据，实际龙虎榜数据请参考交易所公告。
-"""
-            else:
-                lhb_info = """
-龙虎榜数据 (模拟数据):
-- 股票代码: 603259 (药明康德)
-  - 上榜日期: 2025-10-31
-  - 收盘价: 99.40 元
-  - 涨跌幅: 2.41%
-  - 龙虎榜净买额: 12,548 万元
-  - 上榜原因: 日涨幅偏离值达7%的证券
-
-- 股票代码: 000001 (平安银行)
-  - 上榜日期: 2025-10-31
-  - 收盘价: 15.23 元
-  - 涨跌幅: -1.85%
-  - 龙虎榜净买额: -8,756 万元
-  - 上榜原因: 日跌幅偏离值达7%的证券
-
-注: 此为模拟数据，实际龙虎榜数据请参考交易所公告。
-"""
-            return [types.TextContent(type="text", text=lhb_info)]
+            lhb_info += notice
+            return [DataResult(f"龙虎榜数据{' - 股票代码: ' + symbol if symbol else ''}", frame=lhb_data,
+                               text=lhb_info, extra={"notice": notice.strip()})]
             
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取龙虎榜数据失败: {str(e)}")]
+            return [ErrorText(f"获取龙虎榜数据失败: {str(e)}")]
 
     @staticmethod
     def get_stock_hot_rank() -> List[types.TextContent]:
@@ -731,16 +809,17 @@ class FinanceDataService:
             if hot_stocks.empty:
                 return [types.TextContent(type="text", text="未找到热门股票数据")]
             
+            hot_stocks = hot_stocks.head(20)
             hot_info = "热门股票排名:\n"
-            for i, row in hot_stocks.head(20).iterrows():
+            for i, row in hot_stocks.iterrows():
                 hot_info += f"""
 {row.get('当前排名', 'N/A')}. {row.get('股票名称', 'N/A')} ({row.get('代码', 'N/A')})
    最新价: {row.get('最新价', 'N/A')} 元
    涨跌幅: {row.get('涨跌幅', 'N/A')}%
 """
-            return [types.TextContent(type="text", text=hot_info)]
+            return [DataResult("热门股票排名", frame=hot_stocks, text=hot_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取热门股票排名失败: {str(e)}")]
+            return [ErrorText(f"获取热门股票排名失败: {str(e)}")]
 
     @staticmethod
     def get_stock_news(symbol: str) -> List[types.TextContent]:
@@ -755,20 +834,22 @@ class FinanceDataService:
             news_info = f"""
 股票代码: {symbol} 相关新闻:
 """
-            for i, row in news_data.head(10).iterrows():
+            news_data = news_data.head(10)
+            for i, row in news_data.iterrows():
                 news_info += f"""
 {i+1}. 【{row.get('发布时间', 'N/A')}】{row.get('新闻标题', 'N/A')}
    来源: {row.get('文章来源', 'N/A')}
 """
-            return [types.TextContent(type="text", text=news_info)]
+            return [DataResult(f"股票 {symbol} 相关新闻", frame=news_data, text=news_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取股票新闻失败: {str(e)}")]
+            return [ErrorText(f"获取股票新闻失败: {str(e)}")]
 
     @staticmethod
     def get_macro_economic_data() -> List[types.TextContent]:
         """获取宏观经济数据"""
         try:
             macro_info = "中国宏观经济数据概览:\n\n"
+            sections: Dict[str, Dict[str, Any]] = {}
             
             # 获取GDP数据
             try:
@@ -778,8 +859,11 @@ class FinanceDataService:
                 macro_info += f"- 季度: {latest_gdp.get('季度', 'N/A')}\n"
                 macro_info += f"- 国内生产总值: {latest_gdp.get('国内生产总值-绝对值', 'N/A')} 亿元\n"
                 macro_info += f"- 同比增长: {latest_gdp.get('国内生产总值-同比增长', 'N/A')}%\n\n"
+                sections["GDP"] = {key: latest_gdp.get(key)
+                                   for key in ('季度', '国内生产总值-绝对值', '国内生产总值-同比增长')}
             except Exception as e:
                 macro_info += f"GDP数据获取失败: {str(e)}\n\n"
+                sections["GDP"] = {"error": f"GDP数据获取失败: {str(e)}"}
             
             # 获取CPI数据
             try:
@@ -789,8 +873,10 @@ class FinanceDataService:
                 macro_info += f"- 月份: {latest_cpi.get('月份', 'N/A')}\n"
                 macro_info += f"- 全国CPI: {latest_cpi.get('全国-当月', 'N/A')}\n"
                 macro_info += f"- 同比增长: {latest_cpi.get('全国-同比增长', 'N/A')}%\n\n"
+                sections["CPI"] = {key: latest_cpi.get(key) for key in ('月份', '全国-当月', '全国-同比增长')}
             except Exception as e:
                 macro_info += f"CPI数据获取失败: {str(e)}\n\n"
+                sections["CPI"] = {"error": f"CPI数据获取失败: {str(e)}"}
             
             # 获取PMI数据
             try:
@@ -800,12 +886,14 @@ class FinanceDataService:
                 macro_info += f"- 月份: {latest_pmi.get('月份', 'N/A')}\n"
                 macro_info += f"- 制造业PMI: {latest_pmi.get('制造业-指数', 'N/A')}\n"
                 macro_info += f"- 非制造业PMI: {latest_pmi.get('非制造业-指数', 'N/A')}\n\n"
+                sections["PMI"] = {key: latest_pmi.get(key) for key in ('月份', '制造业-指数', '非制造业-指数')}
             except Exception as e:
                 macro_info += f"PMI数据获取失败: {str(e)}\n\n"
+                sections["PMI"] = {"error": f"PMI数据获取失败: {str(e)}"}
             
-            return [types.TextContent(type="text", text=macro_info)]
+            return [DataResult("中国宏观经济数据概览", record=sections, text=macro_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取宏观经济数据失败: {str(e)}")]
+            return [ErrorText(f"获取宏观经济数据失败: {str(e)}")]
 
     @staticmethod
     def get_northbound_capital() -> List[types.TextContent]:
@@ -832,265 +920,161 @@ class FinanceDataService:
 - 沪深300指数: {latest_data.get('沪深300', 'N/A')}
 - 沪深300涨跌幅: {latest_data.get('沪深300-涨跌幅', 'N/A')}%
 """
-            return [types.TextContent(type="text", text=northbound_info)]
+            return [DataResult("北向资金最新数据", record=latest_data.to_dict(), text=northbound_info)]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"获取北向资金数据失败: {str(e)}")]
+            return [ErrorText(f"获取北向资金数据失败: {str(e)}")]
 
+    # ========== 批量工具：多只股票并行获取 ==========
 
-# Tool definitions for MCP
-FINANCE_TOOLS = [
-    types.Tool(
-        name="get_stock_spot",
-        description="获取股票实时行情数据",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码（如：000001），为空则返回所有股票"
-                }
-            },
-            "required": []
-        }
-    ),
-    types.Tool(
-        name="get_stock_history",
-        description="获取股票历史数据",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码（如：000001）",
-                },
-                "period": {
-                    "type": "string",
-                    "description": "数据周期：daily(日线), weekly(周线), monthly(月线)",
-                    "enum": ["daily", "weekly", "monthly"]
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_fund_info",
-        description="获取基金信息",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "基金代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_index_data",
-        description="获取指数数据",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "指数代码（如：000001 上证指数），为空则返回主要指数"
-                }
-            },
-            "required": []
-        }
-    ),
-    types.Tool(
-        name="get_futures_data",
-        description="获取期货数据",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "期货代码，为空则返回主要期货"
-                }
-            },
-            "required": []
-        }
-    ),
-    types.Tool(
-        name="get_stock_financials",
-        description="获取股票财务数据（使用新浪财经财务摘要数据）",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_stock_valuation",
-        description="获取股票估值数据",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_stock_technical_indicators",
-        description="获取股票技术指标",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_stock_capital_flow",
-        description="获取股票资金流向数据（使用东方财富个股资金流向数据）",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_stock_analyst_ratings",
-        description="获取分析师评级数据",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_stock_company_info",
-        description="获取公司基本信息",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    # ========== 新增工具：深度财务分析 ==========
-    types.Tool(
-        name="get_stock_financial_analysis",
-        description="获取股票深度财务分析指标（ROE、ROA、毛利率、资产负债率等）",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_stock_institute_hold",
-        description="获取机构持股信息",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_stock_shareholder_info",
-        description="获取股东持股变动信息",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_stock_lhb_data",
-        description="获取龙虎榜数据（可指定股票代码）",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码（可选），为空则返回所有龙虎榜数据"
-                }
-            },
-            "required": []
-        }
-    ),
-    types.Tool(
-        name="get_stock_hot_rank",
-        description="获取热门股票排名",
-        inputSchema={
-            "type": "object",
-            "properties": {}
-        }
-    ),
-    types.Tool(
-        name="get_stock_news",
-        description="获取股票相关新闻",
-        inputSchema={
-            "type": "object",
-            "properties": {
-                "symbol": {
-                    "type": "string",
-                    "description": "股票代码"
-                }
-            },
-            "required": ["symbol"]
-        }
-    ),
-    types.Tool(
-        name="get_macro_economic_data",
-        description="获取宏观经济数据（GDP、CPI、PMI等）",
-        inputSchema={
-            "type": "object",
-            "properties": {}
-        }
-    ),
-    types.Tool(
-        name="get_northbound_capital",
-        description="获取北向资金数据",
-        inputSchema={
-            "type": "object",
-            "properties": {}
-        }
-    )
-]
+    @staticmethod
+    def get_stock_spot_batch(symbols: Union[str, List[str]]) -> List[types.TextContent]:
+        """批量获取股票最新行情 - 优先使用全市场实时快照，一次下载回答所有股票"""
+        try:
+            symbols = normalize_symbols(symbols)
+            if not symbols:
+                return [ErrorText("请提供至少一个股票代码")]
+            
+            columns = ['代码', '名称', '最新价', '涨跌幅', '涨跌额', '成交量', '成交额', '最高', '最低', '今开', '昨收']
+            rows = []
+            missing = []
+            try:
+                for symbol, stock_rows in SNAPSHOTS.rows_many("stock_zh_a_spot_em", symbols).items():
+                    if stock_rows.empty:
+                        missing.append(symbol)
+                    else:
+                        rows.append(stock_rows.iloc[0].reindex(columns))
+            except Exception as e:
+                print(f"全市场实时行情获取失败，改用日线数据: {e}", file=sys.stderr)
+                rows, missing = [], symbols
+            
+            # 快照中没有的股票回退到本地K线库的最新一根日线
+            history, errors = fan_out(missing, lambda symbol: HISTORY_STORE.get_history(symbol, period="daily"))
+            for symbol, stock_data in history.items():
+                if stock_data.empty:
+                    errors[symbol] = "未找到数据"
+                    continue
+                latest = stock_data.iloc[-1]
+                rows.append(pd.Series({
+                    '代码': symbol, '名称': security_name(symbol), '最新价': latest['收盘'], '涨跌幅': latest['涨跌幅'],
+                    '涨跌额': latest['涨跌额'], '成交量': latest['成交量'], '成交额': latest['成交额'],
+                    '最高': latest['最高'], '最低': latest['最低'], '今开': latest['开盘'], '昨收': None,
+                }))
+            
+            frame = pd.DataFrame(rows, columns=columns)
+            return [batch_result("批量行情", frame, errors)]
+        except Exception as e:
+            return [ErrorText(f"批量获取股票行情失败: {str(e)}")]
+
+    @staticmethod
+    def get_stock_history_batch(symbols: Union[str, List[str]], period: str = "daily",
+                                limit: int = 20) -> List[types.TextContent]:
+        """批量获取股票历史数据（每只股票最近 limit 根K线）"""
+        try:
+            if period not in ("daily", "weekly", "monthly"):
+                return [ErrorText("不支持的周期类型，请使用 daily, weekly 或 monthly")]
+            symbols = normalize_symbols(symbols)
+            if not symbols:
+                return [ErrorText("请提供至少一个股票代码")]
+            # 负数会让 tail 返回除前几根以外的全部K线
+            limit = max(1, min(int(limit), 250))
+            
+            history, errors = fan_out(symbols, lambda symbol: HISTORY_STORE.get_history(symbol, period=period))
+            frames = []
+            for symbol in symbols:
+                stock_data = history.get(symbol)
+                if stock_data is None:
+                    continue
+                if stock_data.empty:
+                    errors[symbol] = "未找到数据"
+                    continue
+                tail = stock_data.tail(limit)[['日期', '开盘', '收盘', '最高', '最低', '成交量', '涨跌幅']]
+                frames.append(tail.assign(代码=symbol))
+            
+            frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            if not frame.empty:
+                frame = frame[['代码', '日期', '开盘', '收盘', '最高', '最低', '成交量', '涨跌幅']]
+            title = f"批量历史数据 ({period}, 每只最近{limit}条)"
+            return [batch_result(title, frame, errors)]
+        except Exception as e:
+            return [ErrorText(f"批量获取历史数据失败: {str(e)}")]
+
+    @staticmethod
+    def get_stock_technical_indicators_batch(symbols: Union[str, List[str]]) -> List[types.TextContent]:
+        """批量获取股票技术指标"""
+        try:
+            symbols = normalize_symbols(symbols)
+            if not symbols:
+                return [ErrorText("请提供至少一个股票代码")]
+            
+            def compute(symbol: str) -> Dict[str, Optional[float]]:
+                latest = HISTORY_STORE.get_indicators(symbol, period="daily", adjust="")
+                if latest is None:
+                    raise ValueError("未找到历史数据")
+                return basic_indicators(latest)
+            
+            indicators, errors = fan_out(symbols, compute)
+            rows = []
+            for symbol in symbols:
+                values = indicators.get(symbol)
+                if values is None:
+                    continue
+                rows.append({
+                    '代码': symbol,
+                    '收盘': values["close"],
+                    'MA5': values["ma5"],
+                    'MA20': values["ma20"],
+                    'MA60': values["ma60"],
+                    'RSI14': values["rsi"],
+                    'DIF': values["dif"],
+                    'DEA': values["dea"],
+                    'K': values["k"],
+                    'D': values["d"],
+                    'J': values["j"],
+                })
+            frame = pd.DataFrame(rows).round(2)
+            return [batch_result("批量技术指标", frame, errors)]
+        except Exception as e:
+            return [ErrorText(f"批量获取技术指标失败: {str(e)}")]
+
+    @staticmethod
+    def get_stock_capital_flow_batch(symbols: Union[str, List[str]]) -> List[types.TextContent]:
+        """批量获取股票最新资金流向"""
+        try:
+            symbols = normalize_symbols(symbols)
+            if not symbols:
+                return [ErrorText("请提供至少一个股票代码")]
+            
+            flows, errors = fan_out(
+                symbols, lambda symbol: ak.stock_individual_fund_flow(stock=symbol, market=market_of(symbol))
+            )
+            columns = ['日期', '主力净流入-净额', '主力净流入-净占比', '超大单净流入-净额', '大单净流入-净额',
+                       '中单净流入-净额', '小单净流入-净额']
+            rows = []
+            for symbol in symbols:
+                capital_flow = flows.get(symbol)
+                if capital_flow is None:
+                    continue
+                if capital_flow.empty:
+                    errors[symbol] = "未找到数据"
+                    continue
+                row = capital_flow.iloc[0].reindex(columns)
+                row['代码'] = symbol
+                rows.append(row)
+            
+            frame = pd.DataFrame(rows, columns=['代码'] + columns)
+            return [batch_result("批量资金流向", frame, errors)]
+        except Exception as e:
+            return [ErrorText(f"批量获取资金流向失败: {str(e)}")]
+
+    @staticmethod
+    def get_cache_stats() -> List[types.TextContent]:
+        """获取数据缓存命中统计"""
+        stats = DATA_CACHE.stats()
+        stats["single_flight"] = UPSTREAM_FLIGHTS.stats()
+        stats["http"] = HTTP_CLIENT.stats()
+        stats["rate_limits"] = RATE_LIMITS.stats()
+        stats["throttle"] = ADAPTIVE_THROTTLE.stats()
+        stats["circuits"] = CIRCUIT_BREAKERS.stats()
+        stats["fixtures"] = FIXTURES.stats()
+        stats["security_master"] = SECURITY_MASTER.stats()
+        return [types.TextContent(type="text", text=json.dumps(stats, ensure_ascii=False, indent=2))]
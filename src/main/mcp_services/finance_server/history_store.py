@@ -0,0 +1,286 @@
+"""Incremental local store for ``stock_zh_a_hist`` bars.
+
+每只股票的K线保存在本地 SQLite 中（主键以股票代码开头，按代码聚簇存储）。
+刷新时只请求最后一根已完成K线之后的数据，日常更新只传输几行而不是多年的历史。
+交易时段内正在形成的K线在超过 ``intraday_ttl`` 秒后重新获取，盘中查询不会停留在开盘前的数据上。
+技术指标的滚动状态（``IndicatorState``）也保存在同一个库中，只对新K线做增量更新。
+上游不可用时 ``CachedAkshare`` 返回的过期缓存只叠加在本次结果上（并保留过期标记），
+不写入本地库、不更新刷新时间，也不推进指标检查点。
+"""
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from .data_cache import (
+    CHINA_TZ, MARKET_CLOSE_HOUR, STALE_ATTR, in_trading_session, last_close_time, mark_stale, stale_age,
+)
+from .indicator_state import IndicatorState
+
+# akshare 列名 -> 本地表列名
+COLUMN_MAP = {
+    "日期": "date",
+    "股票代码": "code",
+    "开盘": "open",
+    "收盘": "close",
+    "最高": "high",
+    "最低": "low",
+    "成交量": "volume",
+    "成交额": "amount",
+    "振幅": "amplitude",
+    "涨跌幅": "pct_change",
+    "涨跌额": "change",
+    "换手率": "turnover",
+}
+VALUE_COLUMNS = [column for column in COLUMN_MAP.values() if column != "date"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS bars (
+    symbol TEXT NOT NULL,
+    period TEXT NOT NULL,
+    adjust TEXT NOT NULL,
+    date TEXT NOT NULL,
+    {", ".join(f"{column} {'TEXT' if column == 'code' else 'REAL'}" for column in VALUE_COLUMNS)},
+    PRIMARY KEY (symbol, period, adjust, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS series (
+    symbol TEXT NOT NULL,
+    period TEXT NOT NULL,
+    adjust TEXT NOT NULL,
+    last_date TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (symbol, period, adjust)
+);
+CREATE TABLE IF NOT EXISTS indicator_state (
+    symbol TEXT NOT NULL,
+    period TEXT NOT NULL,
+    adjust TEXT NOT NULL,
+    last_date TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (symbol, period, adjust)
+);
+"""
+
+Fetcher = Callable[..., pd.DataFrame]
+
+# 上游不可用时得到的过期K线：(被替换部分的起始日期，为 None 表示全部替换, K线)
+StaleBars = Tuple[Optional[date], pd.DataFrame]
+
+
+def period_bounds(day: date, period: str) -> Tuple[date, date]:
+    """K线所属周期的起止日期（日线为当天，周线为周一至周五，月线为整月）"""
+    if period == "weekly":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=4)
+    if period == "monthly":
+        start = day.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    return day, day
+
+
+def _close_of(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, MARKET_CLOSE_HOUR, tzinfo=CHINA_TZ)
+
+
+class HistoryStore:
+    """Persistent per-symbol bar store refreshed incrementally from akshare."""
+
+    def __init__(self, db_path: Path, fetcher: Fetcher, intraday_ttl: float = 60.0):
+        self.db_path = Path(db_path)
+        self._fetcher = fetcher
+        self.intraday_ttl = intraday_ttl
+        self._locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    def _series_lock(self, key: Tuple[str, str, str]) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_history(self, symbol: str, period: str = "daily", adjust: str = "",
+                    now: Optional[datetime] = None) -> pd.DataFrame:
+        """返回完整历史K线，必要时先从网络增量补齐"""
+        key = (symbol, period, adjust)
+        with self._series_lock(key):
+            conn = self._connect()
+            try:
+                stale = self._refresh(conn, key, now or datetime.now(CHINA_TZ))
+                return self._overlay(self._load(conn, key), stale)
+            finally:
+                conn.close()
+
+    def get_indicators(self, symbol: str, period: str = "daily", adjust: str = "",
+                       now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """返回最后一根K线的技术指标，只把检查点之后的新K线应用到持久化的指标状态"""
+        key = (symbol, period, adjust)
+        with self._series_lock(key):
+            conn = self._connect()
+            try:
+                stale = self._refresh(conn, key, now or datetime.now(CHINA_TZ))
+                return self._update_indicators(conn, key, stale)
+            finally:
+                conn.close()
+
+    def _update_indicators(self, conn: sqlite3.Connection, key: Tuple[str, str, str],
+                           stale: Optional[StaleBars] = None) -> Optional[Dict[str, Any]]:
+        series = conn.execute(
+            "SELECT updated_at FROM series WHERE symbol=? AND period=? AND adjust=?", key
+        ).fetchone()
+        if series is None and stale is None:
+            return None
+        row = conn.execute(
+            "SELECT state FROM indicator_state WHERE symbol=? AND period=? AND adjust=?", key
+        ).fetchone()
+        state = IndicatorState.from_json(row[0]) if row is not None else None
+        if state is None:
+            state = IndicatorState()
+
+        bars = self._overlay(self._load(conn, key, after=state.last_date), stale).to_dict("records")
+        if not bars and state.bars == 0:
+            return None
+
+        # 检查点只包含已经走完的K线；未走完的K线（盘中的日线、本周的周线）和过期缓存中的K线
+        # 只应用到临时副本，下次刷新被覆盖时无需回退状态
+        final = 0
+        if series is not None:
+            updated_at = datetime.fromisoformat(series[0])
+            persisted = len(bars) - len(stale[1]) if stale is not None else len(bars)
+            while final < persisted and _close_of(period_bounds(date.fromisoformat(bars[final]["日期"]), key[1])[1]) <= updated_at:
+                final += 1
+
+        for bar in bars[:final]:
+            state.update(bar)
+        if final:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO indicator_state (symbol, period, adjust, last_date, state) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (*key, state.last_date, state.to_json()),
+                )
+
+        if final < len(bars):
+            state = state.copy()
+            for bar in bars[final:]:
+                state.update(bar)
+        return state.snapshot()
+
+    def _refresh(self, conn: sqlite3.Connection, key: Tuple[str, str, str], now: datetime) -> Optional[StaleBars]:
+        """从网络增量补齐本地库；上游只返回过期缓存时不写库，把这些K线交给调用方叠加"""
+        symbol, period, adjust = key
+        row = conn.execute(
+            "SELECT last_date, updated_at FROM series WHERE symbol=? AND period=? AND adjust=?",
+            key,
+        ).fetchone()
+
+        kwargs: Dict[str, Any] = {"symbol": symbol, "period": period, "adjust": adjust}
+        refetch_from: Optional[date] = None
+        if row is not None:
+            last_date = date.fromisoformat(row[0])
+            updated_at = datetime.fromisoformat(row[1])
+            # 上次刷新已经覆盖最近一次收盘，无需请求网络；
+            # 交易时段内当天的K线仍在变化，超过盘中有效期后重新获取
+            if updated_at >= last_close_time(now) and not (
+                    in_trading_session(now) and (now - updated_at).total_seconds() >= self.intraday_ttl):
+                return None
+            period_start, period_end = period_bounds(last_date, period)
+            if updated_at >= _close_of(period_end):
+                refetch_from = last_date + timedelta(days=1)
+            else:
+                # 最后一根K线在刷新时尚未走完，从其周期起点重新获取
+                refetch_from = period_start
+            kwargs["start_date"] = refetch_from.strftime("%Y%m%d")
+
+        fetched = self._fetcher(**kwargs)
+        if fetched is not None and stale_age(fetched) is not None:
+            # 过期缓存：不当作已刷新，上游恢复后重新获取
+            return refetch_from, fetched
+        if fetched is None or fetched.empty:
+            if row is not None:
+                conn.execute(
+                    "UPDATE series SET updated_at=? WHERE symbol=? AND period=? AND adjust=?",
+                    (now.isoformat(), *key),
+                )
+                conn.commit()
+            return None
+
+        records = self._to_records(key, fetched)
+        with conn:
+            if refetch_from is not None:
+                conn.execute(
+                    "DELETE FROM bars WHERE symbol=? AND period=? AND adjust=? AND date>=?",
+                    (*key, refetch_from.isoformat()),
+                )
+                # 检查点覆盖了被重写的K线时作废，下次从头重放
+                conn.execute(
+                    "DELETE FROM indicator_state WHERE symbol=? AND period=? AND adjust=? AND last_date>=?",
+                    (*key, refetch_from.isoformat()),
+                )
+            placeholders = ", ".join("?" * (4 + len(VALUE_COLUMNS)))
+            conn.executemany(
+                f"INSERT OR REPLACE INTO bars (symbol, period, adjust, date, {', '.join(VALUE_COLUMNS)}) "
+                f"VALUES ({placeholders})",
+                records,
+            )
+            last_date = conn.execute(
+                "SELECT MAX(date) FROM bars WHERE symbol=? AND period=? AND adjust=?", key
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO series (symbol, period, adjust, last_date, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (*key, last_date, now.isoformat()),
+            )
+        return None
+
+    @staticmethod
+    def _to_records(key: Tuple[str, str, str], frame: pd.DataFrame):
+        frame = frame.rename(columns=COLUMN_MAP)
+        dates = pd.to_datetime(frame["date"]).dt.strftime("%Y-%m-%d")
+        columns = []
+        for column in VALUE_COLUMNS:
+            if column not in frame.columns:
+                columns.append([None] * len(frame))
+            elif column == "code":
+                columns.append(frame[column].astype(str).tolist())
+            else:
+                columns.append(pd.to_numeric(frame[column], errors="coerce").astype(float).tolist())
+        return [(*key, day, *values) for day, *values in zip(dates.tolist(), *columns)]
+
+    @classmethod
+    def _overlay(cls, frame: pd.DataFrame, stale: Optional[StaleBars]) -> pd.DataFrame:
+        """把过期缓存中的K线叠加到本地K线上（替换起始日期之后的部分），结果保留过期标记"""
+        if stale is None:
+            return frame
+        since, fetched = stale
+        records = cls._to_records(("", "", ""), fetched)
+        rows = pd.DataFrame([record[3:] for record in records], columns=["date", *VALUE_COLUMNS])
+        rows = rows.rename(columns={value: name for name, value in COLUMN_MAP.items()})
+        if since is not None:
+            frame = frame[frame["日期"] < since.isoformat()]
+        combined = pd.concat([frame, rows], ignore_index=True) if len(frame) else rows
+        return mark_stale(combined, fetched.attrs[STALE_ATTR])
+
+    @staticmethod
+    def _load(conn: sqlite3.Connection, key: Tuple[str, str, str], after: Optional[str] = None) -> pd.DataFrame:
+        """读取K线，``after`` 不为空时只读取该日期之后的部分"""
+        query = (f"SELECT date, {', '.join(VALUE_COLUMNS)} FROM bars "
+                 "WHERE symbol=? AND period=? AND adjust=?")
+        params: Tuple[str, ...] = key
+        if after is not None:
+            query += " AND date>?"
+            params = (*key, after)
+        frame = pd.read_sql_query(query + " ORDER BY date", conn, params=params)
+        return frame.rename(columns={value: name for name, value in COLUMN_MAP.items()})
@@ -0,0 +1,187 @@
+"""Process-wide pooled HTTP client for direct HTTP requests.
+
+所有直接发起的 HTTP 请求共用一个 ``requests.Session``：长连接复用避免每次请求重新握手，
+连接池按上游站点设置大小（与按站点并发上限一致），重试与指数退避在传输层（urllib3 Retry）完成。
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import config
+from .adaptive_throttle import ADAPTIVE_THROTTLE, TOO_MANY_REQUESTS
+from .cancellation import check_cancelled, request_timeout
+from .metrics import record_upstream
+from .rate_limiter import RATE_LIMITS
+from .record_replay import FIXTURES
+from .record_replay import HTTP as HTTP_FIXTURES
+from .upstream import HOST_LIMITS, host_for_url
+
+# 模拟浏览器的默认请求头（User-Agent 由调用方按请求设置）
+DEFAULT_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+# 需要重试的 HTTP 状态码
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# 同时保留的连接池数量（每个 scheme + 域名 + 端口一个池）
+MAX_POOLS = 64
+
+
+def fixture_key(method: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """录制/回放使用的请求键：方法 + 带查询参数的完整 URL"""
+    return f"{method.upper()} {requests.Request(method, url, params=params).prepare().url}"
+
+
+def freeze_response(response: requests.Response) -> Dict[str, Any]:
+    """把响应转换为可 pickle 的字典"""
+    return {
+        "url": response.url,
+        "status_code": response.status_code,
+        "headers": dict(response.headers),
+        "encoding": response.encoding,
+        "content": response.content,
+    }
+
+
+def thaw_response(data: Dict[str, Any]) -> requests.Response:
+    """由录制的字典还原响应对象"""
+    response = requests.Response()
+    response.url = data["url"]
+    response.status_code = data["status_code"]
+    response.headers.update(data["headers"])
+    response.encoding = data["encoding"]
+    response._content = data["content"]
+    return response
+
+
+class HostPoolAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pool size depends on the upstream host."""
+
+    def __init__(self, default_pool_size: int, pool_sizes: Optional[Dict[str, int]] = None, **kwargs: Any):
+        self.default_pool_size = default_pool_size
+        self.pool_sizes = dict(pool_sizes or {})
+        super().__init__(pool_connections=MAX_POOLS, pool_maxsize=default_pool_size, **kwargs)
+
+    def pool_size_for(self, url: str) -> int:
+        return self.pool_sizes.get(host_for_url(url), self.default_pool_size)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        pool_kwargs["maxsize"] = self.pool_size_for(request.url)
+        return host_params, pool_kwargs
+
+    def pools(self):
+        """当前保留的连接池"""
+        container = self.poolmanager.pools
+        with container.lock:
+            return list(container._container.values())
+
+
+class PooledHTTPClient:
+    """Shared keep-alive session with per-host pools and transport-level retry."""
+
+    def __init__(self, default_pool_size: Optional[int] = None, pool_sizes: Optional[Dict[str, int]] = None,
+                 retries: Optional[int] = None, backoff_factor: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        self.timeout = timeout if timeout is not None else config.HTTP_TIMEOUT
+        retry = Retry(
+            total=config.HTTP_RETRIES if retries is None else retries,
+            backoff_factor=config.HTTP_BACKOFF if backoff_factor is None else backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.adapter = HostPoolAdapter(
+            default_pool_size or config.HOST_CONCURRENCY_DEFAULT,
+            config.HOST_CONCURRENCY if pool_sizes is None else pool_sizes,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "errors": 0}
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """发送请求；连接错误和 429/5xx 由传输层按指数退避重试，最终失败时抛出异常"""
+        if FIXTURES.replaying:
+            return self._replay(method, url, kwargs.get("params"))
+        check_cancelled()
+        # 单次请求的超时不超过所属工具调用剩余的时间
+        kwargs.setdefault("timeout", request_timeout(self.timeout))
+        host = host_for_url(url)
+        RATE_LIMITS.acquire_blocking(host)
+        self._count("requests")
+        with ADAPTIVE_THROTTLE.track(host):
+            started = time.perf_counter()
+            try:
+                with HOST_LIMITS.slot(host):
+                    response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self._count("errors")
+                raise
+            finally:
+                record_upstream(time.perf_counter() - started)
+            retries = getattr(response.raw, "retries", None)
+            if retries is not None and retries.history:
+                self._count("retries", len(retries.history))
+                # 传输层重试后成功的 429 同样说明请求过快
+                if any(attempt.status == 429 for attempt in retries.history):
+                    ADAPTIVE_THROTTLE.record_throttled(host, TOO_MANY_REQUESTS)
+            if FIXTURES.recording:
+                FIXTURES.record(HTTP_FIXTURES, fixture_key(method, url, kwargs.get("params")),
+                                freeze_response(response))
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                self._count("errors")
+                raise
+        return response
+
+    def _replay(self, method: str, url: str, params: Optional[Dict[str, Any]]) -> requests.Response:
+        """离线回放录制的响应（不访问网络）"""
+        response = thaw_response(FIXTURES.replay(HTTP_FIXTURES, fixture_key(method, url, params)))
+        response.raise_for_status()
+        return response
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, params=params, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """按上游站点统计新建连接数与请求数，复用率 = 1 - 新建连接 / 请求"""
+        hosts: Dict[str, Dict[str, int]] = {}
+        for pool in self.adapter.pools():
+            host = host_for_url(f"{pool.scheme}://{pool.host}")
+            counters = hosts.setdefault(host, {"connections": 0, "requests": 0, "pool_size": 0})
+            counters["connections"] += pool.num_connections
+            counters["requests"] += pool.num_requests
+            counters["pool_size"] = max(counters["pool_size"], pool.pool.maxsize if pool.pool else 0)
+        for counters in hosts.values():
+            requests_made = counters["requests"]
+            counters["reused"] = max(0, requests_made - counters["connections"])
+            counters["reuse_rate"] = round(counters["reused"] / requests_made, 4) if requests_made else 0.0
+        with self._lock:
+            totals = dict(self._counters)
+        return {**totals, "hosts": hosts}
+
+    def close(self) -> None:
+        self.session.close()
+
+
+# 进程内共享的 HTTP 客户端
+HTTP_CLIENT = PooledHTTPClient()
@@ -0,0 +1,322 @@
+"""Streamable HTTP / SSE transport for the finance MCP server.
+
+一个长期运行的服务器进程可以同时服务多个客户端，共用缓存、连接池与限速器。
+基于 asyncio 实现，不依赖额外的 Web 框架：
+
+- ``POST /mcp``：Streamable HTTP。请求返回 ``application/json``；客户端只接受
+  ``text/event-stream`` 时以单个 SSE 事件返回；只有通知时返回 202。
+  ``initialize`` 的响应头中带 ``Mcp-Session-Id``，``DELETE /mcp`` 结束会话。
+- ``GET /sse`` + ``POST /messages?session_id=...``：旧版 HTTP+SSE 传输，响应经 SSE 流推送。
+- ``GET /health``：健康检查。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+ENDPOINT = "/mcp"
+SSE_ENDPOINT = "/sse"
+MESSAGES_ENDPOINT = "/messages"
+
+SESSION_HEADER = "mcp-session-id"
+
+# 单个请求体的大小上限（字节）
+MAX_BODY_BYTES = 4 * 1024 * 1024
+# 会话空闲多久后清理（秒）
+SESSION_IDLE_SECONDS = 3600
+# SSE 连接的心跳间隔（秒），用于及时发现断开的客户端
+SSE_PING_SECONDS = 15
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+REASONS = {
+    200: "OK", 202: "Accepted", 204: "No Content", 400: "Bad Request", 403: "Forbidden",
+    404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error",
+}
+
+
+class HTTPRequest:
+    """Parsed HTTP/1.1 request."""
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+    def accepts(self, media_type: str) -> bool:
+        accept = self.headers.get("accept", "")
+        return not accept or media_type in accept or "*/*" in accept
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[HTTPRequest]:
+    """读取一个请求，连接关闭时返回 None"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431)
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b""
+    return HTTPRequest(method.upper(), target, headers, body)
+
+
+def render_response(status: int, body: bytes = b"", content_type: Optional[str] = None,
+                    headers: Optional[Dict[str, str]] = None, keep_alive: bool = True) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Length: {len(body)}"]
+    if content_type:
+        lines.append(f"Content-Type: {content_type}")
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def sse_event(data: str, event: str = "message") -> bytes:
+    return f"event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+def expects_response(message: Any) -> bool:
+    """JSON-RPC 消息中是否有需要响应的请求（通知与响应不需要）"""
+    if isinstance(message, list):
+        return any(expects_response(item) for item in message)
+    return isinstance(message, dict) and "method" in message and "id" in message
+
+
+def is_initialize(message: Any) -> bool:
+    if isinstance(message, list):
+        return any(is_initialize(item) for item in message)
+    return isinstance(message, dict) and message.get("method") == "initialize"
+
+
+class Session:
+    """One client session; legacy SSE sessions also own an outbound queue."""
+
+    def __init__(self, legacy: bool = False):
+        self.id = uuid.uuid4().hex
+        self.created = time.time()
+        self.last_seen = self.created
+        self.queue: Optional[asyncio.Queue] = asyncio.Queue() if legacy else None
+
+
+class MCPHttpTransport:
+    """Serve one ``FixedMCPServer`` to many HTTP clients."""
+
+    def __init__(self, server: Any, host: str = "127.0.0.1", port: int = 8765,
+                 allowed_origins: Optional[List[str]] = None):
+        self.server = server
+        self.host = host
+        self.port = port
+        self.allowed_origins = set(allowed_origins or ())
+        self.sessions: Dict[str, Session] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._connections: Set[asyncio.Task] = set()
+
+    async def start(self) -> Tuple[str, int]:
+        """开始监听，返回实际监听的地址（port 为 0 时由系统分配）"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        self.port = port
+        print(f"MCP HTTP 服务已启动: http://{host}:{port}{ENDPOINT}", file=sys.stderr)
+        return host, port
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """停止监听并断开所有连接（包括保持中的 SSE 流）"""
+        if self._server is not None:
+            self._server.close()
+        tasks = list(self._connections | self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    # ---------- 会话 ----------
+
+    def _new_session(self, legacy: bool = False) -> Session:
+        now = time.time()
+        for session_id in [sid for sid, s in self.sessions.items()
+                           if s.queue is None and now - s.last_seen > SESSION_IDLE_SECONDS]:
+            self.sessions.pop(session_id, None)
+        session = Session(legacy)
+        self.sessions[session.id] = session
+        return session
+
+    def _origin_allowed(self, request: HTTPRequest) -> bool:
+        # 防止 DNS 重绑定：浏览器发起的请求只接受本机或配置中允许的来源
+        origin = request.headers.get("origin")
+        if not origin:
+            return True
+        return origin in self.allowed_origins or urlsplit(origin).hostname in LOCAL_HOSTS
+
+    # ---------- 连接处理 ----------
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    writer.write(render_response(e.status, str(e).encode("utf-8"), "text/plain", keep_alive=False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                keep_alive = await self._route(request, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _route(self, request: HTTPRequest, writer: asyncio.StreamWriter) -> bool:
+        """处理一个请求，返回连接是否可以继续复用"""
+        if not self._origin_allowed(request):
+            return await self._respond(writer, request, 403, b"Origin not allowed", "text/plain")
+        route = (request.method, request.path)
+        if request.path == ENDPOINT:
+            if request.method == "POST":
+                return await self._handle_post(request, writer)
+            if request.method == "DELETE":
+                session = self.sessions.pop(request.headers.get(SESSION_HEADER, ""), None)
+                return await self._respond(writer, request, 200 if session else 404)
+            # 不提供服务器主动推送的 GET 流
+            return await self._respond(writer, request, 405, headers={"Allow": "POST, DELETE"})
+        if route == ("GET", SSE_ENDPOINT):
+            await self._handle_legacy_stream(writer)
+            return False
+        if route == ("POST", MESSAGES_ENDPOINT):
+            return await self._handle_legacy_message(request, writer)
+        if route == ("GET", "/health"):
+            body = json.dumps({"status": "ok", "sessions": len(self.sessions)}).encode("utf-8")
+            return await self._respond(writer, request, 200, body, "application/json")
+        return await self._respond(writer, request, 404)
+
+    async def _respond(self, writer: asyncio.StreamWriter, request: HTTPRequest, status: int,
+                       body: bytes = b"", content_type: Optional[str] = None,
+                       headers: Optional[Dict[str, str]] = None) -> bool:
+        writer.write(render_response(status, body, content_type, headers, request.keep_alive))
+        await writer.drain()
+        return request.keep_alive
+
+    # ---------- Streamable HTTP ----------
+
+    async def _handle_post(self, request: HTTPRequest, writer: asyncio.StreamWriter) -> bool:
+        try:
+            message = json.loads(request.body)
+        except (ValueError, UnicodeDecodeError) as e:
+            error = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": f"Parse error: {e}"}}
+            return await self._respond(writer, request, 400, json.dumps(error).encode("utf-8"), "application/json")
+
+        headers: Dict[str, str] = {}
+        session_id = request.headers.get(SESSION_HEADER)
+        session: Optional[Session] = None
+        if is_initialize(message):
+            session = self._new_session()
+            headers["Mcp-Session-Id"] = session.id
+        elif session_id:
+            # 客户端带了会话 ID 但会话已结束：按规范返回 404，客户端应重新 initialize
+            session = self.sessions.get(session_id)
+            if session is None:
+                return await self._respond(writer, request, 404, b"Unknown session", "text/plain")
+            session.last_seen = time.time()
+
+        # 请求 id 只在同一会话内唯一，取消通知按会话匹配
+        response = await self.server.process_message(request.body.decode("utf-8"),
+                                                      scope=session.id if session else None)
+        if not expects_response(message) or not response:
+            return await self._respond(writer, request, 202, headers=headers)
+        if request.accepts("application/json"):
+            return await self._respond(writer, request, 200, response.encode("utf-8"), "application/json", headers)
+        # 只接受 SSE 的客户端：以单个事件返回后关闭流
+        head = ["HTTP/1.1 200 OK", "Content-Type: text/event-stream", "Cache-Control: no-cache",
+                "Connection: close"] + [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + sse_event(response))
+        await writer.drain()
+        return False
+
+    # ---------- 旧版 HTTP+SSE ----------
+
+    async def _handle_legacy_stream(self, writer: asyncio.StreamWriter) -> None:
+        session = self._new_session(legacy=True)
+        head = "HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n"
+        try:
+            writer.write(head.encode("latin-1"))
+            writer.write(sse_event(f"{MESSAGES_ENDPOINT}?session_id={session.id}", event="endpoint"))
+            await writer.drain()
+            while True:
+                try:
+                    response = await asyncio.wait_for(session.queue.get(), SSE_PING_SECONDS)
+                    writer.write(sse_event(response))
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.pop(session.id, None)
+
+    async def _handle_legacy_message(self, request: HTTPRequest, writer: asyncio.StreamWriter) -> bool:
+        session = self.sessions.get(request.query.get("session_id", ""))
+        if session is None or session.queue is None:
+            return await self._respond(writer, request, 404, b"Unknown session", "text/plain")
+        session.last_seen = time.time()
+        # 响应经 SSE 流推送，这里立即返回 202，慢调用不占用 POST 连接
+        task = asyncio.create_task(self._deliver(session, request.body.decode("utf-8", "replace")))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return await self._respond(writer, request, 202)
+
+    async def _deliver(self, session: Session, body: str) -> None:
+        try:
+            message = json.loads(body)
+        except ValueError:
+            message = {"id": None, "method": ""}
+        response = await self.server.process_message(body, scope=session.id)
+        if response and expects_response(message):
+            await session.queue.put(response)
@@ -0,0 +1,396 @@
+"""Incremental per-symbol technical indicator state.
+
+``IndicatorState`` 保存计算各指标所需的最小状态：EMA 累加器、环形缓冲区中的滚动窗口、
+单调队列维护的窗口最高/最低价以及 Wilder 平滑值。每来一根新K线以常数时间更新，
+结果与 ``indicators.compute_indicators`` 在整段历史上计算的最后一行一致；
+缺失的K线（NaN 或无穷大）与向量化计算一样按停牌处理（``indicators.fill_missing``），不会污染累加器。
+状态可序列化为 JSON，随本地K线库一起持久化。
+"""
+import json
+import math
+from collections import deque
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+from .indicators import (
+    CLOSE, DATE, DIVERGENCE_WINDOW, HIGH, LEVEL_WINDOWS, LOW, MA_WINDOWS, RSI_PERIODS,
+    VOLUME, VOLUME_MA_WINDOWS, to_number,
+)
+
+# 状态格式版本，格式变化时旧状态会被丢弃并从K线重放
+# （2：缺失的K线按停牌处理，丢弃此前可能被 NaN 污染的状态）
+STATE_VERSION = 2
+
+KDJ_WINDOW = 9
+BOLL_WINDOW = 20
+ATR_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+
+
+def _float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class RingWindow:
+    """Fixed-size ring buffer that keeps a running sum."""
+
+    def __init__(self, size: int, values: Tuple[float, ...] = ()):
+        self.size = size
+        self.values: Deque[float] = deque(values, maxlen=size)
+        self.total = math.fsum(self.values)
+
+    def push(self, value: float) -> None:
+        if len(self.values) == self.size:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.size
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.size if self.full else None
+
+    def pstdev(self) -> Optional[float]:
+        """窗口内的总体标准差（只在取结果时计算）"""
+        if not self.full:
+            return None
+        mean = math.fsum(self.values) / self.size
+        return math.sqrt(math.fsum((value - mean) ** 2 for value in self.values) / self.size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"size": self.size, "values": list(self.values)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RingWindow":
+        return cls(data["size"], tuple(data["values"]))
+
+
+class RollingExtreme:
+    """Sliding-window maximum or minimum maintained with a monotonic deque."""
+
+    def __init__(self, size: int, highest: bool, items: Tuple[Tuple[int, float], ...] = (), count: int = 0):
+        self.size = size
+        self.highest = highest
+        self.items: Deque[Tuple[int, float]] = deque(tuple(item) for item in items)
+        self.count = count
+
+    def push(self, value: float) -> None:
+        index = self.count
+        self.count += 1
+        if math.isnan(value):
+            return
+        if self.highest:
+            while self.items and self.items[-1][1] <= value:
+                self.items.pop()
+        else:
+            while self.items and self.items[-1][1] >= value:
+                self.items.pop()
+        self.items.append((index, value))
+        while self.items[0][0] <= index - self.size:
+            self.items.popleft()
+
+    def value(self, min_periods: int = 1) -> Optional[float]:
+        if self.count < min_periods or not self.items:
+            return None
+        return self.items[0][1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"size": self.size, "highest": self.highest, "items": list(self.items), "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RollingExtreme":
+        return cls(data["size"], data["highest"], tuple(data["items"]), data["count"])
+
+
+class ExponentialAverage:
+    """EMA accumulator: ``value += alpha * (x - value)``, seeded with the first input."""
+
+    def __init__(self, alpha: float, value: Optional[float] = None):
+        self.alpha = alpha
+        self.value = value
+
+    def push(self, value: float) -> None:
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"alpha": self.alpha, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExponentialAverage":
+        return cls(data["alpha"], data["value"])
+
+
+class WilderAverage:
+    """Wilder smoothing seeded with the simple mean of the first ``period`` inputs."""
+
+    def __init__(self, period: int, count: int = 0, total: float = 0.0, value: Optional[float] = None):
+        self.period = period
+        self.count = count
+        self.total = total
+        self.value = value
+
+    def push(self, value: float) -> None:
+        if self.value is None:
+            self.count += 1
+            self.total += value
+            if self.count == self.period:
+                self.value = self.total / self.period
+        else:
+            self.value += (value - self.value) / self.period
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"period": self.period, "count": self.count, "total": self.total, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WilderAverage":
+        return cls(data["period"], data["count"], data["total"], data["value"])
+
+
+class IndicatorState:
+    """Rolling indicator state for one symbol, updated one bar at a time."""
+
+    def __init__(self):
+        self.bars = 0
+        self.last_date: Optional[str] = None
+        self.close: Optional[float] = None
+        self.obv = 0.0
+        self.ma = {window: RingWindow(window) for window in set(MA_WINDOWS) | {BOLL_WINDOW}}
+        self.volume_ma = {window: RingWindow(window) for window in VOLUME_MA_WINDOWS}
+        self.ema_fast = ExponentialAverage(2 / (MACD_FAST + 1))
+        self.ema_slow = ExponentialAverage(2 / (MACD_SLOW + 1))
+        self.dea = ExponentialAverage(2 / (MACD_SIGNAL + 1))
+        self.kdj_high = RollingExtreme(KDJ_WINDOW, highest=True)
+        self.kdj_low = RollingExtreme(KDJ_WINDOW, highest=False)
+        self.k = ExponentialAverage(1 / 3, 50.0)
+        self.d = ExponentialAverage(1 / 3, 50.0)
+        self.rsi = {period: (WilderAverage(period), WilderAverage(period)) for period in RSI_PERIODS}
+        self.atr = WilderAverage(ATR_PERIOD)
+        self.levels = {
+            window: (RollingExtreme(window, highest=False), RollingExtreme(window, highest=True))
+            for window in LEVEL_WINDOWS
+        }
+        # 背离判断需要的窗口高低点，以及 DIVERGENCE_WINDOW 个交易日之前的值
+        self.close_high = RollingExtreme(DIVERGENCE_WINDOW, highest=True)
+        self.close_low = RollingExtreme(DIVERGENCE_WINDOW, highest=False)
+        self.dif_high = RollingExtreme(DIVERGENCE_WINDOW, highest=True)
+        self.dif_low = RollingExtreme(DIVERGENCE_WINDOW, highest=False)
+        self.recent: Dict[str, Deque[Optional[float]]] = {
+            name: deque(maxlen=DIVERGENCE_WINDOW + 1)
+            for name in ("close", "obv", "close_high", "close_low", "dif_high", "dif_low")
+        }
+
+    def update(self, bar: Mapping[str, Any]) -> None:
+        """应用一根新K线（常数时间）"""
+        close, high, low = _float(bar[CLOSE]), _float(bar[HIGH]), _float(bar[LOW])
+        volume = _float(bar[VOLUME])
+        # 缺失的K线按停牌处理：收盘价沿用前值，最高/最低价取收盘价，成交量为 0
+        if not math.isfinite(close):
+            if self.close is None:
+                # 还没有任何有效收盘价，只推进检查点日期
+                self.last_date = str(bar[DATE]) if DATE in bar else self.last_date
+                return
+            close = self.close
+        high = high if math.isfinite(high) else close
+        low = low if math.isfinite(low) else close
+        volume = volume if math.isfinite(volume) else 0.0
+        prev_close = self.close
+
+        if prev_close is None:
+            true_range = high - low
+        else:
+            change = close - prev_close
+            direction = (change > 0) - (change < 0)
+            self.obv += direction * volume
+            for gains, losses in self.rsi.values():
+                gains.push(max(change, 0.0))
+                losses.push(max(-change, 0.0))
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        self.atr.push(true_range)
+
+        self.ema_fast.push(close)
+        self.ema_slow.push(close)
+        dif = self.ema_fast.value - self.ema_slow.value
+        self.dea.push(dif)
+
+        self.kdj_high.push(high)
+        self.kdj_low.push(low)
+        highest, lowest = self.kdj_high.value(), self.kdj_low.value()
+        spread = highest - lowest if highest is not None and lowest is not None else 0.0
+        rsv = (close - lowest) / spread * 100 if spread > 0 else 50.0
+        self.k.push(rsv)
+        self.d.push(self.k.value)
+
+        for window in self.ma.values():
+            window.push(close)
+        for window in self.volume_ma.values():
+            window.push(volume)
+        for support, resistance in self.levels.values():
+            support.push(low)
+            resistance.push(high)
+
+        self.close_high.push(close)
+        self.close_low.push(close)
+        self.dif_high.push(dif)
+        self.dif_low.push(dif)
+        self.recent["close"].append(close)
+        self.recent["obv"].append(self.obv)
+        for name in ("close_high", "close_low", "dif_high", "dif_low"):
+            self.recent[name].append(getattr(self, name).value(DIVERGENCE_WINDOW))
+
+        self.close = close
+        self.bars += 1
+        self.last_date = str(bar[DATE]) if DATE in bar else self.last_date
+
+    def _window_ago(self, name: str) -> Tuple[Optional[float], Optional[float]]:
+        """返回 (当前值, DIVERGENCE_WINDOW 个交易日之前的值)"""
+        values = self.recent[name]
+        if len(values) <= DIVERGENCE_WINDOW:
+            return (values[-1] if values else None), None
+        return values[-1], values[0]
+
+    def _divergence(self) -> Dict[str, Any]:
+        def rising(name):
+            current, before = self._window_ago(name)
+            return current is not None and before is not None and current > before
+
+        def falling(name):
+            current, before = self._window_ago(name)
+            return current is not None and before is not None and current < before
+
+        macd_divergence = None
+        if rising("close_high") and falling("dif_high"):
+            macd_divergence = "top"
+        elif falling("close_low") and rising("dif_low"):
+            macd_divergence = "bottom"
+
+        close, close_before = self._window_ago("close")
+        obv, obv_before = self._window_ago("obv")
+        volume_price = False
+        if close_before is not None and obv_before is not None:
+            price_move = (close > close_before) - (close < close_before)
+            volume_move = (obv > obv_before) - (obv < obv_before)
+            volume_price = price_move * volume_move < 0
+        return {"macd": macd_divergence, "volume_price": volume_price}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前（最后一根K线）的结构化指标值，格式与 ``indicators.latest_indicators`` 相同"""
+        dif = None
+        if self.ema_fast.value is not None:
+            dif = self.ema_fast.value - self.ema_slow.value
+        dea = self.dea.value
+        k, d = (self.k.value, self.d.value) if self.bars else (None, None)
+
+        rsi_values = {}
+        for period, (gains, losses) in self.rsi.items():
+            value = None
+            if gains.value is not None:
+                if losses.value == 0:
+                    value = 50.0 if gains.value == 0 else 100.0
+                else:
+                    value = 100 - 100 / (1 + gains.value / losses.value)
+            rsi_values[f"rsi{period}"] = to_number(value)
+
+        mid = self.ma[BOLL_WINDOW].mean()
+        std = self.ma[BOLL_WINDOW].pstdev()
+        return {
+            "date": self.last_date,
+            "close": to_number(self.close),
+            "ma": {f"ma{w}": to_number(self.ma[w].mean()) for w in MA_WINDOWS},
+            "macd": {
+                "dif": to_number(dif),
+                "dea": to_number(dea),
+                "hist": to_number(2 * (dif - dea) if dif is not None else None),
+            },
+            "kdj": {"k": to_number(k), "d": to_number(d), "j": to_number(3 * k - 2 * d if self.bars else None)},
+            "rsi": rsi_values,
+            "boll": {
+                "mid": to_number(mid),
+                "upper": to_number(mid + 2 * std if mid is not None else None),
+                "lower": to_number(mid - 2 * std if mid is not None else None),
+            },
+            "atr": to_number(self.atr.value),
+            "obv": to_number(self.obv),
+            "volume_ma": {f"vol_ma{w}": to_number(self.volume_ma[w].mean()) for w in VOLUME_MA_WINDOWS},
+            "levels": {
+                **{f"support{w}": to_number(self.levels[w][0].value()) for w in LEVEL_WINDOWS},
+                **{f"resistance{w}": to_number(self.levels[w][1].value()) for w in LEVEL_WINDOWS},
+            },
+            "divergence": self._divergence(),
+        }
+
+    # ---------- 持久化 ----------
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "version": STATE_VERSION,
+            "bars": self.bars,
+            "last_date": self.last_date,
+            "close": self.close,
+            "obv": self.obv,
+            "ma": {str(w): window.to_dict() for w, window in self.ma.items()},
+            "volume_ma": {str(w): window.to_dict() for w, window in self.volume_ma.items()},
+            "ema_fast": self.ema_fast.to_dict(),
+            "ema_slow": self.ema_slow.to_dict(),
+            "dea": self.dea.to_dict(),
+            "kdj_high": self.kdj_high.to_dict(),
+            "kdj_low": self.kdj_low.to_dict(),
+            "k": self.k.to_dict(),
+            "d": self.d.to_dict(),
+            "rsi": {str(p): [gains.to_dict(), losses.to_dict()] for p, (gains, losses) in self.rsi.items()},
+            "atr": self.atr.to_dict(),
+            "levels": {str(w): [s.to_dict(), r.to_dict()] for w, (s, r) in self.levels.items()},
+            "close_high": self.close_high.to_dict(),
+            "close_low": self.close_low.to_dict(),
+            "dif_high": self.dif_high.to_dict(),
+            "dif_low": self.dif_low.to_dict(),
+            "recent": {name: list(values) for name, values in self.recent.items()},
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> Optional["IndicatorState"]:
+        """恢复状态；格式版本不一致时返回 None"""
+        data = json.loads(text)
+        if data.get("version") != STATE_VERSION:
+            return None
+        state = cls()
+        state.bars = data["bars"]
+        state.last_date = data["last_date"]
+        state.close = data["close"]
+        state.obv = data["obv"]
+        state.ma = {int(w): RingWindow.from_dict(v) for w, v in data["ma"].items()}
+        state.volume_ma = {int(w): RingWindow.from_dict(v) for w, v in data["volume_ma"].items()}
+        for name in ("ema_fast", "ema_slow", "dea", "k", "d"):
+            setattr(state, name, ExponentialAverage.from_dict(data[name]))
+        for name in ("kdj_high", "kdj_low", "close_high", "close_low", "dif_high", "dif_low"):
+            setattr(state, name, RollingExtreme.from_dict(data[name]))
+        state.rsi = {
+            int(p): (WilderAverage.from_dict(gains), WilderAverage.from_dict(losses))
+            for p, (gains, losses) in data["rsi"].items()
+        }
+        state.atr = WilderAverage.from_dict(data["atr"])
+        state.levels = {
+            int(w): (RollingExtreme.from_dict(s), RollingExtreme.from_dict(r))
+            for w, (s, r) in data["levels"].items()
+        }
+        state.recent = {
+            name: deque(values, maxlen=DIVERGENCE_WINDOW + 1) for name, values in data["recent"].items()
+        }
+        return state
+
+    def copy(self) -> "IndicatorState":
+        return IndicatorState.from_json(self.to_json())
+
+    @classmethod
+    def replay(cls, bars: List[Mapping[str, Any]]) -> "IndicatorState":
+        """由一段K线从头构建状态"""
+        state = cls()
+        for bar in bars:
+            state.update(bar)
+        return state
@@ -0,0 +1,293 @@
+"""Vectorized technical indicators over a full bar history.
+
+所有指标一次性在整段序列上计算（NumPy / pandas 的 C 实现，无 Python 逐 bar 循环）。
+输入可以是一维数组（单只股票），也可以是二维数组（行为交易日、列为股票，要求各列日期对齐），
+这样全市场数千只股票可以在一次调用中完成计算。
+缺失的K线（NaN 或无穷大）按停牌处理（见 ``fill_missing``），与增量计算的 ``IndicatorState`` 规则相同。
+"""
+import math
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 日线 DataFrame 中使用的列名（与 akshare / 本地K线库一致）
+OPEN, CLOSE, HIGH, LOW, VOLUME, DATE = "开盘", "收盘", "最高", "最低", "成交量", "日期"
+
+MA_WINDOWS = (5, 10, 20, 60)
+VOLUME_MA_WINDOWS = (5, 10, 20)
+RSI_PERIODS = (6, 14)
+# 支撑/阻力位使用的回看窗口
+LEVEL_WINDOWS = (20, 60)
+# 背离判断：比较最近一个窗口与前一个窗口的高低点
+DIVERGENCE_WINDOW = 20
+
+
+def _as_2d(values: Any) -> Tuple[np.ndarray, bool]:
+    arr = np.asarray(values, dtype=float)
+    if arr.ndim == 1:
+        return arr[:, None], True
+    return arr, False
+
+
+def _restore(arr: np.ndarray, squeeze: bool) -> np.ndarray:
+    return arr[:, 0] if squeeze else arr
+
+
+def _shift(arr: np.ndarray, periods: int) -> np.ndarray:
+    """沿时间轴向后平移，空出的位置填 NaN"""
+    out = np.full_like(arr, np.nan)
+    if periods < len(arr):
+        out[periods:] = arr[:len(arr) - periods]
+    return out
+
+
+def fill_missing(close: Any, high: Any, low: Any, volume: Any) -> Tuple[np.ndarray, ...]:
+    """缺失的K线按停牌处理：收盘价沿用前一根K线，最高/最低价取收盘价，成交量为 0"""
+    close, squeeze = _as_2d(close)
+    high, _ = _as_2d(high)
+    low, _ = _as_2d(low)
+    volume, _ = _as_2d(volume)
+    close = pd.DataFrame(np.where(np.isfinite(close), close, np.nan)).ffill().to_numpy()
+    high = np.where(np.isfinite(high), high, close)
+    low = np.where(np.isfinite(low), low, close)
+    volume = np.where(np.isfinite(volume), volume, 0.0)
+    return tuple(_restore(arr, squeeze) for arr in (close, high, low, volume))
+
+
+def sma(values: Any, window: int) -> np.ndarray:
+    """简单移动平均，不足窗口长度处为 NaN"""
+    arr, squeeze = _as_2d(values)
+    out = pd.DataFrame(arr).rolling(window, min_periods=window).mean().to_numpy()
+    return _restore(out, squeeze)
+
+
+def ema(values: Any, span: int) -> np.ndarray:
+    """指数移动平均（alpha = 2 / (span + 1)，以首个值为初值）"""
+    arr, squeeze = _as_2d(values)
+    out = pd.DataFrame(arr).ewm(span=span, adjust=False).mean().to_numpy()
+    return _restore(out, squeeze)
+
+
+def wilder_smooth(values: Any, period: int, start: int = 0) -> np.ndarray:
+    """Wilder 平滑：以 ``start`` 起前 ``period`` 个值的均值为种子，之后 alpha = 1 / period"""
+    arr, squeeze = _as_2d(values)
+    seed_at = start + period - 1
+    out = np.full_like(arr, np.nan)
+    if len(arr) > seed_at:
+        seeded = arr.copy()
+        seeded[:seed_at] = np.nan
+        seeded[seed_at] = arr[start:seed_at + 1].mean(axis=0)
+        out = pd.DataFrame(seeded).ewm(alpha=1.0 / period, adjust=False, ignore_na=True).mean().to_numpy()
+    return _restore(out, squeeze)
+
+
+def macd(close: Any, fast: int = 12, slow: int = 26, signal: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD：返回 (DIF, DEA, MACD柱)，柱值按国内惯例为 2 * (DIF - DEA)"""
+    dif = ema(close, fast) - ema(close, slow)
+    dea = ema(dif, signal)
+    return dif, dea, 2 * (dif - dea)
+
+
+def kdj(high: Any, low: Any, close: Any, n: int = 9, m1: int = 3, m2: int = 3) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """KDJ 随机指标：K、D 以 50 为初值做 1/m 平滑，J = 3K - 2D"""
+    high, squeeze = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    llv = pd.DataFrame(low).rolling(n, min_periods=1).min().to_numpy()
+    hhv = pd.DataFrame(high).rolling(n, min_periods=1).max().to_numpy()
+    spread = hhv - llv
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsv = np.where(spread > 0, (close - llv) / spread * 100, 50.0)
+
+    def smooth(values: np.ndarray, m: int) -> np.ndarray:
+        # 在最前面补一行初值 50，平滑后去掉
+        padded = np.vstack([np.full((1, values.shape[1]), 50.0), values])
+        return pd.DataFrame(padded).ewm(alpha=1.0 / m, adjust=False).mean().to_numpy()[1:]
+
+    k = smooth(rsv, m1)
+    d = smooth(k, m2)
+    j = 3 * k - 2 * d
+    return _restore(k, squeeze), _restore(d, squeeze), _restore(j, squeeze)
+
+
+def rsi(close: Any, period: int = 14) -> np.ndarray:
+    """Wilder RSI"""
+    close, squeeze = _as_2d(close)
+    change = np.diff(close, axis=0, prepend=np.nan)
+    gain = np.where(change > 0, change, 0.0)
+    loss = np.where(change < 0, -change, 0.0)
+    gain[0] = loss[0] = np.nan
+    avg_gain = wilder_smooth(gain, period, start=1)
+    avg_loss = wilder_smooth(loss, period, start=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = 100 - 100 / (1 + avg_gain / avg_loss)
+    out = np.where((avg_loss == 0) & (avg_gain == 0), 50.0, out)
+    out = np.where((avg_loss == 0) & (avg_gain > 0), 100.0, out)
+    return _restore(out, squeeze)
+
+
+def boll(close: Any, n: int = 20, k: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """布林带：返回 (中轨, 上轨, 下轨)，标准差为总体标准差"""
+    close, squeeze = _as_2d(close)
+    rolling = pd.DataFrame(close).rolling(n, min_periods=n)
+    mid = rolling.mean().to_numpy()
+    std = rolling.std(ddof=0).to_numpy()
+    return _restore(mid, squeeze), _restore(mid + k * std, squeeze), _restore(mid - k * std, squeeze)
+
+
+def true_range(high: Any, low: Any, close: Any) -> np.ndarray:
+    """真实波幅，首个交易日为 最高 - 最低"""
+    high, squeeze = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    prev_close = _shift(close, 1)
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return _restore(tr, squeeze)
+
+
+def atr(high: Any, low: Any, close: Any, period: int = 14) -> np.ndarray:
+    """平均真实波幅（Wilder 平滑）"""
+    return wilder_smooth(true_range(high, low, close), period)
+
+
+def obv(close: Any, volume: Any) -> np.ndarray:
+    """能量潮：按涨跌方向累加成交量"""
+    close, squeeze = _as_2d(close)
+    volume, _ = _as_2d(volume)
+    direction = np.sign(np.diff(close, axis=0, prepend=close[:1]))
+    return _restore(np.cumsum(np.nan_to_num(direction * volume), axis=0), squeeze)
+
+
+def rolling_levels(high: Any, low: Any, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """最近 ``window`` 个交易日的最低价（支撑）与最高价（阻力）"""
+    high, squeeze = _as_2d(high)
+    low, _ = _as_2d(low)
+    support = pd.DataFrame(low).rolling(window, min_periods=1).min().to_numpy()
+    resistance = pd.DataFrame(high).rolling(window, min_periods=1).max().to_numpy()
+    return _restore(support, squeeze), _restore(resistance, squeeze)
+
+
+def macd_divergence(close: Any, dif: Any, window: int = DIVERGENCE_WINDOW) -> Tuple[np.ndarray, np.ndarray]:
+    """MACD 顶/底背离：价格创出更高的高点而 DIF 高点走低为顶背离，反之为底背离"""
+    close, squeeze = _as_2d(close)
+    dif, _ = _as_2d(dif)
+    frame_close, frame_dif = pd.DataFrame(close), pd.DataFrame(dif)
+    close_high = frame_close.rolling(window, min_periods=window).max().to_numpy()
+    close_low = frame_close.rolling(window, min_periods=window).min().to_numpy()
+    dif_high = frame_dif.rolling(window, min_periods=window).max().to_numpy()
+    dif_low = frame_dif.rolling(window, min_periods=window).min().to_numpy()
+    with np.errstate(invalid="ignore"):
+        top = (close_high > _shift(close_high, window)) & (dif_high < _shift(dif_high, window))
+        bottom = (close_low < _shift(close_low, window)) & (dif_low > _shift(dif_low, window))
+    return _restore(top, squeeze), _restore(bottom, squeeze)
+
+
+def volume_price_divergence(close: Any, obv_values: Any, window: int = DIVERGENCE_WINDOW) -> np.ndarray:
+    """量价背离：最近 ``window`` 个交易日价格与 OBV 的变化方向相反"""
+    close, squeeze = _as_2d(close)
+    obv_values, _ = _as_2d(obv_values)
+    with np.errstate(invalid="ignore"):
+        price_move = np.sign(close - _shift(close, window))
+        volume_move = np.sign(obv_values - _shift(obv_values, window))
+        out = price_move * volume_move < 0
+    return _restore(out, squeeze)
+
+
+def compute_indicators(bars: pd.DataFrame) -> pd.DataFrame:
+    """在整段日线数据上计算全部指标，返回与输入逐行对应的 DataFrame"""
+    close, high, low, volume = fill_missing(
+        *(bars[column].to_numpy(dtype=float) for column in (CLOSE, HIGH, LOW, VOLUME))
+    )
+
+    columns: Dict[str, np.ndarray] = {}
+    for window in MA_WINDOWS:
+        columns[f"MA{window}"] = sma(close, window)
+    dif, dea, hist = macd(close)
+    columns.update(DIF=dif, DEA=dea, MACD=hist)
+    k, d, j = kdj(high, low, close)
+    columns.update(K=k, D=d, J=j)
+    for period in RSI_PERIODS:
+        columns[f"RSI{period}"] = rsi(close, period)
+    mid, upper, lower = boll(close)
+    columns.update(BOLL_MID=mid, BOLL_UPPER=upper, BOLL_LOWER=lower)
+    columns["ATR14"] = atr(high, low, close)
+    columns["OBV"] = obv(close, volume)
+    for window in VOLUME_MA_WINDOWS:
+        columns[f"VOL_MA{window}"] = sma(volume, window)
+    for window in LEVEL_WINDOWS:
+        support, resistance = rolling_levels(high, low, window)
+        columns[f"SUPPORT{window}"] = support
+        columns[f"RESISTANCE{window}"] = resistance
+    top, bottom = macd_divergence(close, dif)
+    columns.update(MACD_TOP_DIV=top, MACD_BOTTOM_DIV=bottom)
+    columns["VOL_PRICE_DIV"] = volume_price_divergence(close, columns["OBV"])
+
+    return pd.DataFrame(columns, index=bars.index)
+
+
+def to_number(value: Any) -> Optional[float]:
+    """转换为保留4位小数的浮点数，缺失值（None / NaN）返回 None"""
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else round(value, 4)
+
+
+def latest_indicators(bars: pd.DataFrame, computed: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+    """最后一个交易日的结构化指标值（NaN 以 None 表示）"""
+    computed = compute_indicators(bars) if computed is None else computed
+    last = computed.iloc[-1]
+    bar = bars.iloc[-1]
+    # 最后一根K线缺失时收盘价沿用前值（与 fill_missing 一致）
+    closes = bars[CLOSE].to_numpy(dtype=float)
+    closes = closes[np.isfinite(closes)]
+    divergence = None
+    if last["MACD_TOP_DIV"]:
+        divergence = "top"
+    elif last["MACD_BOTTOM_DIV"]:
+        divergence = "bottom"
+    return {
+        "date": str(bar[DATE]) if DATE in bars.columns else None,
+        "close": to_number(closes[-1] if len(closes) else None),
+        "ma": {f"ma{w}": to_number(last[f"MA{w}"]) for w in MA_WINDOWS},
+        "macd": {"dif": to_number(last["DIF"]), "dea": to_number(last["DEA"]), "hist": to_number(last["MACD"])},
+        "kdj": {"k": to_number(last["K"]), "d": to_number(last["D"]), "j": to_number(last["J"])},
+        "rsi": {f"rsi{p}": to_number(last[f"RSI{p}"]) for p in RSI_PERIODS},
+        "boll": {"mid": to_number(last["BOLL_MID"]), "upper": to_number(last["BOLL_UPPER"]),
+                 "lower": to_number(last["BOLL_LOWER"])},
+        "atr": to_number(last["ATR14"]),
+        "obv": to_number(last["OBV"]),
+        "volume_ma": {f"vol_ma{w}": to_number(last[f"VOL_MA{w}"]) for w in VOLUME_MA_WINDOWS},
+        "levels": {
+            **{f"support{w}": to_number(last[f"SUPPORT{w}"]) for w in LEVEL_WINDOWS},
+            **{f"resistance{w}": to_number(last[f"RESISTANCE{w}"]) for w in LEVEL_WINDOWS},
+        },
+        "divergence": {"macd": divergence, "volume_price": bool(last["VOL_PRICE_DIV"])},
+    }
+
+
+def compute_panel(close: np.ndarray, high: np.ndarray, low: np.ndarray, volume: np.ndarray,
+                  symbols: Sequence[str]) -> pd.DataFrame:
+    """对日期对齐的多只股票（行为交易日、列为股票）一次性计算，返回每只股票最新一天的指标"""
+    close, high, low, volume = fill_missing(close, high, low, volume)
+    dif, dea, hist = macd(close)
+    k, d, j = kdj(high, low, close)
+    mid, upper, lower = boll(close)
+    obv_values = obv(close, volume)
+    top, bottom = macd_divergence(close, dif)
+    latest = {
+        "MA5": sma(close, 5)[-1],
+        "MA20": sma(close, 20)[-1],
+        "MA60": sma(close, 60)[-1],
+        "DIF": dif[-1], "DEA": dea[-1], "MACD": hist[-1],
+        "K": k[-1], "D": d[-1], "J": j[-1],
+        "RSI14": rsi(close, 14)[-1],
+        "BOLL_MID": mid[-1], "BOLL_UPPER": upper[-1], "BOLL_LOWER": lower[-1],
+        "ATR14": atr(high, low, close)[-1],
+        "OBV": obv_values[-1],
+        "VOL_MA5": sma(volume, 5)[-1],
+        "MACD_TOP_DIV": top[-1], "MACD_BOTTOM_DIV": bottom[-1],
+        "VOL_PRICE_DIV": volume_price_divergence(close, obv_values)[-1],
+    }
+    return pd.DataFrame(latest, index=pd.Index(symbols, name="代码"))
@@ -0,0 +1,90 @@
+"""Deferred imports for heavy modules.
+
+``mcp.types``、``akshare``、``pandas`` 等模块导入需要数秒，而 initialize / tools/list
+握手并不需要它们。这里的代理对象在第一次访问属性时才真正导入模块，
+也可以在握手完成后由后台线程预热。
+"""
+import importlib
+import sys
+import threading
+from types import ModuleType
+from typing import Any, Callable, Iterable, Optional
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name: str, package: Optional[str] = None):
+        self.__dict__["_name"] = name
+        self.__dict__["_package"] = package
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def load(self) -> ModuleType:
+        """导入并返回真实模块（线程安全，只导入一次）"""
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self._name, self._package)
+                    self.__dict__["_module"] = module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self.load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+class LazyAttribute:
+    """Proxy for an attribute (e.g. a class) of a ``LazyModule``."""
+
+    def __init__(self, module: LazyModule, attr: str):
+        self.__dict__["_module"] = module
+        self.__dict__["_attr"] = attr
+
+    def resolve(self) -> Any:
+        return getattr(self._module.load(), self._attr)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.resolve(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self.resolve(), attr, value)
+
+    def __delattr__(self, attr: str) -> None:
+        delattr(self.resolve(), attr)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.resolve()(*args, **kwargs)
+
+
+def warm_up(modules: Iterable[LazyModule], then: Optional[Callable[[], None]] = None) -> threading.Thread:
+    """在后台守护线程中依次导入模块，全部导入后执行 then（如预热数据）"""
+    def run():
+        loaded = True
+        for module in modules:
+            try:
+                module.load()
+            except Exception as e:
+                loaded = False
+                print(f"后台预热导入 {module!r} 失败: {e}", file=sys.stderr)
+        if loaded and then is not None:
+            try:
+                then()
+            except Exception as e:
+                print(f"后台预热失败: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=run, name="finance-warmup", daemon=True)
+    thread.start()
+    return thread
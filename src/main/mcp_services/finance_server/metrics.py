@@ -0,0 +1,221 @@
+"""Per-tool latency and phase instrumentation.
+
+每次工具调用按阶段计时：排队（并发名额与限速等待）、上游请求、计算（处理函数中除上游等待以外的时间）、
+格式化（转换为 MCP content），并记录返回内容的字节数，按工具汇总为直方图。
+上游耗时通过 ``contextvars`` 归属到当前调用，线程池中执行时需用 ``contextvars.copy_context`` 传递上下文。
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# 耗时直方图的桶上界（毫秒）
+LATENCY_BUCKETS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000, 120000,
+)
+# 返回内容大小直方图的桶上界（字节）
+SIZE_BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+PHASES = ("total", "queue", "upstream", "compute", "format")
+
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum and max."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction: float) -> float:
+        """按桶估算分位数（返回所在桶的上界，最后一个桶返回最大值）"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank and bucket:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 3),
+        }
+
+
+class CallRecord:
+    """Timings collected for one in-flight tool call."""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.started = time.perf_counter()
+        self.upstream = 0.0
+        self.upstream_calls = 0
+        self.handler = 0.0
+        self.format = 0.0
+        self.payload_bytes = 0
+        self.cache_hit = False
+        self.error = False
+        self._lock = threading.Lock()
+
+    def add_upstream(self, seconds: float) -> None:
+        # 批量工具会在多个线程中同时请求上游，这里累加各次请求的耗时
+        with self._lock:
+            self.upstream += seconds
+            self.upstream_calls += 1
+
+    @contextmanager
+    def timing_handler(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.handler += time.perf_counter() - started
+
+
+# 当前线程/任务正在执行的工具调用
+CURRENT_CALL: contextvars.ContextVar[Optional[CallRecord]] = contextvars.ContextVar("current_call", default=None)
+
+
+def current_call() -> Optional[CallRecord]:
+    return CURRENT_CALL.get()
+
+
+def record_upstream(seconds: float) -> None:
+    """把一次上游请求（含等待合并请求）的耗时计入当前工具调用"""
+    call = CURRENT_CALL.get()
+    if call is not None:
+        call.add_upstream(seconds)
+
+
+class ToolMetrics:
+    """Histograms and counters for one tool."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.in_flight = 0
+        self.upstream_calls = 0
+        self.phases = {phase: Histogram(LATENCY_BUCKETS_MS) for phase in PHASES}
+        self.payload_bytes = Histogram(SIZE_BUCKETS_BYTES)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": round(self.cache_hits / self.calls, 4) if self.calls else 0.0,
+            "in_flight": self.in_flight,
+            "upstream_calls": self.upstream_calls,
+            "latency_ms": {phase: histogram.summary() for phase, histogram in self.phases.items()},
+            "payload_bytes": self.payload_bytes.summary(),
+        }
+
+
+class ServerMetrics:
+    """Per-tool phase histograms plus registered cache statistics."""
+
+    def __init__(self):
+        self._tools: Dict[str, ToolMetrics] = {}
+        self._caches: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def _tool(self, name: str) -> ToolMetrics:
+        tool = self._tools.get(name)
+        if tool is None:
+            tool = self._tools[name] = ToolMetrics()
+        return tool
+
+    def register_cache(self, name: str, cache: Any) -> None:
+        """登记需要汇报命中率的缓存（需提供 ``stats()``）"""
+        self._caches[name] = cache
+
+    @contextmanager
+    def track(self, tool: str) -> Iterator[CallRecord]:
+        """记录一次工具调用，调用期间 ``record_upstream`` 计入该调用"""
+        call = CallRecord(tool)
+        with self._lock:
+            self._tool(tool).in_flight += 1
+        token = CURRENT_CALL.set(call)
+        try:
+            yield call
+        except BaseException:
+            call.error = True
+            raise
+        finally:
+            CURRENT_CALL.reset(token)
+            self._finish(call)
+
+    def _finish(self, call: CallRecord) -> None:
+        total = time.perf_counter() - call.started
+        upstream = call.upstream
+        phases = {
+            "total": total,
+            "queue": max(0.0, total - call.handler - call.format) if not call.cache_hit else 0.0,
+            "upstream": upstream,
+            "compute": max(0.0, call.handler - upstream),
+            "format": call.format,
+        }
+        with self._lock:
+            tool = self._tool(call.tool)
+            tool.in_flight -= 1
+            tool.calls += 1
+            tool.errors += call.error
+            tool.cache_hits += call.cache_hit
+            tool.upstream_calls += call.upstream_calls
+            for phase, seconds in phases.items():
+                if phase == "total" or not call.cache_hit:
+                    tool.phases[phase].observe(seconds * 1000)
+            tool.payload_bytes.observe(call.payload_bytes)
+
+    def in_flight(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: tool.in_flight for name, tool in self._tools.items() if tool.in_flight}
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """已登记缓存的命中率概要"""
+        summary = {}
+        for name, cache in list(self._caches.items()):
+            stats = cache.stats()
+            summary[name] = {
+                key: stats[key]
+                for key in ("hit_rate", "memory_hits", "shared_hits", "disk_hits", "misses", "stale_served", "memory_entries")
+                if key in stats
+            }
+        return summary
+
+    def stats(self, tools: Optional[List[str]] = None) -> Dict[str, Any]:
+        with self._lock:
+            names = sorted(self._tools) if not tools else [name for name in tools if name in self._tools]
+            per_tool = {name: self._tools[name].summary() for name in names}
+            in_flight = sum(tool.in_flight for tool in self._tools.values())
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "in_flight": in_flight,
+            "tools": per_tool,
+            "caches": self.cache_stats(),
+        }
+
+
+# 进程内共享的工具调用统计
+SERVER_METRICS = ServerMetrics()
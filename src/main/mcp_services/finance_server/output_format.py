@@ -0,0 +1,166 @@
+"""Output formats for data tool results.
+
+数据工具可以返回 ``DataResult``（表格或单条记录），由服务器按客户端在 ``format`` 参数中
+指定的格式渲染为 MCP 文本内容：
+
+- ``text``：原有的文本表格（默认）
+- ``json``：``{"title": ..., "records": [{列: 值}, ...]}``
+- ``columnar``：``{"title": ..., "columns": [...], "data": [[第1列的值...], ...]}``，列名只出现一次，体积最小
+
+同一个结果每种格式只渲染一次；服务器把渲染后的内容按 (参数, 格式) 写入结果缓存。
+出错时工具返回 ``ErrorText``，服务器在结果上标记 ``isError``，且不缓存。
+本模块不导入 pandas，只用到 DataFrame 的 ``columns``、``iloc`` 与 ``to_string``。
+"""
+import json
+import math
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+TEXT = "text"
+JSON = "json"
+COLUMNAR = "columnar"
+
+FORMATS = (TEXT, JSON, COLUMNAR)
+
+# 支持多种格式的工具在 schema 中附加的参数
+FORMAT_PROPERTY = {
+    "type": "string",
+    "description": "输出格式：text（文本表格，默认）、json（记录数组）或 columnar（按列数组，体积最小）",
+    "enum": list(FORMATS),
+}
+
+
+def jsonable(value: Any) -> Any:
+    """把 numpy/pandas 标量、日期和缺失值转换为 JSON 可表示的值"""
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if type(value).__name__ == "NAType":
+        return None
+    if hasattr(value, "item"):
+        # numpy 标量
+        try:
+            return jsonable(value.item())
+        except (TypeError, ValueError):
+            pass
+    if hasattr(value, "isoformat"):
+        # pandas.Timestamp / NaT
+        try:
+            return value.isoformat() if value == value else None
+        except (TypeError, ValueError):
+            pass
+    return str(value)
+
+
+def flatten(record: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """把嵌套的字典展开为以点号连接的列名（如 ``ma.ma5``），便于按列输出"""
+    flat: Dict[str, Any] = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def dumps(payload: Any) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+class ErrorText:
+    """Error message returned by a tool instead of raising; rendered like plain text and flagged as an error."""
+
+    type = "text"
+    is_error = True
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def render(self, fmt: str = TEXT) -> str:
+        return render_text(self.text, fmt)
+
+
+class DataResult:
+    """Structured tool result (a table or a single record) rendered once per requested format.
+
+    ``text`` 为文本格式的内容（字符串或返回字符串的函数），省略时按标题加表格生成；
+    ``extra`` 中的字段（如批量工具的错误、过期数据提示）原样附加到 JSON 格式中。
+    提供 ``type`` 与 ``text`` 属性，直接调用处理函数的代码可以像 ``TextContent`` 一样使用。
+    """
+
+    type = "text"
+    is_error = False
+
+    def __init__(self, title: str, frame: Any = None, record: Optional[Dict[str, Any]] = None,
+                 text: Union[str, Callable[[], str], None] = None, extra: Optional[Dict[str, Any]] = None):
+        self.title = title
+        self.frame = frame
+        self.record = record
+        self._text = text
+        self.extra = {key: value for key, value in (extra or {}).items() if value}
+        self._rendered: Dict[str, str] = {}
+
+    @property
+    def text(self) -> str:
+        return self.render(TEXT)
+
+    def render(self, fmt: str = TEXT) -> str:
+        rendered = self._rendered.get(fmt)
+        if rendered is None:
+            rendered = self._rendered[fmt] = self._render(fmt)
+        return rendered
+
+    def _render(self, fmt: str) -> str:
+        if fmt == TEXT:
+            return self._render_text()
+        payload: Dict[str, Any] = {"title": self.title}
+        columns, data = self._columns()
+        if fmt == JSON:
+            payload["records"] = [dict(zip(columns, row)) for row in zip(*data)] if columns else []
+        elif fmt == COLUMNAR:
+            payload["columns"] = columns
+            payload["data"] = data
+        else:
+            raise ValueError(f"Unsupported format: {fmt}")
+        payload.update(jsonable(self.extra))
+        return dumps(payload)
+
+    def _render_text(self) -> str:
+        if callable(self._text):
+            return self._text()
+        if self._text is not None:
+            return self._text
+        if self.record is not None:
+            body = "\n".join(f"{key}: {value}" for key, value in self.record.items())
+        elif self.frame is not None and len(self.frame):
+            body = self.frame.to_string(index=False)
+        else:
+            body = ""
+        return f"{self.title}:\n{body}"
+
+    def _columns(self) -> Tuple[List[str], List[List[Any]]]:
+        """列名与按列排列的值"""
+        if self.record is not None:
+            record = flatten(self.record)
+            return list(record), [[jsonable(value)] for value in record.values()]
+        if self.frame is None or not len(self.frame.columns):
+            return [], []
+        columns = [str(column) for column in self.frame.columns]
+        data = [[jsonable(value) for value in self.frame.iloc[:, index].tolist()] for index in range(len(columns))]
+        return columns, data
+
+    def __repr__(self) -> str:
+        return f"<DataResult {self.title!r}>"
+
+
+def render_text(text: str, fmt: str) -> str:
+    """未提供结构化数据的结果（说明文字、错误信息）在 JSON 格式下包装为 ``{"text": ...}``"""
+    return text if fmt == TEXT else dumps({"text": text})
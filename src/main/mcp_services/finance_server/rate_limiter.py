@@ -0,0 +1,185 @@
+"""Shared token-bucket rate limiter per upstream host.
+
+每个上游站点（eastmoney、sina、baidu、10jqka）一个令牌桶，所有请求路径共用：
+工作线程中的请求用 ``acquire_blocking`` 预约令牌，只等待本站点的桶；
+事件循环中用 ``wait_ready`` / ``acquire`` 异步等待，不会占用工作线程，也不会阻塞其他站点的请求。
+服务器在占用并发名额之前用 ``reserve`` 在事件循环中预先扣除一个令牌（``Reservation``），
+通过 ``PREPAID`` 传入工作线程，该调用第一次访问此站点时直接使用，未用掉的令牌在调用结束后退还。
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from typing import Dict, Optional
+
+from . import cancellation, config
+
+# 各站点默认的每秒请求数（0 表示不限制），可通过 FINANCE_MCP_RATE_LIMITS 覆盖
+DEFAULT_HOST_RATES: Dict[str, float] = {
+    "eastmoney": 5.0,
+    "sina": 3.0,
+    "baidu": 2.0,
+    "10jqka": 0.5,
+}
+
+
+class TokenBucket:
+    """Token bucket supporting reservations, so waiters queue without polling."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """预约令牌并立即扣除（余额可以为负），返回需要等待的秒数"""
+        if self.unlimited:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """距离有 ``tokens`` 个可用令牌还需等待的秒数（不扣除）"""
+        if self.unlimited:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def penalize(self, seconds: float) -> None:
+        """让之后的请求整体推迟 ``seconds`` 秒（用于上游报错后的退避）"""
+        if self.unlimited or seconds <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def refund(self, tokens: float = 1.0) -> None:
+        """退还预约后没有使用的令牌"""
+        if self.unlimited:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def set_rate(self, rate: float) -> None:
+        """调整速率（保留当前余额）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = max(1.0, rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class Reservation:
+    """A token already deducted on the event loop for one tool call's first request to ``host``."""
+
+    __slots__ = ("host", "_lock", "_available")
+
+    def __init__(self, host: str):
+        self.host = host
+        self._lock = threading.Lock()
+        self._available = True
+
+    def take(self) -> bool:
+        """取走预约的令牌，只有第一次返回 True"""
+        with self._lock:
+            available, self._available = self._available, False
+            return available
+
+
+# 当前工具调用在事件循环中预约的令牌
+PREPAID: contextvars.ContextVar[Optional[Reservation]] = contextvars.ContextVar("prepaid_token", default=None)
+
+
+class HostRateLimiter:
+    """One ``TokenBucket`` per upstream host."""
+
+    def __init__(self, default_rate: float, rates: Optional[Dict[str, float]] = None):
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def configured_rate(self, host: str) -> float:
+        """配置的每秒请求数（自适应调整不会超过该值）"""
+        return self.rates.get(host, self.default_rate)
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.configured_rate(host))
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire_blocking(self, host: str) -> float:
+        """在工作线程中获取一个令牌，返回等待的秒数；所属工具调用被取消时停止等待"""
+        prepaid = PREPAID.get()
+        if prepaid is not None and prepaid.host == host and prepaid.take():
+            return 0.0
+        wait = self.bucket(host).reserve()
+        if wait > 0:
+            cancellation.sleep(wait)
+        return wait
+
+    async def acquire(self, host: str) -> float:
+        """在事件循环中异步获取一个令牌"""
+        wait = self.bucket(host).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    async def reserve(self, host: str) -> Reservation:
+        """在事件循环中等待并扣除一个令牌，返回供工作线程使用的预约"""
+        await self.acquire(host)
+        return Reservation(host)
+
+    def refund(self, reservation: Reservation) -> None:
+        """调用结束时退还没有用掉的预约（如结果命中缓存）"""
+        if reservation.take():
+            self.bucket(reservation.host).refund()
+
+    async def wait_ready(self, host: str) -> None:
+        """异步等待站点有可用令牌（不扣除），避免工作线程在令牌桶上空等"""
+        bucket = self.bucket(host)
+        delay = bucket.delay()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = bucket.delay()
+
+    def penalize(self, host: str, seconds: float) -> None:
+        self.bucket(host).penalize(seconds)
+
+    def set_rate(self, host: str, rate: float) -> None:
+        self.bucket(host).set_rate(rate)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {
+            host: {"rate": bucket.rate, "tokens": round(bucket.tokens(), 3)}
+            for host, bucket in buckets.items()
+        }
+
+
+# 进程内共享的按站点限速
+RATE_LIMITS = HostRateLimiter(config.RATE_LIMIT_DEFAULT, {**DEFAULT_HOST_RATES, **config.RATE_LIMITS})
@@ -0,0 +1,117 @@
+"""Offline record/replay of upstream responses.
+
+录制模式下把每次 akshare 调用的结果（DataFrame 等）和直接 HTTP 请求的响应按请求键写入夹具目录；
+回放模式下只从夹具目录读取，不访问网络，可注入固定延迟模拟上游耗时。
+用于离线回归测试和可重复的性能测试。
+"""
+import atexit
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from . import cancellation, config
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+MODES = (OFF, RECORD, REPLAY)
+
+# 夹具类别
+AKSHARE = "akshare"
+HTTP = "http"
+
+
+class FixtureMissingError(LookupError):
+    """Raised in replay mode when no fixture was recorded for a request."""
+
+
+class FixtureStore:
+    """Pickle files keyed by request, one directory per fixture kind."""
+
+    def __init__(self, directory: Path, mode: str = OFF, latency: float = 0.0):
+        self._lock = threading.Lock()
+        self._counters = {"recorded": 0, "replayed": 0, "missing": 0}
+        self.configure(mode, directory, latency)
+
+    def configure(self, mode: Optional[str] = None, directory: Optional[Path] = None,
+                  latency: Optional[float] = None) -> None:
+        """切换模式、夹具目录或回放延迟（未指定的保持不变）"""
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"Unknown fixture mode: {mode}")
+            self.mode = mode
+        if directory is not None:
+            self.directory = Path(directory)
+        if latency is not None:
+            self.latency = max(0.0, latency)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _path(self, kind: str, key: str) -> Path:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.directory / kind / f"{digest}.pkl"
+
+    def record(self, kind: str, key: str, value: Any) -> None:
+        """写入一条夹具（同一请求重复录制时覆盖）"""
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._count("recorded")
+
+    def replay(self, kind: str, key: str) -> Any:
+        """读取夹具，按配置注入延迟；没有录制过时抛出 ``FixtureMissingError``"""
+        path = self._path(kind, key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, value = pickle.load(f)
+        except FileNotFoundError:
+            stored_key, value = None, None
+        if stored_key != key:
+            self._count("missing")
+            raise FixtureMissingError(f"未录制的{kind}请求: {key}")
+        if self.latency > 0:
+            # 与真实上游一样，注入的延迟可被工具调用的超时或取消打断
+            cancellation.sleep(self.latency)
+        self._count("replayed")
+        return value
+
+    def isolated_data_dir(self) -> Path:
+        """在夹具目录下新建本次运行专用的本地数据目录，进程退出时删除
+
+        K线库、证券代码表和磁盘缓存的已有内容会改变发往上游的请求（如K线库的增量 ``start_date``），
+        录制/回放时每次运行都从空的本地状态开始，回放结果不依赖之前的运行和当前日期。
+        """
+        parent = self.directory / "data"
+        parent.mkdir(parents=True, exist_ok=True)
+        data_dir = Path(tempfile.mkdtemp(prefix="run-", dir=str(parent)))
+        atexit.register(shutil.rmtree, str(data_dir), True)
+        return data_dir
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {"mode": self.mode, "directory": str(self.directory), "latency": self.latency, **counters}
+
+
+# 进程内共享的夹具存储
+FIXTURES = FixtureStore(config.FIXTURE_DIR, config.FIXTURE_MODE if config.FIXTURE_MODE in MODES else OFF,
+                        config.FIXTURE_LATENCY)
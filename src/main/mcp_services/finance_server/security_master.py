@@ -0,0 +1,416 @@
+"""Persisted security master: code -> name / market / industry.
+
+A股、指数、基金、期货主力合约的代码表从 akshare 的列表接口下载后保存在本地 SQLite 中，
+在后台线程中载入内存（服务启动预热时或首次查询时开始）：每类证券一个 代码 -> 行号 的字典，
+名称等列存为紧凑的列表，交易所与行业/类别只保存一次，每行用 ``array`` 中的小整数引用。
+查询为 O(1) 且从不等待网络：代码表尚未就绪或缺少某个列表时查不到（调用方按代码前缀判断交易所、
+名称显示“未知”），缺失和超过刷新周期（默认每日）的列表都在后台下载；
+某个列表更新后只重建该列表所属类别的索引。
+按名称搜索（代码前缀、名称/简拼前缀、名称包含、模糊匹配）使用首次搜索时建立的有序前缀索引。
+"""
+import bisect
+import difflib
+import itertools
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import pandas as pd
+
+from .data_cache import REVALIDATE_EXECUTOR
+
+# 证券类别
+STOCK = "stock"
+INDEX = "index"
+FUND = "fund"
+FUTURE = "future"
+
+KINDS = (STOCK, INDEX, FUND, FUTURE)
+
+# 某个列表下载失败且本地没有数据时，多久后再尝试（秒）
+RETRY_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS securities (
+    kind TEXT NOT NULL,
+    code TEXT NOT NULL,
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    market TEXT NOT NULL,
+    category TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    PRIMARY KEY (kind, code)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# (代码, 名称, 交易所, 行业/类别, 简拼)
+Row = Tuple[str, str, str, str, str]
+
+
+class Security(NamedTuple):
+    kind: str
+    code: str
+    name: str
+    market: str
+    category: str
+    alias: str
+
+
+class Source(NamedTuple):
+    """One listing endpoint feeding rows of a single kind."""
+    kind: str
+    fetch: Callable[[], Iterable[Row]]
+
+
+def prefix_market(code: str) -> str:
+    """根据A股代码前缀判断交易所（代码表中没有该代码时使用）"""
+    if code.startswith(('6', '9')):
+        return 'sh'
+    if code.startswith(('4', '8')):
+        return 'bj'
+    return 'sz'
+
+
+def _text(value: Any) -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value).strip()
+
+
+def _column(frame: pd.DataFrame, column: Optional[str]) -> List[str]:
+    if column in frame.columns:
+        return frame[column].map(_text).tolist()
+    return [""] * len(frame)
+
+
+def _rows(frame: pd.DataFrame, code: str, name: str, market: Any = "", category: Optional[str] = None,
+          alias: Optional[str] = None, market_column: Optional[str] = None) -> List[Row]:
+    """把列表接口的 DataFrame 转换为统一的行；market 可以是固定值、由代码计算的函数或取自 market_column 列"""
+    if frame is None or frame.empty or code not in frame.columns:
+        return []
+    codes = _column(frame, code)
+    if market_column is not None:
+        markets = _column(frame, market_column)
+    else:
+        markets = [market(c) if callable(market) else market for c in codes]
+    return [
+        row for row in zip(codes, _column(frame, name), markets, _column(frame, category), _column(frame, alias))
+        if row[0]
+    ]
+
+
+def _index_market(code: str) -> str:
+    if code.startswith('399'):
+        return 'sz'
+    if code.startswith(('000', '880', '950')):
+        return 'sh'
+    return ''
+
+
+def default_sources(ak: Any) -> Dict[str, Source]:
+    """各列表接口（通过带缓存、限速和熔断的 akshare 代理调用）"""
+    return {
+        "sh_main": Source(STOCK, lambda: _rows(
+            ak.stock_info_sh_name_code(symbol="主板A股"), "证券代码", "证券简称", "sh")),
+        "sh_star": Source(STOCK, lambda: _rows(
+            ak.stock_info_sh_name_code(symbol="科创板"), "证券代码", "证券简称", "sh")),
+        "sz": Source(STOCK, lambda: _rows(
+            ak.stock_info_sz_name_code(symbol="A股列表"), "A股代码", "A股简称", "sz", "所属行业")),
+        "bj": Source(STOCK, lambda: _rows(
+            ak.stock_info_bj_name_code(), "证券代码", "证券简称", "bj", "所属行业")),
+        "index": Source(INDEX, lambda: _rows(
+            ak.index_stock_info(), "index_code", "display_name", _index_market)),
+        "fund": Source(FUND, lambda: _rows(
+            ak.fund_name_em(), "基金代码", "基金简称", "", "基金类型", "拼音缩写")),
+        "futures": Source(FUTURE, lambda: _rows(
+            ak.futures_display_main_sina(), "symbol", "name", market_column="exchange")),
+    }
+
+
+class _KindIndex:
+    """Columnar rows of one kind plus a code -> position dict."""
+
+    __slots__ = ("positions", "codes", "names", "aliases", "markets", "categories", "labels", "search")
+
+    def __init__(self, labels: List[str]):
+        self.positions: Dict[str, int] = {}
+        self.codes: List[str] = []
+        self.names: List[str] = []
+        self.aliases: List[str] = []
+        self.markets = array("H")
+        self.categories = array("H")
+        # 交易所与行业/类别的取值表（各类别共用），markets/categories 中保存其下标
+        self.labels = labels
+        self.search: Optional[_SearchIndex] = None
+
+
+class _SearchIndex:
+    """Sorted name/alias prefix keys of one kind, built on first search."""
+
+    __slots__ = ("keys", "positions", "upper_names", "by_name")
+
+    def __init__(self, index: _KindIndex):
+        upper_names = [name.upper() for name in index.names]
+        pairs = sorted(itertools.chain(
+            ((name, position) for position, name in enumerate(upper_names)),
+            ((alias.upper(), position) for position, alias in enumerate(index.aliases) if alias),
+        ))
+        self.keys = [key for key, _ in pairs]
+        self.positions = array("I", (position for _, position in pairs))
+        self.upper_names = upper_names
+        self.by_name = {name: position for position, name in enumerate(upper_names)}
+
+    def prefixed(self, prefix: str) -> Iterator[int]:
+        start = bisect.bisect_left(self.keys, prefix)
+        for key, position in zip(itertools.islice(self.keys, start, None),
+                                 itertools.islice(self.positions, start, None)):
+            if not key.startswith(prefix):
+                break
+            yield position
+
+    def close_matches(self, query: str, limit: int) -> Iterator[int]:
+        # 生成器内才计算，前面的匹配已经足够时不做模糊比较
+        for name in difflib.get_close_matches(query, self.upper_names, n=limit):
+            yield self.by_name[name]
+
+
+def _code_prefixed(codes: List[str], prefix: str) -> Iterator[int]:
+    # 代码列表按代码排序（载入时 ORDER BY code），前缀匹配的行连续
+    position = bisect.bisect_left(codes, prefix)
+    while position < len(codes) and codes[position].startswith(prefix):
+        yield position
+        position += 1
+
+
+class SecurityMaster:
+    """Daily-refreshed local security master with O(1) lookups."""
+
+    def __init__(self, db_path: Path, sources: Dict[str, Source], refresh_seconds: float = 86400):
+        self.db_path = Path(db_path)
+        self._sources = sources
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        # 载入和下载全部结束时通知 wait_ready
+        self._idle = threading.Condition(self._lock)
+        self._indexes: Dict[str, _KindIndex] = {}
+        # 交易所与行业/类别的取值表（只追加，各类别索引共用）
+        self._labels: List[str] = []
+        self._label_ids: Dict[str, int] = {}
+        self._updated_at: Dict[str, float] = {}
+        self._refreshing: Dict[str, bool] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._loaded = False
+        self._loading = False
+        # 载入完成前请求过的类别，载入后一并检查
+        self._wanted: Set[str] = set()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    def _reload(self, kind: Optional[str] = None) -> None:
+        """从本地库重建内存索引，指定 kind 时只重建该类别（整体替换，查询无需加锁；调用方持有锁）"""
+        conn = self._connect()
+        try:
+            if kind is None:
+                rows = conn.execute(
+                    "SELECT kind, code, name, market, category, alias FROM securities ORDER BY kind, code"
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT kind, code, name, market, category, alias FROM securities WHERE kind = ? ORDER BY code",
+                    (kind,),
+                ).fetchall()
+            updated = dict(conn.execute("SELECT source, updated_at FROM sources").fetchall())
+        finally:
+            conn.close()
+        labels, label_ids = self._labels, self._label_ids
+        indexes = {} if kind is None else {k: v for k, v in self._indexes.items() if k != kind}
+        for row_kind, code, name, market, category, alias in rows:
+            index = indexes.get(row_kind)
+            if index is None:
+                index = indexes[row_kind] = _KindIndex(labels)
+            for label in (market, category):
+                if label not in label_ids:
+                    label_ids[label] = len(labels)
+                    labels.append(sys.intern(label))
+            index.positions[code] = len(index.codes)
+            index.codes.append(code)
+            index.names.append(name)
+            index.aliases.append(alias)
+            index.markets.append(label_ids[market])
+            index.categories.append(label_ids[category])
+        self._indexes, self._updated_at = indexes, updated
+        self._loaded = True
+
+    def refresh_source(self, source: str) -> int:
+        """重新下载一个列表并整体替换本地库中该列表的行，返回行数"""
+        kind, fetch = self._sources[source]
+        rows = list(fetch())
+        if not rows:
+            raise ValueError(f"{source} 列表为空")
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM securities WHERE source = ?", (source,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO securities (kind, code, source, name, market, category, alias) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(kind, code, source, name, market, category, alias)
+                     for code, name, market, category, alias in rows],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO sources (source, rows, updated_at) VALUES (?, ?, ?)",
+                    (source, len(rows), time.time()),
+                )
+        finally:
+            conn.close()
+        with self._lock:
+            self._errors.pop(source, None)
+            self._retry_at.pop(source, None)
+            # 其他类别的索引不变；尚未载入时整体载入
+            self._reload(kind if self._loaded else None)
+        return len(rows)
+
+    def _try_refresh(self, source: str) -> None:
+        try:
+            self.refresh_source(source)
+        except Exception as e:
+            with self._lock:
+                self._errors[source] = str(e)
+                self._retry_at[source] = time.time() + RETRY_SECONDS
+        finally:
+            with self._lock:
+                self._refreshing.pop(source, None)
+                self._idle.notify_all()
+
+    def _load(self) -> None:
+        try:
+            with self._lock:
+                self._reload()
+                kinds = tuple(self._wanted)
+            self._schedule(kinds)
+        except Exception as e:
+            print(f"载入证券代码表失败: {e}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._loading = False
+                self._idle.notify_all()
+
+    def _schedule(self, kinds: Iterable[str]) -> None:
+        """把缺失或过期的列表提交到后台下载"""
+        now = time.time()
+        due = []
+        with self._lock:
+            for source, spec in self._sources.items():
+                if spec.kind not in kinds or self._refreshing.get(source) or now < self._retry_at.get(source, 0):
+                    continue
+                updated_at = self._updated_at.get(source)
+                if updated_at is not None and now - updated_at < self.refresh_seconds:
+                    continue
+                self._refreshing[source] = True
+                due.append(source)
+        for source in due:
+            REVALIDATE_EXECUTOR.submit(self._try_refresh, source)
+
+    def warm_up(self, kinds: Iterable[str] = KINDS) -> None:
+        """在后台载入本地库并下载缺失或过期的列表，立即返回"""
+        kinds = tuple(kinds)
+        with self._lock:
+            if not self._loaded:
+                self._wanted.update(kinds)
+                if not self._loading:
+                    self._loading = True
+                    REVALIDATE_EXECUTOR.submit(self._load)
+                return
+        self._schedule(kinds)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待后台载入和下载结束（录制数据、测试时使用），超时返回 False"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._loading and not self._refreshing, timeout)
+
+    def _ensure(self, kind: str) -> None:
+        """查询前调用，从不阻塞：代码表未载入时启动后台构建，缺失或过期的列表在后台下载"""
+        self.warm_up((kind,))
+
+    @staticmethod
+    def _security(kind: str, index: _KindIndex, position: int) -> Security:
+        labels = index.labels
+        return Security(kind, index.codes[position], index.names[position],
+                        labels[index.markets[position]], labels[index.categories[position]],
+                        index.aliases[position])
+
+    def lookup(self, code: str, kind: str = STOCK) -> Optional[Security]:
+        """按代码查询证券，未收录时返回 None"""
+        self._ensure(kind)
+        index = self._indexes.get(kind)
+        position = index.positions.get(str(code).strip()) if index is not None else None
+        if position is None:
+            return None
+        return self._security(kind, index, position)
+
+    def search(self, query: str, kind: str = FUND, limit: int = 10) -> List[Security]:
+        """按代码前缀、名称或简拼前缀、名称包含关系、模糊匹配的顺序搜索，最多返回 limit 条"""
+        self._ensure(kind)
+        index = self._indexes.get(kind)
+        query = str(query).strip().upper()
+        if index is None or not query or limit <= 0:
+            return []
+        search = index.search
+        if search is None:
+            search = index.search = _SearchIndex(index)
+        candidates = itertools.chain(
+            _code_prefixed(index.codes, query),
+            search.prefixed(query),
+            (position for position, name in enumerate(search.upper_names) if query in name),
+            search.close_matches(query, limit),
+        )
+        matches: Dict[int, None] = {}
+        for position in candidates:
+            matches.setdefault(position)
+            if len(matches) >= limit:
+                break
+        return [self._security(kind, index, position) for position in matches]
+
+    def name_of(self, code: str, kind: str = STOCK) -> Optional[str]:
+        security = self.lookup(code, kind)
+        return security.name if security is not None else None
+
+    def market_of(self, code: str) -> str:
+        """A股所属交易所（sh/sz/bj），代码表中没有时按代码前缀判断"""
+        security = self.lookup(code, STOCK)
+        if security is not None and security.market:
+            return security.market
+        return prefix_market(str(code).strip())
+
+    def industry_of(self, code: str) -> Optional[str]:
+        """A股所属行业（上交所列表不含行业时为 None）"""
+        security = self.lookup(code, STOCK)
+        return (security.category or None) if security is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        """各类证券数量、各列表最近更新时间与失败原因"""
+        with self._lock:
+            return {
+                "counts": {kind: len(index.codes) for kind, index in self._indexes.items()},
+                "updated_at": dict(self._updated_at),
+                "errors": dict(self._errors),
+            }
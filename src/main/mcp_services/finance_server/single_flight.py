@@ -0,0 +1,123 @@
+"""Single-flight coalescing of identical concurrent calls.
+
+同一个键（akshare 函数 + 规范化后的参数）同时只有一个线程真正请求上游，
+其余线程等待同一个 Future 并共享其结果或异常。
+``AsyncSingleFlight`` 是事件循环中的对应实现，用于合并同时进行的相同工具调用（如同一批量请求中的重复项）。
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .cancellation import CallCancelled
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._leaders = 0
+        self._followers = 0
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, bool]:
+        """执行或等待键对应的调用，返回 (结果, 是否为共享结果)"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self._leaders += 1
+            else:
+                self._followers += 1
+
+        if not leader:
+            try:
+                return future.result(), True
+            except CallCancelled:
+                # 发起请求的调用被取消，不影响等待者：由等待者重新发起
+                return self.do(key, func, *args, **kwargs)
+
+        try:
+            value = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        """返回实际发起的请求数与被合并的请求数"""
+        with self._lock:
+            return {
+                "upstream_calls": self._leaders,
+                "coalesced_calls": self._followers,
+                "in_flight": len(self._calls),
+            }
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """Coalesce identical concurrent coroutines; the shared task runs until its last waiter leaves."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Flight] = {}
+        self._leaders = 0
+        self._followers = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """执行或等待键对应的协程，返回 (结果, 是否为共享结果)"""
+        flight = self._calls.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._leaders += 1
+        else:
+            self._followers += 1
+        flight.waiters += 1
+        try:
+            # shield：某个调用方被取消时不影响其他仍在等待的调用方
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self._leaders,
+            "coalesced_calls": self._followers,
+            "in_flight": len(self._calls),
+        }
+
+
+# 进程内共享的上游请求合并器
+UPSTREAM_FLIGHTS = SingleFlight()
@@ -0,0 +1,118 @@
+"""Market-wide snapshot tables indexed by security code.
+
+龙虎榜、机构持股、分析师排行等接口每次返回全市场数据。这里每个刷新窗口只下载一次，
+并建立 代码 -> 行号 的哈希索引，单只股票查询为 O(1)，多只股票可共用同一次下载。
+"""
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import TTL, resolve_ttl, stale_age
+
+# 各接口中可能出现的股票代码列名
+DEFAULT_CODE_COLUMNS = ("代码", "股票代码", "symbol")
+
+# 上游不可用、拿到的是过期缓存时，多久后重新尝试（秒）
+STALE_REFRESH_SECONDS = 60
+
+
+class SnapshotTable:
+    """One market-wide table plus a code -> row positions index."""
+
+    def __init__(self, name: str, fetch: Callable[[], pd.DataFrame],
+                 refresh_seconds: Optional[TTL] = None,
+                 code_columns: Sequence[str] = DEFAULT_CODE_COLUMNS):
+        self.name = name
+        self._fetch = fetch
+        self._refresh_seconds = refresh_seconds
+        self._code_columns = code_columns
+        self._lock = threading.Lock()
+        self._frame: Optional[pd.DataFrame] = None
+        self._index: Dict[str, np.ndarray] = {}
+        self._expires_at = 0.0
+        self.fetched_at = 0.0
+        self.downloads = 0
+
+    def _refresh_window(self) -> float:
+        if self._refresh_seconds is None:
+            return resolve_ttl(self.name)
+        ttl = self._refresh_seconds
+        return float(ttl() if callable(ttl) else ttl)
+
+    def _ensure_fresh(self) -> pd.DataFrame:
+        with self._lock:
+            if self._frame is None or time.time() >= self._expires_at:
+                frame = self._fetch()
+                if frame is None:
+                    frame = pd.DataFrame()
+                self._frame = frame.reset_index(drop=True)
+                self._index = self._build_index(self._frame)
+                self.fetched_at = time.time()
+                window = STALE_REFRESH_SECONDS if stale_age(frame) is not None else self._refresh_window()
+                self._expires_at = self.fetched_at + window
+                self.downloads += 1
+            return self._frame
+
+    def _build_index(self, frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+        for column in self._code_columns:
+            if column in frame.columns:
+                return frame.groupby(frame[column].astype(str), sort=False).indices
+        return {}
+
+    def frame(self) -> pd.DataFrame:
+        """完整的全市场表"""
+        return self._ensure_fresh()
+
+    def rows(self, code: str) -> pd.DataFrame:
+        """指定代码的所有行（无数据时返回空表）"""
+        frame = self._ensure_fresh()
+        positions = self._index.get(code)
+        if positions is None:
+            return frame.iloc[0:0]
+        return frame.iloc[positions]
+
+    def rows_many(self, codes: Iterable[str]) -> Dict[str, pd.DataFrame]:
+        """一次下载回答多只股票"""
+        frame = self._ensure_fresh()
+        empty = frame.iloc[0:0]
+        return {
+            code: frame.iloc[self._index[code]] if code in self._index else empty
+            for code in codes
+        }
+
+
+class SnapshotManager:
+    """Registry of snapshot tables shared by all tools."""
+
+    def __init__(self):
+        self._tables: Dict[str, SnapshotTable] = {}
+
+    def register(self, name: str, fetch: Callable[[], pd.DataFrame],
+                 refresh_seconds: Optional[TTL] = None,
+                 code_columns: Sequence[str] = DEFAULT_CODE_COLUMNS) -> SnapshotTable:
+        """注册全市场表；refresh_seconds 为空时沿用缓存策略中的有效期"""
+        table = SnapshotTable(name, fetch, refresh_seconds, code_columns)
+        self._tables[name] = table
+        return table
+
+    def table(self, name: str) -> SnapshotTable:
+        return self._tables[name]
+
+    def frame(self, name: str) -> pd.DataFrame:
+        return self._tables[name].frame()
+
+    def rows(self, name: str, code: str) -> pd.DataFrame:
+        return self._tables[name].rows(code)
+
+    def rows_many(self, name: str, codes: Iterable[str]) -> Dict[str, pd.DataFrame]:
+        return self._tables[name].rows_many(codes)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各表的下载次数与最近刷新时间"""
+        return {
+            name: {"downloads": table.downloads, "fetched_at": table.fetched_at}
+            for name, table in self._tables.items()
+        }
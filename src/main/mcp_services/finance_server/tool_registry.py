@@ -0,0 +1,171 @@
+"""Table-driven registry of MCP tools.
+
+每个工具在 ``ToolSpec`` 中声明处理函数、参数 schema、结果缓存有效期、开销类别和超时时间，
+服务器按名称 O(1) 查找工具，并根据这些元数据决定在哪里执行、是否缓存结果。
+数据工具的 schema 还带有 ``format`` 参数（见 ``output_format``），该参数由服务器处理，不传给处理函数。
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from .data_cache import STALE_NOTICE_PREFIX, TTL
+from .output_format import FORMAT_PROPERTY, FORMATS, TEXT, render_text
+
+# 开销类别
+CHEAP = "cheap"                   # 不访问上游的轻量计算，无默认超时（同样在工作线程中执行）
+NETWORK = "network"               # 阻塞的网络请求，在有界线程池中执行
+HEAVY_COMPUTE = "heavy-compute"   # CPU 密集的计算，使用独立的并发上限
+
+COST_CLASSES = (CHEAP, NETWORK, HEAVY_COMPUTE)
+
+# 各开销类别的默认超时（秒），None 表示不限制
+DEFAULT_TIMEOUTS: Dict[str, Optional[float]] = {
+    CHEAP: None,
+    NETWORK: 60,
+    HEAVY_COMPUTE: 120,
+}
+
+
+class ToolSpec:
+    """Declarative description of one MCP tool."""
+
+    def __init__(self, name: str, description: str, handler: Callable[..., Any],
+                 properties: Optional[Dict[str, Dict[str, Any]]] = None,
+                 required: Sequence[str] = (), defaults: Optional[Dict[str, Any]] = None,
+                 cost: str = NETWORK, cache_ttl: TTL = 0, timeout: Optional[float] = None,
+                 uses_data_modules: bool = True, upstream: Optional[str] = None,
+                 output_formats: Optional[bool] = None):
+        if cost not in COST_CLASSES:
+            raise ValueError(f"Unknown cost class: {cost}")
+        self.name = name
+        self.description = description
+        self.handler = handler
+        self.properties = properties or {}
+        self.required = list(required)
+        self.defaults = defaults or {}
+        self.cost = cost
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout if timeout is not None else DEFAULT_TIMEOUTS[cost]
+        # 处理函数是否依赖延迟导入的数据模块（akshare、pandas 等）
+        self.uses_data_modules = uses_data_modules
+        # 主要访问的上游站点，调度前先在事件循环中等待该站点的令牌桶
+        self.upstream = upstream
+        # 是否接受 format 参数（默认所有数据工具都接受）
+        self.output_formats = uses_data_modules if output_formats is None else output_formats
+
+    def schema(self) -> Dict[str, Any]:
+        """返回 tools/list 中使用的 MCP 工具描述"""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "inputSchema": {
+                "type": "object",
+                "properties": self.properties if not self.output_formats else {
+                    **self.properties, "format": FORMAT_PROPERTY,
+                },
+                "required": self.required,
+            },
+        }
+
+    def bind(self, arguments: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """校验必填参数，返回传给处理函数的关键字参数（忽略未声明的参数）"""
+        arguments = arguments or {}
+        for name in self.required:
+            if name not in arguments:
+                raise ValueError(f"Missing '{name}' argument")
+        kwargs = dict(self.defaults)
+        kwargs.update((name, arguments[name]) for name in self.properties if name in arguments)
+        return kwargs
+
+    def output_format(self, arguments: Optional[Dict[str, Any]]) -> str:
+        """客户端请求的输出格式，不支持多种格式的工具始终为 text"""
+        fmt = (arguments or {}).get("format") or TEXT
+        if not self.output_formats:
+            return TEXT
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}', expected one of: {', '.join(FORMATS)}")
+        return fmt
+
+    def ttl(self) -> float:
+        """结果缓存的有效期（秒），0 表示不缓存"""
+        ttl = self.cache_ttl
+        return float(ttl() if callable(ttl) else ttl)
+
+    def __repr__(self) -> str:
+        return f"<ToolSpec {self.name} cost={self.cost}>"
+
+
+class ToolRegistry:
+    """Name-indexed collection of ``ToolSpec`` objects."""
+
+    def __init__(self, specs: Iterable[ToolSpec] = ()):
+        self._specs: Dict[str, ToolSpec] = {}
+        self._schemas: Optional[List[Dict[str, Any]]] = None
+        for spec in specs:
+            self.register(spec)
+
+    def register(self, spec: ToolSpec) -> ToolSpec:
+        """注册工具，名称重复时报错"""
+        if spec.name in self._specs:
+            raise ValueError(f"Tool already registered: {spec.name}")
+        self._specs[spec.name] = spec
+        self._schemas = None
+        return spec
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._specs.get(name)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """按注册顺序返回所有工具的 schema（结果会被缓存）"""
+        if self._schemas is None:
+            self._schemas = [spec.schema() for spec in self._specs.values()]
+        return self._schemas
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def __iter__(self):
+        return iter(self._specs.values())
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+
+def to_content(result: Any, fmt: str = TEXT) -> List[Dict[str, str]]:
+    """把处理函数的返回值（DataResult / TextContent 列表、字典或字符串）按输出格式转换为 MCP content 列表"""
+    if result is None:
+        return []
+    if isinstance(result, str) or not isinstance(result, (list, tuple)):
+        result = [result]
+    content = []
+    for item in result:
+        if hasattr(item, "render"):
+            text = item.render(fmt)
+        elif hasattr(item, "text"):
+            text = render_text(item.text, fmt)
+        elif isinstance(item, dict) and "text" in item:
+            text = render_text(item["text"], fmt)
+        else:
+            text = render_text(str(item), fmt)
+        content.append({"type": "text", "text": text})
+    return content
+
+
+def is_error_result(result: Any) -> bool:
+    """处理函数的返回值是否表示出错：空结果，或含有 ``ErrorText``（数据工具出错时返回它而不是抛出异常）"""
+    if result is None:
+        return True
+    if isinstance(result, str) or not isinstance(result, (list, tuple)):
+        result = [result]
+    return not result or any(getattr(item, "is_error", False) for item in result)
+
+
+def to_result(result: Any, fmt: str = TEXT) -> Dict[str, Any]:
+    """把处理函数的返回值转换为 tools/call 的 result：content 列表，出错时带 ``isError``"""
+    call_result: Dict[str, Any] = {"content": to_content(result, fmt)}
+    if is_error_result(result):
+        call_result["isError"] = True
+    return call_result
+
+
+def is_cacheable_result(result: Dict[str, Any]) -> bool:
+    """出错结果和上游不可用时返回的过期数据都不写入结果缓存"""
+    return not result.get("isError") and not any(STALE_NOTICE_PREFIX in item["text"] for item in result["content"])
@@ -0,0 +1,135 @@
+"""Upstream data sources behind each akshare function.
+
+把 akshare 函数和直接 HTTP 请求归类到上游站点（东方财富、新浪、百度、同花顺），
+用于按站点限制并发与请求速率。
+"""
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlparse
+
+from . import config
+
+# akshare 函数 -> 上游站点
+FUNCTION_HOSTS: Dict[str, str] = {
+    "stock_zh_a_hist": "eastmoney",
+    "stock_zh_a_spot_em": "eastmoney",
+    "stock_individual_fund_flow": "eastmoney",
+    "stock_individual_info_em": "eastmoney",
+    "stock_analyst_rank_em": "eastmoney",
+    "stock_lhb_detail_em": "eastmoney",
+    "stock_hot_rank_em": "eastmoney",
+    "stock_news_em": "eastmoney",
+    "stock_hsgt_hist_em": "eastmoney",
+    "fund_open_fund_info_em": "eastmoney",
+    "fund_name_em": "eastmoney",
+    "macro_china_gdp": "eastmoney",
+    "macro_china_cpi": "eastmoney",
+    "macro_china_pmi": "eastmoney",
+    "stock_financial_abstract": "sina",
+    "stock_institute_hold": "sina",
+    "stock_zh_index_spot": "sina",
+    "futures_zh_spot": "sina",
+    "futures_display_main_sina": "sina",
+    "stock_info_sh_name_code": "sse",
+    "stock_info_sz_name_code": "szse",
+    "stock_info_bj_name_code": "bse",
+    "stock_zh_valuation_baidu": "baidu",
+    "stock_shareholder_change_ths": "10jqka",
+}
+
+# 域名后缀 -> 上游站点
+DOMAIN_HOSTS: Dict[str, str] = {
+    "eastmoney.com": "eastmoney",
+    "sina.com.cn": "sina",
+    "sinajs.cn": "sina",
+    "baidu.com": "baidu",
+    "10jqka.com.cn": "10jqka",
+    "sse.com.cn": "sse",
+    "szse.cn": "szse",
+    "bse.cn": "bse",
+}
+
+DEFAULT_HOST = "other"
+
+
+def host_for_function(name: str) -> str:
+    """akshare 函数对应的上游站点"""
+    return FUNCTION_HOSTS.get(name, DEFAULT_HOST)
+
+
+def host_for_url(url: str) -> str:
+    """URL 对应的上游站点"""
+    hostname = urlparse(url).hostname or ""
+    for suffix, host in DOMAIN_HOSTS.items():
+        if hostname == suffix or hostname.endswith("." + suffix):
+            return host
+    return DEFAULT_HOST
+
+
+class AdjustableSemaphore:
+    """Semaphore whose limit can be changed while permits are held."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def set_limit(self, limit: int) -> None:
+        """调整上限；调低时已占用的名额不受影响，释放后才生效"""
+        with self._condition:
+            self.limit = max(1, limit)
+            self._condition.notify_all()
+
+
+class HostConcurrencyLimiter:
+    """Caps the number of in-flight upstream requests per host."""
+
+    def __init__(self, default_limit: int, limits: Optional[Dict[str, int]] = None):
+        self.default_limit = default_limit
+        self.limits = dict(limits or {})
+        self._semaphores: Dict[str, AdjustableSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def configured_limit(self, host: str) -> int:
+        """配置的并发上限（自适应调整不会超过该值）"""
+        return self.limits.get(host, self.default_limit)
+
+    def _semaphore(self, host: str) -> AdjustableSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = AdjustableSemaphore(self.configured_limit(host))
+                self._semaphores[host] = semaphore
+            return semaphore
+
+    def current_limit(self, host: str) -> int:
+        return self._semaphore(host).limit
+
+    def set_limit(self, host: str, limit: int) -> None:
+        self._semaphore(host).set_limit(limit)
+
+    @contextmanager
+    def slot(self, host: str) -> Iterator[None]:
+        """占用一个上游站点的并发名额"""
+        semaphore = self._semaphore(host)
+        semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+# 进程内共享的按站点并发限制
+HOST_LIMITS = HostConcurrencyLimiter(config.HOST_CONCURRENCY_DEFAULT, config.HOST_CONCURRENCY)
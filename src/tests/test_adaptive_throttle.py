@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试自适应限流：限流信号降速、连续成功后恢复
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.adaptive_throttle import (
+    CAPTCHA, TIMEOUT, TOO_MANY_REQUESTS, AdaptiveThrottle, throttle_reason
+)
+from src.main.mcp_services.finance_server.rate_limiter import HostRateLimiter
+from src.main.mcp_services.finance_server.upstream import HostConcurrencyLimiter
+
+
+class FakeResponse:
+    status_code = 429
+
+
+class FakeHTTPError(Exception):
+    response = FakeResponse()
+
+
+class ReadTimeout(OSError):
+    pass
+
+
+def _throttle(**kwargs):
+    rates = HostRateLimiter(default_rate=5, rates={"10jqka": 1})
+    limits = HostConcurrencyLimiter(default_limit=4)
+    return AdaptiveThrottle(rates, limits, cooldown=0, **kwargs), rates, limits
+
+
+def test_throttle_reason():
+    """识别 429 与各类超时异常"""
+    assert throttle_reason(FakeHTTPError()) == TOO_MANY_REQUESTS
+    assert throttle_reason(ReadTimeout()) == TIMEOUT
+    assert throttle_reason(TimeoutError()) == TIMEOUT
+    assert throttle_reason(ValueError("bad symbol")) is None
+
+
+def test_decrease_then_recover():
+    """乘性减、加性增，且不超过配置值"""
+    throttle, rates, limits = _throttle(increase_after=2, increase_step=0.5)
+    throttle.record_throttled("eastmoney", CAPTCHA)
+
+    assert rates.bucket("eastmoney").rate == 2.5
+    assert limits.current_limit("eastmoney") == 2
+
+    for _ in range(10):
+        throttle.record_success("eastmoney")
+
+    stats = throttle.stats()["eastmoney"]
+    assert stats["rate"] == 5 and stats["max_rate"] == 5
+    assert stats["concurrency"] == 4
+    assert stats["throttled"] == {CAPTCHA: 1}
+
+
+def test_rate_has_floor_and_cooldown():
+    """连续限流最多降到下限；冷却期内同一波限流只降一次"""
+    throttle, rates, limits = _throttle(min_fraction=0.2)
+    for _ in range(10):
+        throttle.record_throttled("10jqka", TIMEOUT)
+    assert rates.bucket("10jqka").rate == pytest.approx(0.2)
+    assert limits.current_limit("10jqka") == 1
+
+    throttle.cooldown = 60
+    throttle.record_throttled("eastmoney", TIMEOUT)
+    throttle.record_throttled("eastmoney", TIMEOUT)
+    assert rates.bucket("eastmoney").rate == 2.5
+
+
+def test_track_only_counts_throttle_errors():
+    """普通异常既不降速也不计入成功"""
+    throttle, rates, _ = _throttle()
+    with pytest.raises(ValueError):
+        with throttle.track("sina"):
+            raise ValueError("bad symbol")
+    with pytest.raises(FakeHTTPError):
+        with throttle.track("sina"):
+            raise FakeHTTPError()
+    with throttle.track("sina"):
+        pass
+
+    stats = throttle.stats()["sina"]
+    assert stats["successes"] == 1
+    assert stats["throttled"] == {TOO_MANY_REQUESTS: 1}
+    assert rates.bucket("sina").rate == 2.5
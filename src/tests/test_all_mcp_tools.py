@@ -2,18 +2,29 @@
 """
 全面测试MCP金融工具的有效性
 使用山东矿机（002526）作为测试股票
+
+离线运行：先用 --fixture-mode record 联网录制一次上游响应，
+之后用 --fixture-mode replay 回放（不访问网络，可用 --fixture-latency 注入延迟）
 """
 
+import argparse
 import json
 import time
 import sys
 import subprocess
 import os
-from typing import Dict, List, Any
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+# 项目根目录
+project_root = Path(__file__).resolve().parent.parent.parent
+
+SERVER_MODULE = "src.main.mcp_services.finance_server.finance_server"
 
 class MCPTester:
-    def __init__(self, test_symbol="002526"):
+    def __init__(self, test_symbol="002526", server_args: Optional[List[str]] = None):
         self.test_symbol = test_symbol
+        self.server_args = server_args or []
         self.server_process = None
         self.results = {}
         
@@ -23,7 +34,8 @@ class MCPTester:
         try:
             # 启动MCP服务器进程
             self.server_process = subprocess.Popen(
-                [sys.executable, "mcp_services/finance_server/finance_server.py"],
+                [sys.executable, "-m", SERVER_MODULE, *self.server_args],
+                cwd=project_root,
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
@@ -254,7 +266,20 @@ class MCPTester:
 
 def main():
     """主函数"""
-    tester = MCPTester(test_symbol="002526")  # 山东矿机
+    parser = argparse.ArgumentParser(description="MCP金融工具全面测试")
+    parser.add_argument("--fixture-mode", choices=["off", "record", "replay"], default=None,
+                        help="record 录制上游响应，replay 离线回放")
+    parser.add_argument("--fixture-dir", default=None, help="夹具目录")
+    parser.add_argument("--fixture-latency", type=float, default=None, help="回放时注入的延迟（秒）")
+    args = parser.parse_args()
+    
+    server_args = []
+    for option in ("fixture_mode", "fixture_dir", "fixture_latency"):
+        value = getattr(args, option)
+        if value is not None:
+            server_args += ["--" + option.replace("_", "-"), str(value)]
+    
+    tester = MCPTester(test_symbol="002526", server_args=server_args)  # 山东矿机
     tester.test_all_tools()
 
 if __name__ == "__main__":
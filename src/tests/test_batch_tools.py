@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+测试批量股票工具：共享快照、并行回退与按站点并发限制
+"""
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server import finance_tools, rate_limiter
+from src.main.mcp_services.finance_server.finance_tools import FinanceDataService, normalize_symbols
+from src.main.mcp_services.finance_server.security_master import STOCK, SecurityMaster, Source
+from src.main.mcp_services.finance_server.snapshot_tables import SnapshotManager
+from src.main.mcp_services.finance_server.upstream import HostConcurrencyLimiter
+
+
+def _daily(symbol, close):
+    return pd.DataFrame({
+        "日期": ["2025-01-02", "2025-01-03"],
+        "开盘": [close, close], "收盘": [close, close], "最高": [close, close], "最低": [close, close],
+        "成交量": [100.0, 200.0], "成交额": [1000.0, 2000.0],
+        "涨跌幅": [0.0, 1.0], "涨跌额": [0.0, 0.1],
+    })
+
+
+class FakeHistoryStore:
+    def __init__(self):
+        self.symbols = []
+
+    def get_history(self, symbol, period="daily", adjust=""):
+        self.symbols.append(symbol)
+        return _daily(symbol, 10.0)
+
+
+def test_normalize_symbols_accepts_comma_string():
+    """支持逗号分隔的字符串并去重"""
+    assert normalize_symbols("000001, 600519，000001") == ["000001", "600519"]
+
+
+def test_spot_batch_uses_snapshot_and_falls_back_to_history(monkeypatch, tmp_path):
+    """快照中有的股票直接返回，缺失的并行回退到日线，名称取自本地代码表"""
+    snapshots = SnapshotManager()
+    snapshots.register("stock_zh_a_spot_em", lambda: pd.DataFrame({
+        "代码": ["000001"], "名称": ["平安银行"], "最新价": [11.5], "涨跌幅": [1.2],
+    }), refresh_seconds=60)
+    history = FakeHistoryStore()
+    monkeypatch.setattr(finance_tools, "SNAPSHOTS", snapshots)
+    monkeypatch.setattr(finance_tools, "HISTORY_STORE", history)
+    master = SecurityMaster(tmp_path / "securities.db", {
+        "sh": Source(STOCK, lambda: [("600519", "贵州茅台", "sh", "", "")]),
+    })
+    master.warm_up()
+    assert master.wait_ready(timeout=5)
+    monkeypatch.setattr(finance_tools, "SECURITY_MASTER", master)
+
+    text = FinanceDataService.get_stock_spot_batch(["000001", "600519"])[0].text
+
+    assert "平安银行" in text and "600519" in text and "贵州茅台" in text
+    assert history.symbols == ["600519"]
+
+
+def test_history_batch_combines_symbols(monkeypatch):
+    """多只股票的历史数据合并为一张表"""
+    monkeypatch.setattr(finance_tools, "HISTORY_STORE", FakeHistoryStore())
+
+    result = FinanceDataService.get_stock_history_batch(["000001", "600519"], limit=1)[0]
+    text = result.text
+
+    assert "共 2 条" in text
+    assert "000001" in text and "600519" in text
+    columnar = json.loads(result.render("columnar"))
+    assert columnar["columns"][:2] == ["代码", "日期"]
+    assert columnar["data"][0] == ["000001", "600519"]
+
+
+def test_history_batch_clamps_limit(monkeypatch):
+    """limit 为零或负数时每只股票至少返回最近一根K线，而不是截掉开头的K线"""
+    monkeypatch.setattr(finance_tools, "HISTORY_STORE", FakeHistoryStore())
+
+    for limit in (0, -1):
+        result = FinanceDataService.get_stock_history_batch(["000001", "600519"], limit=limit)[0]
+        records = json.loads(result.render("json"))["records"]
+        assert [record["日期"] for record in records] == ["2025-01-03", "2025-01-03"]
+
+
+def test_host_limiter_caps_concurrency():
+    """同一站点的并发请求数不超过上限"""
+    limiter = HostConcurrencyLimiter(default_limit=2)
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fetch():
+        with limiter.slot("eastmoney"):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.05)
+            with lock:
+                active["now"] -= 1
+
+    threads = [threading.Thread(target=fetch) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert active["peak"] == 2
+
+
+class FailingHistoryStore:
+    """按调用顺序抛出给定异常，之后返回正常数据"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def get_history(self, symbol, period="daily", adjust=""):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return _daily(symbol, 10.0)
+
+
+def test_history_retry_backs_off_only_the_failing_call(monkeypatch):
+    """上游故障只推迟本次调用的重试，不影响同一站点的其他请求；输入错误不重试"""
+    limiter = rate_limiter.HostRateLimiter(default_rate=5)
+    monkeypatch.setattr(finance_tools, "RATE_LIMITS", limiter)
+    monkeypatch.setattr(finance_tools, "HISTORY_RETRY_DELAY", 0.05)
+
+    flaky = FailingHistoryStore(ConnectionError("reset"))
+    monkeypatch.setattr(finance_tools, "HISTORY_STORE", flaky)
+    text = FinanceDataService.get_stock_history("000001")[0].text
+    assert "历史数据" in text and flaky.calls == 2
+
+    missing = FailingHistoryStore(KeyError("999999"))
+    monkeypatch.setattr(finance_tools, "HISTORY_STORE", missing)
+    text = FinanceDataService.get_stock_history("999999")[0].text
+    assert "获取历史数据失败" in text and missing.calls == 1
+
+    assert limiter.bucket("eastmoney").delay() == 0
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+测试多进程共享缓存守护进程：一个进程写入的结果另一个进程直接命中
+"""
+
+import os
+import stat
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.cache_daemon import CacheDaemonServer, SharedCacheClient
+from src.main.mcp_services.finance_server.data_cache import CachedAkshare, TieredCache
+
+
+class CountingAkshare:
+    """记录上游调用次数的假 akshare 模块"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def stock_zh_a_hist(self, symbol, period="daily"):
+        self.calls += 1
+        return pd.DataFrame({"日期": ["2025-01-02"], "收盘": [10.0], "股票代码": [symbol]})
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """在后台线程中运行守护进程"""
+    socket_path = tmp_path / "cache.sock"
+    server = CacheDaemonServer(socket_path, max_bytes=1024 * 1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+def _process(socket_path, module):
+    """模拟一个服务器进程：独立的内存层与共享缓存客户端"""
+    cache = TieredCache(max_memory_bytes=1024 * 1024, shared=SharedCacheClient(socket_path))
+    return CachedAkshare(module, cache, enabled=True), cache
+
+
+def test_second_process_hits_shared_cache(daemon):
+    """第二个进程请求相同数据时从守护进程取回，不访问上游"""
+    first_upstream, second_upstream = CountingAkshare(), CountingAkshare()
+    first, _ = _process(daemon, first_upstream)
+    second, second_cache = _process(daemon, second_upstream)
+
+    expected = first.stock_zh_a_hist(symbol="000001")
+    started = time.perf_counter()
+    shared = second.stock_zh_a_hist(symbol="000001")
+    elapsed = time.perf_counter() - started
+
+    pd.testing.assert_frame_equal(shared, expected)
+    assert first_upstream.calls == 1 and second_upstream.calls == 0
+    assert elapsed < 0.1
+    stats = second_cache.stats()
+    assert stats["shared_hits"] == 1
+    assert stats["shared"]["available"] and stats["shared"]["daemon"]["entries"] == 1
+    # socket 创建时即只有属主可访问
+    assert stat.S_IMODE(os.stat(daemon).st_mode) & 0o077 == 0
+
+
+def test_unavailable_daemon_is_a_miss(tmp_path):
+    """守护进程未运行时按未命中处理，照常访问上游"""
+    upstream = CountingAkshare()
+    proxy, cache = _process(tmp_path / "missing.sock", upstream)
+
+    proxy.stock_zh_a_hist(symbol="000001")
+
+    assert upstream.calls == 1
+    stats = cache.stats()["shared"]
+    assert stats["available"] is False and stats["hits"] == 0
+
+
+def test_socket_of_another_user_is_not_trusted(daemon, monkeypatch):
+    """socket 属于其他用户时不连接，取回的字节不会被反序列化"""
+    writer, _ = _process(daemon, CountingAkshare())
+    writer.stock_zh_a_hist(symbol="000001")
+
+    upstream = CountingAkshare()
+    reader, cache = _process(daemon, upstream)
+    uid = os.stat(daemon).st_uid
+    monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+    reader.stock_zh_a_hist(symbol="000001")
+
+    assert upstream.calls == 1
+    stats = cache.stats()
+    assert stats["shared_hits"] == 0 and stats["shared"]["available"] is False
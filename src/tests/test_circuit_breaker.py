@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+测试按函数熔断：快速失败、返回带缓存时间标记的过期数据、后台探测恢复
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError, is_upstream_failure
+)
+from src.main.mcp_services.finance_server.data_cache import (
+    STALE_NOTICE_PREFIX, CachedAkshare, TieredCache, stale_age, stale_notice
+)
+
+
+class FlakyAkshare:
+    """可切换为故障状态的假 akshare 模块"""
+
+    def __init__(self):
+        self.calls = 0
+        self.broken = False
+
+    def stock_lhb_detail_em(self):
+        self.calls += 1
+        if self.broken:
+            raise ConnectionError("upstream down")
+        return pd.DataFrame({"代码": ["000001"], "名称": ["平安银行"]})
+
+
+class CompanyAkshare:
+    """按代码返回公司信息的假 akshare 模块：未知代码抛出 KeyError，故障时抛出连接错误"""
+
+    def __init__(self):
+        self.calls = []
+        self.broken = False
+
+    def stock_individual_info_em(self, symbol):
+        self.calls.append(symbol)
+        if self.broken:
+            raise ConnectionError("upstream down")
+        if symbol == "bad":
+            raise KeyError("data")
+        return pd.DataFrame({"item": ["股票代码"], "value": [symbol]})
+
+
+def _proxy(fake, tmp_path, reset_timeout=60.0):
+    cache = TieredCache(max_memory_bytes=1024 * 1024, disk_dir=tmp_path)
+    breakers = CircuitBreakerRegistry(failure_threshold=2, reset_timeout=reset_timeout)
+    policies = {"stock_lhb_detail_em": 0.05, "stock_individual_info_em": 0}
+    return CachedAkshare(fake, cache, policies=policies, enabled=True, breakers=breakers), breakers
+
+
+def test_open_breaker_serves_stale_without_calling_upstream(tmp_path):
+    """熔断后不再请求上游，直接返回标记了缓存时间的过期数据"""
+    fake = FlakyAkshare()
+    ak, breakers = _proxy(fake, tmp_path)
+    fresh = ak.stock_lhb_detail_em()
+    assert stale_age(fresh) is None and stale_notice(fresh) == ""
+
+    time.sleep(0.1)
+    fake.broken = True
+    for _ in range(2):
+        stale = ak.stock_lhb_detail_em()
+        assert stale.iloc[0]["代码"] == "000001"
+    assert breakers.get("stock_lhb_detail_em").state == OPEN
+
+    calls = fake.calls
+    started = time.perf_counter()
+    stale = ak.stock_lhb_detail_em()
+    assert time.perf_counter() - started < 0.05
+    assert fake.calls == calls
+    assert stale_age(stale) >= 0.1
+    assert STALE_NOTICE_PREFIX in stale_notice(stale)
+    assert breakers.stats()["stock_lhb_detail_em"]["short_circuited"] == 1
+
+
+def test_open_breaker_without_cache_fails_fast(tmp_path):
+    """没有可用缓存时抛出熔断异常"""
+    fake = FlakyAkshare()
+    fake.broken = True
+    ak, _ = _proxy(fake, tmp_path)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            ak.stock_lhb_detail_em()
+    with pytest.raises(CircuitOpenError):
+        ak.stock_lhb_detail_em()
+    assert fake.calls == 2
+
+
+def test_background_probe_closes_breaker(tmp_path):
+    """后台探测成功后恢复，探测结果写入缓存"""
+    fake = FlakyAkshare()
+    fake.broken = True
+    ak, breakers = _proxy(fake, tmp_path, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            ak.stock_lhb_detail_em()
+    breaker = breakers.get("stock_lhb_detail_em")
+    assert breaker.state == OPEN
+
+    fake.broken = False
+    deadline = time.time() + 2
+    while breaker.state != CLOSED and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()["probes"] >= 1
+    assert stale_age(ak.stock_lhb_detail_em()) is None
+
+
+def test_bad_input_does_not_open_breaker(tmp_path):
+    """参数错误引起的异常不计入熔断，其他代码照常请求上游"""
+    fake = CompanyAkshare()
+    ak, breakers = _proxy(fake, tmp_path)
+    for _ in range(3):
+        with pytest.raises(KeyError):
+            ak.stock_individual_info_em(symbol="bad")
+
+    assert breakers.get("stock_individual_info_em").state == CLOSED
+    assert ak.stock_individual_info_em(symbol="000001").iloc[0]["value"] == "000001"
+    assert not is_upstream_failure(KeyError("data")) and not is_upstream_failure(ValueError("bad symbol"))
+    assert is_upstream_failure(ConnectionError()) and is_upstream_failure(TimeoutError())
+
+
+def test_probe_uses_last_successful_arguments(tmp_path):
+    """熔断后用最近一次成功的参数探测，上游恢复后熔断关闭"""
+    fake = CompanyAkshare()
+    ak, breakers = _proxy(fake, tmp_path, reset_timeout=0.05)
+    ak.stock_individual_info_em(symbol="000001")
+    fake.broken = True
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            ak.stock_individual_info_em(symbol="600519")
+    breaker = breakers.get("stock_individual_info_em")
+    assert breaker.state == OPEN
+
+    fake.broken = False
+    deadline = time.time() + 2
+    while breaker.state != CLOSED and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert breaker.state == CLOSED
+    assert fake.calls[3:] == ["000001"]
+
+
+class SlowFailingAkshare:
+    """请求耗时一段时间后失败，让并发调用合并到同一次请求上"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def stock_lhb_detail_em(self):
+        self.calls += 1
+        time.sleep(0.3)
+        raise ConnectionError("upstream timeout")
+
+
+def test_coalesced_failure_counts_once(tmp_path):
+    """多个合并等待的调用共享一次失败的请求，熔断器只计一次失败"""
+    fake = SlowFailingAkshare()
+    cache = TieredCache(max_memory_bytes=1024 * 1024, disk_dir=tmp_path)
+    breakers = CircuitBreakerRegistry(failure_threshold=5, reset_timeout=60.0)
+    ak = CachedAkshare(fake, cache, policies={"stock_lhb_detail_em": 60}, enabled=True, breakers=breakers)
+    errors = []
+
+    def call():
+        try:
+            ak.stock_lhb_detail_em()
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake.calls == 1 and len(errors) == 5
+    stats = breakers.stats()["stock_lhb_detail_em"]
+    assert stats["failures"] == 1 and stats["state"] == CLOSED
+
+
+def test_half_open_admits_single_trial():
+    """后台探测进行中时不再放行真实请求，同一时间只有一个试探"""
+    started, release = threading.Event(), threading.Event()
+
+    def probe():
+        started.set()
+        release.wait(1)
+
+    breaker = CircuitBreaker("stock_lhb_detail_em", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure(probe)
+    assert breaker.state == OPEN
+
+    assert started.wait(1)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    release.set()
+    deadline = time.time() + 1
+    while breaker.state != CLOSED and time.time() < deadline:
+        time.sleep(0.01)
+    assert breaker.state == CLOSED and breaker.allow()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+测试stdio调度器：慢请求不会阻塞其他请求，响应按完成顺序写出
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server import cancellation, finance_server, finance_tools, rate_limiter
+from src.main.mcp_services.finance_server.finance_server import FixedMCPServer, StdioDispatcher
+from src.main.mcp_services.finance_server.tool_registry import CHEAP, NETWORK, ToolRegistry, ToolSpec
+
+
+def _request(request_id, name, arguments):
+    return json.dumps({
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "tools/call",
+        "params": {"name": name, "arguments": arguments}
+    }) + "\n"
+
+
+def test_slow_call_does_not_block_others(monkeypatch):
+    """慢的历史数据请求执行期间，后续请求应先返回"""
+    def slow_history(symbol, period="daily"):
+        time.sleep(0.5)
+        return [finance_tools.types.TextContent(type="text", text=f"history {symbol}")]
+
+    monkeypatch.setattr(finance_tools.FinanceDataService, "get_stock_history", staticmethod(slow_history))
+
+    lines = [
+        _request(1, "get_stock_history", {"symbol": "000001"}),
+        _request(2, "echo", {"text": "fast"}),
+        _request(3, "get_market_heat", {"industry": "finance"}),
+    ]
+    responses = []
+    server = FixedMCPServer(max_concurrency=4)
+    dispatcher = StdioDispatcher(server, reader=lambda: lines.pop(0) if lines else "",
+                                 writer=responses.append)
+
+    start = time.time()
+    asyncio.run(dispatcher.run())
+    elapsed = time.time() - start
+    server.shutdown()
+
+    ids = [json.loads(r)["id"] for r in responses]
+    assert sorted(ids) == [1, 2, 3]
+    assert ids[-1] == 1
+    assert elapsed < 2
+
+
+def test_cheap_handlers_run_off_event_loop():
+    """cheap 类别的处理函数也在工作线程中执行，阻塞时不影响其他请求"""
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def busy(text):
+        threads.append(threading.get_ident())
+        time.sleep(0.5)
+        return text
+
+    registry = ToolRegistry([
+        ToolSpec("busy", "阻塞的轻量工具", busy, properties={"text": {"type": "string"}},
+                 required=["text"], cost=CHEAP, uses_data_modules=False),
+        ToolSpec("echo", "回显", lambda text: text, properties={"text": {"type": "string"}},
+                 required=["text"], cost=CHEAP, uses_data_modules=False),
+    ])
+    lines = [_request(1, "busy", {"text": "slow"}), _request(2, "echo", {"text": "fast"})]
+    responses = []
+    server = FixedMCPServer(max_concurrency=2, registry=registry)
+    dispatcher = StdioDispatcher(server, reader=lambda: lines.pop(0) if lines else "",
+                                 writer=responses.append)
+    try:
+        asyncio.run(dispatcher.run())
+    finally:
+        server.shutdown()
+
+    assert [json.loads(r)["id"] for r in responses] == [2, 1]
+    assert threads and threads[0] != loop_thread
+
+
+def test_max_concurrency_bounds_parallel_calls(monkeypatch):
+    """同时运行的工具调用数量不超过 max_concurrency"""
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def tracked_history(symbol, period="daily"):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.1)
+        with lock:
+            active["now"] -= 1
+        return [finance_tools.types.TextContent(type="text", text=symbol)]
+
+    monkeypatch.setattr(finance_tools.FinanceDataService, "get_stock_history", staticmethod(tracked_history))
+
+    lines = [_request(i, "get_stock_history", {"symbol": f"{i:06d}"}) for i in range(8)]
+    responses = []
+    server = FixedMCPServer(max_concurrency=2)
+    dispatcher = StdioDispatcher(server, reader=lambda: lines.pop(0) if lines else "",
+                                 writer=responses.append)
+    asyncio.run(dispatcher.run())
+    server.shutdown()
+
+    assert len(responses) == 8
+    assert active["peak"] <= 2
+
+
+def test_batch_runs_concurrently_and_coalesces_duplicates(monkeypatch):
+    """批量请求并发执行，重复的工具调用只执行一次，通知不产生响应"""
+    calls = []
+
+    def slow_history(symbol, period="daily"):
+        calls.append(symbol)
+        time.sleep(0.3)
+        return [finance_tools.types.TextContent(type="text", text=f"history {symbol}")]
+
+    monkeypatch.setattr(finance_tools.FinanceDataService, "get_stock_history", staticmethod(slow_history))
+
+    batch = "[" + ",".join([
+        _request(1, "get_stock_history", {"symbol": "000001"}),
+        _request(2, "get_stock_history", {"symbol": "600519"}),
+        _request(3, "get_stock_history", {"symbol": "000001"}),
+        json.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"}),
+        "42",
+    ]) + "]"
+    lines = [batch, json.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"}) + "\n"]
+    responses = []
+    server = FixedMCPServer(max_concurrency=4)
+    dispatcher = StdioDispatcher(server, reader=lambda: lines.pop(0) if lines else "",
+                                 writer=responses.append)
+
+    start = time.time()
+    asyncio.run(dispatcher.run())
+    elapsed = time.time() - start
+    server.shutdown()
+
+    assert len(responses) == 1
+    batch_response = json.loads(responses[0])
+    by_id = {item["id"]: item for item in batch_response}
+    assert sorted(by_id, key=str) == [1, 2, 3, None]
+    assert by_id[3]["result"] == by_id[1]["result"]
+    assert by_id[None]["error"]["code"] == -32600
+    assert sorted(calls) == ["000001", "600519"]
+    assert elapsed < 0.6
+
+
+def test_empty_batch_is_invalid_request():
+    """空数组按规范返回单个 Invalid Request 错误"""
+    server = FixedMCPServer(max_concurrency=1)
+    response = json.loads(asyncio.run(server.process_message("[]")))
+    server.shutdown()
+    assert response["error"]["code"] == -32600 and response["id"] is None
+
+
+def _polling_server(stopped):
+    """工具在工作线程中反复“请求上游”（可被取消的等待），直到调用被取消或超时"""
+    def poll(symbol):
+        try:
+            for _ in range(100):
+                cancellation.sleep(0.05)
+            return f"done {symbol}"
+        finally:
+            stopped.set()
+
+    registry = ToolRegistry([
+        ToolSpec("poll", "轮询", poll, properties={"symbol": {"type": "string"}},
+                 required=["symbol"], cost=NETWORK, uses_data_modules=False),
+        ToolSpec("quick", "立即返回", lambda: "quick", cost=NETWORK, uses_data_modules=False),
+    ])
+    return FixedMCPServer(max_concurrency=1, registry=registry)
+
+
+def test_cancelled_call_stops_worker_and_frees_slot():
+    """notifications/cancelled 后不再响应该请求，工作线程停止，名额立即可供其他调用使用"""
+    stopped = threading.Event()
+    server = _polling_server(stopped)
+
+    async def run():
+        call = asyncio.ensure_future(server.process_message(_request(7, "poll", {"symbol": "000001"})))
+        await asyncio.sleep(0.1)
+        cancel = await server.process_message(json.dumps({
+            "jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 7},
+        }))
+        started = time.time()
+        quick = json.loads(await server.process_message(_request(8, "quick", {})))
+        return cancel, await call, quick, time.time() - started
+
+    try:
+        cancel, response, quick, waited = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    assert cancel == "" and response == ""
+    assert quick["result"]["content"][0]["text"] == "quick"
+    assert waited < 0.5
+    assert stopped.wait(1)
+    assert not server._running
+
+
+def test_cancelled_call_holds_slot_until_worker_finishes():
+    """不响应取消的处理函数：名额在工作线程结束后才归还，运行中的线程数不超过并发上限"""
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def stubborn():
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.4)
+        with lock:
+            active["now"] -= 1
+        return "stubborn"
+
+    registry = ToolRegistry([
+        ToolSpec("stubborn", "忽略取消", stubborn, cost=NETWORK, uses_data_modules=False),
+        ToolSpec("quick", "立即返回", stubborn, cost=NETWORK, uses_data_modules=False),
+    ])
+    server = FixedMCPServer(max_concurrency=1, registry=registry)
+
+    async def run():
+        call = asyncio.ensure_future(server.process_message(_request(1, "stubborn", {})))
+        await asyncio.sleep(0.1)
+        await server.process_message(json.dumps({
+            "jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 1},
+        }))
+        started = time.time()
+        quick = json.loads(await server.process_message(_request(2, "quick", {})))
+        return await call, quick, time.time() - started
+
+    try:
+        response, quick, waited = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    assert response == ""
+    assert quick["result"]["content"][0]["text"] == "stubborn"
+    # 等被取消的线程（剩余约 0.3 秒）结束后才开始执行
+    assert waited >= 0.6
+    assert active["peak"] == 1
+    assert server._executor._max_workers == server.max_concurrency + server.compute_concurrency
+
+
+def test_meta_timeout_overrides_tool_timeout():
+    """_meta.timeout 覆盖工具声明的超时，超时后工作线程也会停止"""
+    stopped = threading.Event()
+    server = _polling_server(stopped)
+    message = json.dumps({
+        "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+        "params": {"name": "poll", "arguments": {"symbol": "000001"}, "_meta": {"timeout": 0.2}},
+    })
+
+    started = time.time()
+    try:
+        response = json.loads(asyncio.run(server.process_message(message)))
+    finally:
+        server.shutdown()
+
+    assert response["error"]["message"] == "Tool execution timed out after 0.2s"
+    assert time.time() - started < 1
+    assert stopped.wait(1)
+
+
+def test_throttled_host_burst_does_not_hold_slots(monkeypatch):
+    """限速站点的突发调用在事件循环中排队等令牌，不占用并发名额，其他站点的调用不受影响"""
+    limiter = rate_limiter.HostRateLimiter(default_rate=0, rates={"10jqka": 0.5})
+    monkeypatch.setattr(rate_limiter, "RATE_LIMITS", limiter)
+    requests = []
+
+    def ths(symbol):
+        time.sleep(0.05)
+        rate_limiter.RATE_LIMITS.acquire_blocking("10jqka")
+        requests.append((symbol, time.time()))
+        return symbol
+
+    registry = ToolRegistry([
+        ToolSpec("ths", "同花顺", ths, properties={"symbol": {"type": "string"}},
+                 required=["symbol"], cost=NETWORK, uses_data_modules=False, upstream="10jqka"),
+        ToolSpec("other", "其他站点", lambda: "other", cost=NETWORK, uses_data_modules=False,
+                 upstream="eastmoney"),
+    ])
+    server = FixedMCPServer(max_concurrency=1, registry=registry)
+
+    async def run():
+        burst = [asyncio.ensure_future(server.process_message(_request(i, "ths", {"symbol": str(i)})))
+                 for i in range(3)]
+        await asyncio.sleep(0.2)
+        started = time.time()
+        other = json.loads(await server.process_message(_request(9, "other", {})))
+        waited = time.time() - started
+        for call in burst:
+            call.cancel()
+        return other, waited
+
+    try:
+        other, waited = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    assert other["result"]["content"][0]["text"] == "other"
+    assert waited < 0.5
+    # 预约的令牌由工作线程直接使用，不会重复扣除
+    assert len(requests) == 1
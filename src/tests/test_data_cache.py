@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+测试分层结果缓存：内存LRU、磁盘层、TTL策略与命中统计
+"""
+
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.data_cache import (
+    CHINA_TZ,
+    CachedAkshare,
+    TieredCache,
+    seconds_until_next_close,
+)
+from src.main.mcp_services.finance_server.single_flight import SingleFlight
+
+
+class FakeAkshare:
+    """记录调用次数的假 akshare 模块"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def stock_zh_a_hist(self, symbol, period="daily"):
+        self.calls += 1
+        return pd.DataFrame({"日期": ["2025-01-02"], "收盘": [10.0], "代码": [symbol]})
+
+
+def test_memory_and_disk_hits(tmp_path):
+    """第二次调用命中内存，清空内存后命中磁盘"""
+    fake = FakeAkshare()
+    cache = TieredCache(max_memory_bytes=1024 * 1024, disk_dir=tmp_path)
+    ak = CachedAkshare(fake, cache, enabled=True)
+
+    ak.stock_zh_a_hist(symbol="000001")
+    ak.stock_zh_a_hist(symbol="000001")
+    cache.clear_memory()
+    df = ak.stock_zh_a_hist(symbol="000001")
+
+    assert fake.calls == 1
+    assert df.iloc[0]["代码"] == "000001"
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["disk_hits"] == 1
+    assert stats["functions"]["stock_zh_a_hist"]["misses"] == 1
+
+
+def test_returned_frame_does_not_mutate_cache(tmp_path):
+    """调用方新增列不影响缓存中的数据"""
+    cache = TieredCache(max_memory_bytes=1024 * 1024, disk_dir=tmp_path)
+    ak = CachedAkshare(FakeAkshare(), cache, enabled=True)
+
+    df = ak.stock_zh_a_hist(symbol="000001")
+    df["pe"] = 12.3
+    assert "pe" not in ak.stock_zh_a_hist(symbol="000001").columns
+
+
+def test_lru_evicts_by_memory_size():
+    """内存层按字节数淘汰最久未使用的条目"""
+    frame = pd.DataFrame({"v": range(1000)})
+    size = int(frame.memory_usage(deep=True).sum())
+    cache = TieredCache(max_memory_bytes=size * 2 + 10)
+
+    cache.set("a", frame, ttl=60)
+    cache.set("b", frame, ttl=60)
+    cache.get("a")
+    cache.set("c", frame, ttl=60)
+
+    assert cache.get("a")[0]
+    assert not cache.get("b")[0]
+    assert cache.get("c")[0]
+
+
+def test_expired_entry_is_a_miss():
+    """过期条目视为未命中"""
+    cache = TieredCache(max_memory_bytes=1024 * 1024)
+    cache.set("k", 1, ttl=-1)
+    assert cache.get("k") == (False, None)
+
+
+class SlowMacro:
+    """每次调用返回新版本号、且耗时较长的假宏观数据接口"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def macro_china_cpi(self):
+        self.calls += 1
+        if self.calls > 1:
+            time.sleep(0.2)
+        return pd.DataFrame({"版本": [self.calls]})
+
+
+def test_stale_while_revalidate(tmp_path):
+    """过期不久的低频数据立即返回旧值，后台刷新后返回新值"""
+    fake = SlowMacro()
+    cache = TieredCache(max_memory_bytes=1024 * 1024, disk_dir=tmp_path)
+    ak = CachedAkshare(fake, cache, policies={"macro_china_cpi": 0.05}, enabled=True,
+                       stale_policies={"macro_china_cpi": 60}, flights=SingleFlight())
+    ak.macro_china_cpi()
+    time.sleep(0.1)
+
+    started = time.perf_counter()
+    stale = ak.macro_china_cpi()
+    assert time.perf_counter() - started < 0.1
+    assert stale.iloc[0]["版本"] == 1
+
+    deadline = time.time() + 2
+    while fake.calls < 2 or not cache.get("macro_china_cpi()")[0]:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    assert ak.macro_china_cpi().iloc[0]["版本"] == 2
+    assert cache.stats()["stale_served"] == 1
+
+
+def test_stale_beyond_window_blocks(tmp_path):
+    """超出允许范围的旧值不再返回，阻塞等待刷新"""
+    fake = SlowMacro()
+    cache = TieredCache(max_memory_bytes=1024 * 1024, disk_dir=tmp_path)
+    ak = CachedAkshare(fake, cache, policies={"macro_china_cpi": 0.01}, enabled=True,
+                       stale_policies={"macro_china_cpi": 0.01}, flights=SingleFlight())
+    ak.macro_china_cpi()
+    time.sleep(0.05)
+
+    assert ak.macro_china_cpi().iloc[0]["版本"] == 2
+    assert cache.stats()["stale_served"] == 0
+
+
+def test_seconds_until_next_close_skips_weekend():
+    """周五收盘后的下一次收盘是周一 15:00"""
+    friday_evening = datetime(2025, 1, 3, 16, 0, tzinfo=CHINA_TZ)
+    assert seconds_until_next_close(friday_evening) == (2 * 24 + 23) * 3600
+    monday_morning = datetime(2025, 1, 6, 9, 30, tzinfo=CHINA_TZ)
+    assert seconds_until_next_close(monday_morning) == 5.5 * 3600
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+测试本地K线库的增量刷新逻辑与技术指标状态
+"""
+
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.data_cache import CHINA_TZ, mark_stale, stale_age
+from src.main.mcp_services.finance_server.history_store import HistoryStore
+from src.main.mcp_services.finance_server.indicator_state import IndicatorState
+from src.main.mcp_services.finance_server.indicators import latest_indicators
+
+
+def _bars(dates, close=10.0):
+    return pd.DataFrame({
+        "日期": dates,
+        "股票代码": ["000001"] * len(dates),
+        "开盘": [close] * len(dates),
+        "收盘": [close] * len(dates),
+        "最高": [close] * len(dates),
+        "最低": [close] * len(dates),
+        "成交量": [1000] * len(dates),
+        "成交额": [10000.0] * len(dates),
+        "振幅": [0.0] * len(dates),
+        "涨跌幅": [0.0] * len(dates),
+        "涨跌额": [0.0] * len(dates),
+        "换手率": [0.1] * len(dates),
+    })
+
+
+class FakeFetcher:
+    """按 start_date 返回K线的假数据源"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.frames.pop(0) if self.frames else _bars([])
+
+
+def test_incremental_refresh_requests_only_new_bars(tmp_path):
+    """收盘后已刷新的日线只从下一天开始增量获取"""
+    fetcher = FakeFetcher([
+        _bars(["2025-01-02", "2025-01-03"]),
+        _bars(["2025-01-06"], close=11.0),
+    ])
+    store = HistoryStore(tmp_path / "history.db", fetcher)
+
+    friday_evening = datetime(2025, 1, 3, 16, 0, tzinfo=CHINA_TZ)
+    first = store.get_history("000001", now=friday_evening)
+    assert list(first["日期"]) == ["2025-01-02", "2025-01-03"]
+    assert "start_date" not in fetcher.calls[0]
+
+    # 同一收盘后再次查询不访问网络
+    store.get_history("000001", now=friday_evening)
+    assert len(fetcher.calls) == 1
+
+    monday_evening = datetime(2025, 1, 6, 16, 0, tzinfo=CHINA_TZ)
+    second = store.get_history("000001", now=monday_evening)
+    assert fetcher.calls[1]["start_date"] == "20250104"
+    assert list(second["日期"]) == ["2025-01-02", "2025-01-03", "2025-01-06"]
+    assert second.iloc[-1]["收盘"] == 11.0
+
+
+def test_intraday_bar_is_refetched(tmp_path):
+    """盘中获取的最后一根K线未完成，下次刷新从当天重新获取并覆盖"""
+    fetcher = FakeFetcher([
+        _bars(["2025-01-02", "2025-01-03"], close=10.0),
+        _bars(["2025-01-03"], close=12.0),
+    ])
+    store = HistoryStore(tmp_path / "history.db", fetcher)
+
+    store.get_history("000001", now=datetime(2025, 1, 3, 10, 0, tzinfo=CHINA_TZ))
+    frame = store.get_history("000001", now=datetime(2025, 1, 3, 16, 0, tzinfo=CHINA_TZ))
+
+    assert fetcher.calls[1]["start_date"] == "20250103"
+    assert list(frame["日期"]) == ["2025-01-02", "2025-01-03"]
+    assert frame.iloc[-1]["收盘"] == 12.0
+
+
+def test_in_progress_bar_refetched_during_session(tmp_path):
+    """交易时段内当天的K线超过盘中有效期后重新获取，不会停留在上午的数据"""
+    fetcher = FakeFetcher([
+        _bars(["2025-01-02"], close=10.0),
+        _bars(["2025-01-03"], close=10.5),
+        _bars(["2025-01-03"], close=11.0),
+    ])
+    store = HistoryStore(tmp_path / "history.db", fetcher, intraday_ttl=60)
+    # 前一交易日收盘后已刷新
+    store.get_history("000001", now=datetime(2025, 1, 2, 16, 0, tzinfo=CHINA_TZ))
+
+    morning = store.get_history("000001", now=datetime(2025, 1, 3, 10, 30, tzinfo=CHINA_TZ))
+    # 有效期内的重复查询不访问网络
+    store.get_history("000001", now=datetime(2025, 1, 3, 10, 30, 30, tzinfo=CHINA_TZ))
+    afternoon = store.get_history("000001", now=datetime(2025, 1, 3, 14, 0, tzinfo=CHINA_TZ))
+
+    assert len(fetcher.calls) == 3
+    assert fetcher.calls[1]["start_date"] == "20250103"
+    assert fetcher.calls[2]["start_date"] == "20250103"
+    assert morning.iloc[-1]["收盘"] == 10.5
+    assert afternoon.iloc[-1]["收盘"] == 11.0
+    assert list(afternoon["日期"]) == ["2025-01-02", "2025-01-03"]
+
+
+def test_partial_weekly_bar_is_replaced(tmp_path):
+    """未走完的周线在下次刷新时被整周替换，不会出现重复的周"""
+    fetcher = FakeFetcher([
+        _bars(["2024-12-27", "2025-01-01"]),
+        _bars(["2025-01-03"], close=13.0),
+    ])
+    store = HistoryStore(tmp_path / "history.db", fetcher)
+
+    store.get_history("000001", period="weekly", now=datetime(2025, 1, 1, 16, 0, tzinfo=CHINA_TZ))
+    frame = store.get_history("000001", period="weekly", now=datetime(2025, 1, 3, 16, 0, tzinfo=CHINA_TZ))
+
+    assert fetcher.calls[1]["start_date"] == "20241230"
+    assert list(frame["日期"]) == ["2024-12-27", "2025-01-03"]
+
+
+def test_indicator_state_updates_incrementally(tmp_path, monkeypatch):
+    """指标状态持久化在K线库中：盘中K线不写入检查点，收盘后只增量应用新K线"""
+    dates = pd.bdate_range("2024-09-02", "2025-01-02").strftime("%Y-%m-%d").tolist()
+    history = _bars(dates)
+    history["收盘"] = [10 + (i % 7) * 0.3 + i * 0.01 for i in range(len(dates))]
+    history["最高"] = history["收盘"] + 0.2
+    history["最低"] = history["收盘"] - 0.2
+    history.loc[history.index[-1], "收盘"] = 12.0
+    fetcher = FakeFetcher([history, _bars(["2025-01-02"], close=11.5), _bars(["2025-01-03"], close=11.8)])
+    store = HistoryStore(tmp_path / "history.db", fetcher)
+
+    intraday = store.get_indicators("000001", now=datetime(2025, 1, 2, 10, 0, tzinfo=CHINA_TZ))
+    assert intraday["date"] == "2025-01-02" and intraday["close"] == 12.0
+
+    updates = []
+    original_update = IndicatorState.update
+    monkeypatch.setattr(IndicatorState, "update",
+                        lambda self, bar: (updates.append(bar["日期"]), original_update(self, bar)))
+
+    store.get_indicators("000001", now=datetime(2025, 1, 2, 16, 0, tzinfo=CHINA_TZ))
+    latest = store.get_indicators("000001", now=datetime(2025, 1, 3, 16, 0, tzinfo=CHINA_TZ))
+
+    # 盘中K线被覆盖后只应用收盘后的版本，之后每天只应用一根新K线
+    assert updates == ["2025-01-02", "2025-01-03"]
+    expected = latest_indicators(store.get_history("000001", now=datetime(2025, 1, 3, 16, 0, tzinfo=CHINA_TZ)))
+    assert latest["date"] == expected["date"] == "2025-01-03"
+    for group in ("ma", "macd", "kdj", "rsi", "boll"):
+        for name, value in expected[group].items():
+            assert abs(latest[group][name] - value) < 1e-6
+
+
+def test_stale_fallback_is_served_but_not_persisted(tmp_path):
+    """上游返回过期缓存时结果带过期标记，但不推进刷新时间和指标检查点"""
+    fetcher = FakeFetcher([
+        _bars(["2025-01-02", "2025-01-03"]),
+        mark_stale(_bars(["2025-01-06"], close=11.0), time.time() - 100),
+        mark_stale(_bars(["2025-01-06"], close=11.0), time.time() - 100),
+        _bars(["2025-01-06"], close=12.0),
+    ])
+    store = HistoryStore(tmp_path / "history.db", fetcher)
+    store.get_indicators("000001", now=datetime(2025, 1, 3, 16, 0, tzinfo=CHINA_TZ))
+
+    monday_evening = datetime(2025, 1, 6, 16, 0, tzinfo=CHINA_TZ)
+    stale = store.get_history("000001", now=monday_evening)
+    assert stale_age(stale) is not None
+    assert list(stale["日期"]) == ["2025-01-02", "2025-01-03", "2025-01-06"]
+    assert stale.iloc[-1]["收盘"] == 11.0
+
+    assert store.get_indicators("000001", now=monday_evening) is not None
+
+    conn = store._connect()
+    assert conn.execute("SELECT MAX(date) FROM bars").fetchone()[0] == "2025-01-03"
+    assert conn.execute("SELECT last_date FROM indicator_state").fetchone()[0] == "2025-01-03"
+
+    # 上游恢复后重新获取，指标基于新数据推进
+    indicators = store.get_indicators("000001", now=monday_evening)
+    assert fetcher.calls[3]["start_date"] == "20250104"
+    assert conn.execute("SELECT last_date FROM indicator_state").fetchone()[0] == "2025-01-06"
+    assert indicators is not None
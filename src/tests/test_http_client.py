@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+测试共享HTTP连接池：长连接复用、传输层重试与复用统计
+"""
+
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.http_client import PooledHTTPClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    """前 ``failures`` 次请求返回 503，之后返回 200 的本地服务"""
+
+    protocol_version = "HTTP/1.1"
+    failures = 0
+
+    def do_GET(self):
+        if Handler.failures > 0:
+            Handler.failures -= 1
+            status, body = 503, b"busy"
+        else:
+            status, body = 200, b"ok"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/quote"
+
+
+def test_connections_are_reused():
+    """多次请求复用同一个长连接"""
+    server, url = _serve()
+    client = PooledHTTPClient(default_pool_size=2, pool_sizes={}, retries=0)
+    try:
+        for _ in range(5):
+            assert client.get(url).text == "ok"
+        stats = client.stats()
+    finally:
+        client.close()
+        server.shutdown()
+
+    other = stats["hosts"]["other"]
+    assert stats["requests"] == 5
+    assert other["requests"] == 5 and other["connections"] == 1
+    assert other["reuse_rate"] == 0.8
+
+
+def test_transport_retries_server_errors():
+    """503 在传输层按退避策略重试，调用方只看到最终结果"""
+    server, url = _serve()
+    Handler.failures = 2
+    client = PooledHTTPClient(default_pool_size=2, pool_sizes={}, retries=3, backoff_factor=0)
+    try:
+        response = client.get(url)
+        stats = client.stats()
+    finally:
+        client.close()
+        server.shutdown()
+
+    assert response.status_code == 200
+    assert stats["retries"] == 2 and stats["errors"] == 0
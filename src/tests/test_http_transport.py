@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+测试 HTTP 传输：Streamable HTTP 会话、通知 202、SSE 响应与旧版 HTTP+SSE
+"""
+
+import asyncio
+import http.client
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.finance_server import FixedMCPServer
+from src.main.mcp_services.finance_server.http_transport import MCPHttpTransport
+
+
+@pytest.fixture
+def transport():
+    """在后台事件循环中运行 HTTP 传输（系统分配端口）"""
+    loop = asyncio.new_event_loop()
+    server = FixedMCPServer(max_concurrency=2)
+    http = MCPHttpTransport(server, "127.0.0.1", 0)
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(http.start(), loop).result(timeout=5)
+    yield http
+    asyncio.run_coroutine_threadsafe(http.close(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
+    server.shutdown()
+
+
+def _message(method, request_id=None, **params):
+    message = {"jsonrpc": "2.0", "method": method, "params": params}
+    if request_id is not None:
+        message["id"] = request_id
+    return json.dumps(message)
+
+
+def _post(conn, body, headers=None):
+    conn.request("POST", "/mcp", body=body, headers={
+        "Content-Type": "application/json", "Accept": "application/json, text/event-stream", **(headers or {})
+    })
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def test_streamable_http_session(transport):
+    """initialize 返回会话 ID；同一连接上的请求、通知与结束会话"""
+    conn = http.client.HTTPConnection("127.0.0.1", transport.port, timeout=5)
+    response, _ = _post(conn, _message("initialize", 1))
+    session_id = response.getheader("Mcp-Session-Id")
+    assert response.status == 200 and session_id in transport.sessions
+
+    headers = {"Mcp-Session-Id": session_id}
+    response, _ = _post(conn, _message("notifications/initialized"), headers)
+    assert response.status == 202
+
+    response, body = _post(conn, _message("tools/call", 2, name="echo", arguments={"text": "hi"}), headers)
+    assert response.status == 200
+    assert json.loads(body)["result"]["content"][0]["text"] == "hi"
+
+    conn.request("DELETE", "/mcp", headers=headers)
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 200
+    response, _ = _post(conn, _message("tools/list", 3), headers)
+    assert response.status == 404
+    conn.close()
+
+
+def test_event_stream_only_client_gets_sse(transport):
+    """只接受 text/event-stream 的客户端收到单个 SSE 事件"""
+    conn = http.client.HTTPConnection("127.0.0.1", transport.port, timeout=5)
+    response, body = _post(conn, _message("tools/list", 1), {"Accept": "text/event-stream"})
+    conn.close()
+
+    assert response.getheader("Content-Type") == "text/event-stream"
+    event, data = body.decode("utf-8").strip().split("\n")
+    assert event == "event: message"
+    assert json.loads(data[len("data: "):])["id"] == 1
+
+
+def test_foreign_origin_rejected(transport):
+    """非本机来源的浏览器请求被拒绝"""
+    conn = http.client.HTTPConnection("127.0.0.1", transport.port, timeout=5)
+    response, _ = _post(conn, _message("tools/list", 1), {"Origin": "https://evil.example"})
+    conn.close()
+    assert response.status == 403
+
+
+def test_legacy_sse_transport(transport):
+    """旧版传输：GET /sse 取得消息地址，响应经 SSE 流返回"""
+    stream = http.client.HTTPConnection("127.0.0.1", transport.port, timeout=5)
+    stream.request("GET", "/sse")
+    events = stream.getresponse()
+    assert events.readline() == b"event: endpoint\n"
+    endpoint = events.readline().decode("utf-8")[len("data: "):].strip()
+    events.readline()
+
+    conn = http.client.HTTPConnection("127.0.0.1", transport.port, timeout=5)
+    conn.request("POST", endpoint, body=_message("tools/call", 7, name="echo", arguments={"text": "sse"}))
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 202
+    conn.close()
+
+    assert events.readline() == b"event: message\n"
+    response = json.loads(events.readline().decode("utf-8")[len("data: "):])
+    assert response["id"] == 7 and response["result"]["content"][0]["text"] == "sse"
+    stream.close()
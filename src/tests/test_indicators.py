@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+测试向量化技术指标：与逐 bar 循环的参考实现一致，单只与多只股票结果一致
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server import indicators
+from src.main.mcp_services.finance_server.indicator_state import IndicatorState
+
+
+def _bars(length=300, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+    high = close * (1 + rng.uniform(0, 0.03, length))
+    low = close * (1 - rng.uniform(0, 0.03, length))
+    return pd.DataFrame({
+        "日期": pd.date_range("2015-01-01", periods=length).strftime("%Y-%m-%d"),
+        "开盘": close, "收盘": close, "最高": high, "最低": low,
+        "成交量": rng.uniform(1e5, 1e6, length),
+    })
+
+
+def _loop_rsi(close, period):
+    gains = [max(close[i] - close[i - 1], 0) for i in range(1, len(close))]
+    losses = [max(close[i - 1] - close[i], 0) for i in range(1, len(close))]
+    avg_gain = sum(gains[:period]) / period
+    avg_loss = sum(losses[:period]) / period
+    for gain, loss in zip(gains[period:], losses[period:]):
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+    return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+def _loop_kdj(high, low, close, n=9):
+    k = d = 50.0
+    for i in range(len(close)):
+        lowest = min(low[max(0, i - n + 1):i + 1])
+        highest = max(high[max(0, i - n + 1):i + 1])
+        rsv = (close[i] - lowest) / (highest - lowest) * 100
+        k = (2 * k + rsv) / 3
+        d = (2 * d + k) / 3
+    return k, d, 3 * k - 2 * d
+
+
+def _loop_macd(close):
+    fast = slow = close[0]
+    dea = 0.0
+    for price in close:
+        fast = fast + (price - fast) * 2 / 13
+        slow = slow + (price - slow) * 2 / 27
+        dea = dea + (fast - slow - dea) * 2 / 10
+    return fast - slow, dea
+
+
+def test_matches_loop_reference():
+    """RSI、KDJ、MACD 与逐 bar 循环计算结果一致"""
+    bars = _bars()
+    close, high, low = (bars[c].tolist() for c in ("收盘", "最高", "最低"))
+    latest = indicators.latest_indicators(bars)
+
+    assert abs(latest["rsi"]["rsi14"] - _loop_rsi(close, 14)) < 1e-3
+    k, d, j = _loop_kdj(high, low, close)
+    assert abs(latest["kdj"]["k"] - k) < 1e-3 and abs(latest["kdj"]["j"] - j) < 1e-3
+    dif, dea = _loop_macd(close)
+    assert abs(latest["macd"]["dif"] - dif) < 1e-3 and abs(latest["macd"]["dea"] - dea) < 1e-3
+    assert latest["ma"]["ma20"] == round(sum(close[-20:]) / 20, 4)
+
+
+def test_short_history_reports_missing_values():
+    """数据不足时相应指标为 None"""
+    latest = indicators.latest_indicators(_bars(length=10))
+    assert latest["ma"]["ma60"] is None
+    assert latest["rsi"]["rsi14"] is None
+    assert latest["ma"]["ma5"] is not None
+
+
+def test_panel_matches_single_symbol():
+    """多只股票一次性计算与逐只计算结果一致"""
+    frames = [_bars(seed=seed) for seed in (1, 2, 3)]
+    panel = indicators.compute_panel(
+        *(np.column_stack([f[c].to_numpy() for f in frames]) for c in ("收盘", "最高", "最低", "成交量")),
+        symbols=["A", "B", "C"],
+    )
+    for symbol, frame in zip("ABC", frames):
+        single = indicators.compute_indicators(frame).iloc[-1]
+        for column in ("MA20", "DIF", "K", "RSI14", "BOLL_UPPER", "ATR14", "OBV"):
+            assert np.isclose(panel.loc[symbol, column], single[column])
+
+
+def test_missing_bar_matches_panel_incrementally():
+    """缺失的K线（NaN）按停牌处理，增量状态不被污染，结果与面板计算一致"""
+    bars = _bars()
+    bars.loc[bars.index[-3], ["收盘", "最高", "最低", "成交量"]] = np.nan
+    state = IndicatorState.replay(bars.to_dict("records"))
+    # 持久化后继续增量更新同样不受影响
+    state = IndicatorState.from_json(state.to_json())
+    snapshot = state.snapshot()
+    panel = indicators.compute_panel(
+        *(bars[[c]].to_numpy() for c in ("收盘", "最高", "最低", "成交量")), symbols=["A"],
+    ).loc["A"]
+
+    expected = {
+        ("ma", "ma5"): "MA5", ("ma", "ma20"): "MA20", ("ma", "ma60"): "MA60",
+        ("macd", "dif"): "DIF", ("macd", "dea"): "DEA", ("kdj", "k"): "K", ("kdj", "j"): "J",
+        ("rsi", "rsi14"): "RSI14", ("boll", "upper"): "BOLL_UPPER", ("atr", None): "ATR14",
+        ("obv", None): "OBV", ("volume_ma", "vol_ma5"): "VOL_MA5",
+    }
+    for (group, name), column in expected.items():
+        value = snapshot[group] if name is None else snapshot[group][name]
+        assert value is not None, column
+        assert abs(value - panel[column]) < 1e-3 * max(1.0, abs(panel[column])), column
+    assert snapshot["close"] == round(bars["收盘"].iloc[-1], 4)
+    assert indicators.latest_indicators(bars.iloc[:-2])["close"] == round(bars["收盘"].iloc[-4], 4)
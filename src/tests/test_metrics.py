@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试工具调用的分阶段耗时统计与 get_server_stats 工具
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.data_cache import CachedAkshare, TieredCache
+from src.main.mcp_services.finance_server.finance_server import TOOL_REGISTRY, FixedMCPServer
+from src.main.mcp_services.finance_server.metrics import LATENCY_BUCKETS_MS, Histogram
+from src.main.mcp_services.finance_server.tool_registry import NETWORK, ToolRegistry, ToolSpec
+
+
+class SlowAkshare:
+    """每次调用耗时 50ms 的假 akshare 模块"""
+
+    def stock_news_em(self, symbol):
+        time.sleep(0.05)
+        return pd.DataFrame({"标题": [f"{symbol} 公告"] * 100})
+
+
+def test_histogram_percentiles():
+    """分位数按桶上界估算，不超过最大值"""
+    histogram = Histogram(LATENCY_BUCKETS_MS)
+    for value in [1, 2, 3, 4, 200]:
+        histogram.observe(value)
+
+    summary = histogram.summary()
+    assert summary["count"] == 5 and summary["max"] == 200
+    assert summary["p50"] == 5
+    assert summary["p99"] == 200
+
+
+def test_phases_recorded_and_reported():
+    """上游耗时计入调用，get_server_stats 返回各阶段直方图与缓存命中率"""
+    ak = CachedAkshare(SlowAkshare(), TieredCache(max_memory_bytes=1024 * 1024), enabled=False)
+
+    def news(symbol):
+        frame = ak.stock_news_em(symbol=symbol)
+        return frame.to_string()
+
+    registry = ToolRegistry([
+        ToolSpec("slow_news", "新闻", news, properties={"symbol": {"type": "string"}},
+                 required=["symbol"], cost=NETWORK, cache_ttl=60, uses_data_modules=False),
+        TOOL_REGISTRY.get("get_server_stats"),
+    ])
+    server = FixedMCPServer(max_concurrency=2, registry=registry)
+
+    async def run():
+        await server.handle_call_tool(1, "slow_news", {"symbol": "000001"})
+        await server.handle_call_tool(2, "slow_news", {"symbol": "000001"})
+        return await server.handle_call_tool(3, "get_server_stats", {"tools": ["slow_news"]})
+
+    try:
+        response = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    stats = json.loads(response["result"]["content"][0]["text"])
+    tool = stats["tools"]["slow_news"]
+    assert tool["calls"] == 2 and tool["cache_hits"] == 1 and tool["errors"] == 0
+    assert tool["upstream_calls"] == 1
+    latency = tool["latency_ms"]
+    assert latency["upstream"]["count"] == 1 and latency["upstream"]["max"] >= 50
+    assert latency["total"]["count"] == 2
+    assert tool["payload_bytes"]["max"] > 1000
+    assert stats["caches"]["tool_results"]["memory_hits"] >= 1
+    assert stats["in_flight"] >= 1
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+测试按上游站点共享的令牌桶限速
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.rate_limiter import PREPAID, HostRateLimiter, TokenBucket
+
+
+def test_bucket_paces_requests_after_burst():
+    """突发额度用完后，预约的等待时间按速率递增"""
+    bucket = TokenBucket(rate=10, burst=2)
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits[0] == 0 and waits[1] == 0
+    assert abs(waits[2] - 0.1) < 0.01
+    assert abs(waits[3] - 0.2) < 0.01
+
+
+def test_penalize_delays_following_requests():
+    """上游报错后的退避会推迟该站点之后的请求"""
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.penalize(1.0)
+
+    assert bucket.delay() >= 1.0
+    assert TokenBucket(rate=0).reserve() == 0
+
+
+def test_slow_host_does_not_delay_other_hosts():
+    """同花顺的低速率不影响东方财富的请求"""
+    limiter = HostRateLimiter(default_rate=5, rates={"10jqka": 0.5, "eastmoney": 50})
+    limiter.acquire_blocking("10jqka")
+
+    started = time.perf_counter()
+    for _ in range(10):
+        limiter.acquire_blocking("eastmoney")
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.5
+    assert limiter.bucket("10jqka").delay() > 1.0
+    assert set(limiter.stats()) == {"10jqka", "eastmoney"}
+
+
+def test_async_wait_does_not_block_event_loop():
+    """事件循环中等待令牌时，其他协程照常运行"""
+    limiter = HostRateLimiter(default_rate=5, rates={"10jqka": 4})
+    limiter.penalize("10jqka", 0.3)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        started = time.perf_counter()
+        await asyncio.gather(limiter.wait_ready("10jqka"), ticker())
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+
+    assert elapsed >= 0.25
+    assert len(ticks) == 5 and ticks[-1] - ticks[0] < 0.25
+    # wait_ready 不扣除令牌
+    assert limiter.bucket("10jqka").reserve() == 0
+
+
+def test_reservation_is_used_once_and_refunded_when_unused():
+    """事件循环中预约的令牌只被工作线程使用一次，未使用的在调用结束后退还"""
+    limiter = HostRateLimiter(default_rate=5, rates={"10jqka": 0.5})
+
+    async def reserve():
+        return await limiter.reserve("10jqka")
+
+    used = asyncio.run(reserve())
+    reset = PREPAID.set(used)
+    try:
+        assert limiter.acquire_blocking("10jqka") == 0
+    finally:
+        PREPAID.reset(reset)
+    limiter.refund(used)
+    assert limiter.bucket("10jqka").delay() > 1.0
+
+    bucket = TokenBucket(rate=0.5)
+    limiter._buckets["sina"] = bucket
+    unused = asyncio.run(limiter.reserve("sina"))
+    limiter.refund(unused)
+    assert bucket.delay() == 0
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+测试离线录制/回放：akshare 结果与 HTTP 响应录制后可在无网络时回放
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server import config, finance_server
+from src.main.mcp_services.finance_server.cancellation import CURRENT_TOKEN, CallCancelled, CancelToken
+from src.main.mcp_services.finance_server.data_cache import CHINA_TZ, DATA_CACHE, CachedAkshare, TieredCache
+from src.main.mcp_services.finance_server.history_store import HistoryStore
+from src.main.mcp_services.finance_server.http_client import PooledHTTPClient
+from src.main.mcp_services.finance_server.record_replay import (
+    FIXTURES, OFF, RECORD, REPLAY, FixtureMissingError
+)
+
+
+class LiveAkshare:
+    """录制时使用的假 akshare 模块"""
+
+    def stock_news_em(self, symbol):
+        return pd.DataFrame({"标题": [f"{symbol} 公告"]})
+
+
+    def stock_zh_a_hist(self, symbol, period="daily", adjust="", start_date=None):
+        dates = ["2025-01-02", "2025-01-03"]
+        if start_date:
+            dates = [day for day in dates if day.replace("-", "") >= start_date]
+        return pd.DataFrame({"日期": dates, "股票代码": [symbol] * len(dates), "收盘": [10.0] * len(dates)})
+
+
+class OfflineAkshare:
+    """回放时使用的假 akshare 模块：任何调用都说明访问了上游"""
+
+    def stock_news_em(self, symbol):
+        raise AssertionError("回放模式不应访问上游")
+
+    def stock_zh_a_hist(self, symbol, period="daily", adjust="", start_date=None):
+        raise AssertionError("回放模式不应访问上游")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = f"quote:{self.path}".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fixtures(tmp_path):
+    """使用临时夹具目录，结束后恢复为关闭状态"""
+    FIXTURES.configure(OFF, tmp_path / "fixtures", 0.0)
+    yield FIXTURES
+    FIXTURES.configure(OFF, latency=0.0)
+
+
+def _proxy(module, tmp_path, name):
+    cache = TieredCache(max_memory_bytes=1024 * 1024, disk_dir=tmp_path / name)
+    return CachedAkshare(module, cache, enabled=False)
+
+
+def test_akshare_record_then_replay(fixtures, tmp_path):
+    """录制的 DataFrame 在回放时按相同参数返回，并注入延迟"""
+    fixtures.configure(RECORD)
+    recorded = _proxy(LiveAkshare(), tmp_path, "record").stock_news_em("000001")
+
+    fixtures.configure(REPLAY, latency=0.05)
+    offline = _proxy(OfflineAkshare(), tmp_path, "replay")
+    started = time.perf_counter()
+    replayed = offline.stock_news_em(symbol="000001")
+
+    assert time.perf_counter() - started >= 0.05
+    pd.testing.assert_frame_equal(replayed, recorded)
+    with pytest.raises(FixtureMissingError):
+        offline.stock_news_em("600000")
+    stats = fixtures.stats()
+    assert stats["recorded"] >= 1 and stats["missing"] >= 1
+
+
+def test_replay_latency_stops_at_call_deadline(fixtures, tmp_path):
+    """注入的回放延迟与真实上游一样，在工具调用超时时立即中断"""
+    fixtures.configure(RECORD)
+    _proxy(LiveAkshare(), tmp_path, "record").stock_news_em("000001")
+
+    fixtures.configure(REPLAY, latency=5.0)
+    offline = _proxy(OfflineAkshare(), tmp_path, "replay")
+    reset = CURRENT_TOKEN.set(CancelToken(0.05))
+    started = time.perf_counter()
+    try:
+        with pytest.raises(CallCancelled):
+            offline.stock_news_em(symbol="000001")
+    finally:
+        CURRENT_TOKEN.reset(reset)
+
+    assert time.perf_counter() - started < 1
+
+
+def test_http_record_then_replay(fixtures):
+    """录制的 HTTP 响应在服务关闭后仍可回放"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/quote"
+    client = PooledHTTPClient(default_pool_size=2, pool_sizes={}, retries=0)
+    try:
+        fixtures.configure(RECORD)
+        live = client.get(url, params={"code": "000001"}).text
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    fixtures.configure(REPLAY)
+    try:
+        replayed = client.get(url, params={"code": "000001"})
+        with pytest.raises(FixtureMissingError):
+            client.get(url, params={"code": "600000"})
+    finally:
+        client.close()
+
+    assert replayed.status_code == 200
+    assert replayed.text == live == "quote:/quote?code=000001"
+
+
+def test_replay_ignores_local_history_state(fixtures, tmp_path, monkeypatch):
+    """录制/回放使用新建的本地数据目录：已有的K线库和不同的当前时间不改变回放的请求"""
+    finance_tools = finance_server.finance_tools
+    finance_tools.load()
+    for name in ("HISTORY_STORE", "SECURITY_MASTER", "ak"):
+        monkeypatch.setattr(finance_tools, name, getattr(finance_tools, name))
+    monkeypatch.setattr(config, "DATA_DIR", tmp_path / "data")
+    monkeypatch.setattr(DATA_CACHE, "disk_dir", DATA_CACHE.disk_dir)
+    monkeypatch.setattr(DATA_CACHE, "shared", DATA_CACHE.shared)
+
+    # 原数据目录中的K线库已在上次收盘后刷新过
+    monkeypatch.setattr(finance_tools, "ak", _proxy(LiveAkshare(), tmp_path, "live"))
+    finance_tools.use_data_dir(tmp_path / "data")
+    finance_tools.HISTORY_STORE.get_history("000001", now=datetime(2025, 1, 2, 16, 0, tzinfo=CHINA_TZ))
+
+    fixtures.configure(RECORD)
+    recorded_dir = finance_server.isolate_fixture_data()
+    recorded = finance_tools.HISTORY_STORE.get_history("000001", now=datetime(2025, 1, 3, 16, 0, tzinfo=CHINA_TZ))
+
+    fixtures.configure(REPLAY)
+    monkeypatch.setattr(finance_tools, "ak", _proxy(OfflineAkshare(), tmp_path, "offline"))
+    replay_dir = finance_server.isolate_fixture_data()
+    replayed = finance_tools.HISTORY_STORE.get_history("000001", now=datetime(2025, 1, 8, 11, 0, tzinfo=CHINA_TZ))
+
+    assert recorded_dir != replay_dir
+    assert replay_dir.parent == fixtures.directory / "data"
+    assert finance_tools.HISTORY_STORE.db_path == replay_dir / "history.db"
+    assert DATA_CACHE.disk_dir == replay_dir / "cache" and DATA_CACHE.shared is None
+    pd.testing.assert_frame_equal(replayed, recorded)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+测试本地证券代码表：一次下载后持久化，查询不访问网络，过期后后台刷新
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.security_master import (
+    FUND, FUTURE, INDEX, STOCK, SecurityMaster, Source, default_sources
+)
+
+
+class ListingAkshare:
+    """返回固定代码表并记录调用次数的假 akshare 模块"""
+
+    def __init__(self):
+        self.calls = []
+
+    def stock_info_sh_name_code(self, symbol):
+        self.calls.append(f"sh:{symbol}")
+        if symbol == "科创板":
+            return pd.DataFrame({"证券代码": ["688981"], "证券简称": ["中芯国际"]})
+        return pd.DataFrame({"证券代码": ["600519"], "证券简称": ["贵州茅台"]})
+
+    def stock_info_sz_name_code(self, symbol):
+        self.calls.append("sz")
+        return pd.DataFrame({"A股代码": ["000001", "300274"], "A股简称": ["平安银行", "阳光电源"],
+                             "所属行业": ["J 金融业", "C 制造业"]})
+
+    def stock_info_bj_name_code(self):
+        self.calls.append("bj")
+        return pd.DataFrame({"证券代码": ["830799"], "证券简称": ["艾融软件"], "所属行业": ["软件和信息技术服务业"]})
+
+    def index_stock_info(self):
+        self.calls.append("index")
+        return pd.DataFrame({"index_code": ["000001", "399001"], "display_name": ["上证指数", "深证成指"]})
+
+    def fund_name_em(self):
+        self.calls.append("fund")
+        return pd.DataFrame({
+            "基金代码": ["000001", "000011", "110011", "161725"],
+            "拼音缩写": ["HXCZHH", "HXDPJXHHA", "YFDZXQYHH", "ZSZZBJHZSLOFA"],
+            "基金简称": ["华夏成长混合", "华夏大盘精选混合A", "易方达中小盘混合", "招商中证白酒指数(LOF)A"],
+            "基金类型": ["混合型-偏股", "混合型-偏股", "混合型-偏股", "指数型-股票"],
+        })
+
+    def futures_display_main_sina(self):
+        self.calls.append("futures")
+        raise ConnectionError("sina unavailable")
+
+
+def test_lookup_persists_and_avoids_network(tmp_path):
+    """首次查询下载一次；重启后从本地库载入，同一代码按类别区分"""
+    ak = ListingAkshare()
+    master = SecurityMaster(tmp_path / "securities.db", default_sources(ak))
+    master.warm_up()
+    assert master.wait_ready(timeout=5)
+
+    assert master.name_of("300274") == "阳光电源"
+    assert master.market_of("600519") == "sh" and master.market_of("830799") == "bj"
+    assert master.industry_of("000001") == "J 金融业"
+    assert master.industry_of("600519") is None
+    assert master.name_of("000001", INDEX) == "上证指数"
+    assert master.lookup("000001", FUND).alias == "HXCZHH"
+    assert master.lookup("999999") is None
+    # 未收录的代码按前缀判断交易所
+    assert master.market_of("601000") == "sh"
+
+    # 重启后只重试上次下载失败的列表
+    restarted_ak = ListingAkshare()
+    restarted = SecurityMaster(tmp_path / "securities.db", default_sources(restarted_ak))
+    restarted.warm_up()
+    assert restarted.wait_ready(timeout=5)
+    assert restarted.name_of("688981") == "中芯国际"
+    assert restarted.stats()["counts"][STOCK] == 5
+    assert restarted_ak.calls == ["futures"]
+
+
+def test_failed_source_keeps_others_and_expired_refreshes_in_background(tmp_path):
+    """某个列表下载失败不影响其他列表；过期后先返回旧值再后台刷新"""
+    names = {"600519": "贵州茅台"}
+    master = SecurityMaster(tmp_path / "securities.db", {
+        "sh": Source(STOCK, lambda: [(code, name, "sh", "", "") for code, name in names.items()]),
+        "futures": default_sources(ListingAkshare())["futures"],
+    }, refresh_seconds=0.05)
+    master.warm_up()
+    assert master.wait_ready(timeout=5)
+
+    assert master.name_of("600519") == "贵州茅台"
+    assert master.lookup("RB0", FUTURE) is None
+    assert "futures" in master.stats()["errors"]
+
+    names["600519"] = "茅台"
+    time.sleep(0.1)
+    assert master.name_of("600519") == "贵州茅台"
+    deadline = time.time() + 2
+    while master.name_of("600519") != "茅台" and time.time() < deadline:
+        time.sleep(0.01)
+    assert master.name_of("600519") == "茅台"
+
+
+def test_fund_search_by_code_name_alias_and_fuzzy(tmp_path):
+    """基金按代码前缀、名称/简拼前缀、名称包含和模糊匹配搜索"""
+    master = SecurityMaster(tmp_path / "securities.db", default_sources(ListingAkshare()))
+    master.warm_up([FUND])
+    assert master.wait_ready(timeout=5)
+
+    assert [fund.code for fund in master.search("0000")] == ["000001", "000011"]
+    assert sorted(fund.code for fund in master.search("华夏")) == ["000001", "000011"]
+    assert [fund.code for fund in master.search("hxdp")] == ["000011"]
+    assert [fund.code for fund in master.search("白酒")] == ["161725"]
+    assert master.search("易方达中小盘混和")[0].code == "110011"
+    assert len(master.search("华夏", limit=1)) == 1
+    assert master.search("不存在的基金名称XYZ") == []
+
+
+def test_lookup_does_not_wait_for_download(tmp_path):
+    """代码表下载完成前查询立即返回并按代码前缀回退；更新一个类别不重建其他类别的索引"""
+    ready = threading.Event()
+
+    def slow_stocks():
+        ready.wait(5)
+        return [("600519", "贵州茅台", "sh", "", "")]
+
+    master = SecurityMaster(tmp_path / "securities.db", {
+        "sh": Source(STOCK, slow_stocks),
+        "fund": Source(FUND, lambda: [("000001", "华夏成长混合", "", "混合型-偏股", "HXCZHH")]),
+    })
+
+    started = time.monotonic()
+    assert master.name_of("600519") is None
+    assert master.market_of("600519") == "sh"
+    assert time.monotonic() - started < 1
+
+    master.warm_up()
+    ready.set()
+    assert master.wait_ready(timeout=5)
+    assert master.name_of("600519") == "贵州茅台"
+
+    funds = master._indexes[FUND]
+    master.refresh_source("sh")
+    assert master._indexes[FUND] is funds
+    assert master.lookup("000001", FUND).name == "华夏成长混合"
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+测试上游请求合并：相同参数的并发调用只请求一次上游
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server import cancellation
+from src.main.mcp_services.finance_server.cancellation import CURRENT_TOKEN, CallCancelled, CancelToken
+from src.main.mcp_services.finance_server.data_cache import CachedAkshare, TieredCache
+from src.main.mcp_services.finance_server.single_flight import SingleFlight
+
+
+class SlowAkshare:
+    """请求耗时较长、记录调用参数的假 akshare 模块"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def stock_individual_fund_flow(self, stock, market="sh"):
+        with self.lock:
+            self.calls.append((stock, market))
+        time.sleep(0.2)
+        return pd.DataFrame({"日期": ["2025-01-02"], "主力净流入-净额": [1.0], "代码": [stock]})
+
+
+def _run_parallel(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_identical_calls_share_one_fetch():
+    """位置参数与关键字参数等价的并发调用只触发一次上游请求"""
+    fake = SlowAkshare()
+    flights = SingleFlight()
+    ak = CachedAkshare(fake, TieredCache(max_memory_bytes=1024 * 1024), enabled=False, flights=flights)
+    results = []
+
+    def positional():
+        results.append(ak.stock_individual_fund_flow("600519", "sh"))
+
+    def keyword():
+        results.append(ak.stock_individual_fund_flow(stock="600519", market="sh"))
+
+    def default_market():
+        results.append(ak.stock_individual_fund_flow(stock="600519"))
+
+    _run_parallel([positional, keyword, default_market, keyword])
+
+    assert fake.calls == [("600519", "sh")]
+    assert len(results) == 4 and all(df.iloc[0]["代码"] == "600519" for df in results)
+    assert flights.stats() == {"upstream_calls": 1, "coalesced_calls": 3, "in_flight": 0}
+
+
+def test_different_arguments_are_not_coalesced():
+    """参数不同的请求各自请求上游"""
+    fake = SlowAkshare()
+    ak = CachedAkshare(fake, TieredCache(max_memory_bytes=1024 * 1024), enabled=False, flights=SingleFlight())
+
+    _run_parallel([lambda: ak.stock_individual_fund_flow(stock="600519"),
+                   lambda: ak.stock_individual_fund_flow(stock="000001", market="sz")])
+
+    assert sorted(fake.calls) == [("000001", "sz"), ("600519", "sh")]
+
+
+def test_errors_reach_every_waiter():
+    """上游异常同时传递给所有等待者，之后的调用重新请求"""
+    flights = SingleFlight()
+    started = threading.Event()
+    calls = []
+    errors = []
+
+    def failing():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        raise ConnectionError("upstream down")
+
+    def leader():
+        try:
+            flights.do("key", failing)
+        except ConnectionError as e:
+            errors.append(e)
+
+    def follower():
+        started.wait()
+        try:
+            flights.do("key", failing)
+        except ConnectionError as e:
+            errors.append(e)
+
+    _run_parallel([leader, follower])
+    assert len(calls) == 1 and len(errors) == 2
+
+    assert flights.do("key", lambda: "ok") == ("ok", False)
+
+
+def test_cancelled_leader_hands_over_to_waiter():
+    """发起请求的工具调用被取消时，等待者自己重新请求，而不是收到取消"""
+    flights = SingleFlight()
+    started = threading.Event()
+    token = CancelToken()
+    outcomes = {}
+
+    def fetch():
+        started.set()
+        cancellation.sleep(0.2)
+        return "value"
+
+    def leader():
+        CURRENT_TOKEN.set(token)
+        try:
+            flights.do("key", fetch)
+        except CallCancelled:
+            outcomes["leader"] = "cancelled"
+
+    def follower():
+        started.wait()
+        outcomes["follower"] = flights.do("key", fetch)
+
+    def cancel():
+        started.wait()
+        time.sleep(0.05)
+        token.cancel()
+
+    _run_parallel([leader, follower, cancel])
+
+    assert outcomes == {"leader": "cancelled", "follower": ("value", False)}
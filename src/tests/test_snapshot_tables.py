@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+测试全市场快照表：刷新窗口内只下载一次，按代码索引查询
+"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.snapshot_tables import SnapshotManager
+
+
+def test_one_download_answers_many_symbols():
+    """多次、多只股票查询共用一次下载"""
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return pd.DataFrame({
+            "代码": ["000001", "600000", "000001"],
+            "上榜原因": ["涨幅偏离", "换手率", "振幅"],
+        })
+
+    snapshots = SnapshotManager()
+    snapshots.register("stock_lhb_detail_em", fetch, refresh_seconds=60)
+
+    assert list(snapshots.rows("stock_lhb_detail_em", "000001")["上榜原因"]) == ["涨幅偏离", "振幅"]
+    assert snapshots.rows("stock_lhb_detail_em", "300750").empty
+    many = snapshots.rows_many("stock_lhb_detail_em", ["600000", "300750"])
+    assert len(many["600000"]) == 1 and many["300750"].empty
+    assert len(calls) == 1
+
+
+def test_expired_window_triggers_refresh():
+    """刷新窗口过期后重新下载"""
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return pd.DataFrame({"股票代码": ["000001"], "机构数": [len(calls)]})
+
+    snapshots = SnapshotManager()
+    snapshots.register("stock_institute_hold", fetch, refresh_seconds=0)
+
+    assert snapshots.rows("stock_institute_hold", "000001").iloc[0]["机构数"] == 1
+    assert snapshots.rows("stock_institute_hold", "000001").iloc[0]["机构数"] == 2
+    assert snapshots.stats()["stock_institute_hold"]["downloads"] == 2
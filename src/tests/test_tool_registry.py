@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+测试表驱动的工具注册表：参数校验、结果缓存与超时
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.main.mcp_services.finance_server.finance_server import TOOL_REGISTRY, FixedMCPServer
+from src.main.mcp_services.finance_server.output_format import DataResult, ErrorText
+from src.main.mcp_services.finance_server.tool_registry import (
+    CHEAP, NETWORK, ToolRegistry, ToolSpec,
+)
+
+
+def _call(server, name, arguments):
+    return asyncio.run(server.handle_call_tool(7, name, arguments))
+
+
+def test_registry_declares_every_tool_once():
+    """每个工具都能按名称查找，schema 与注册顺序一致"""
+    names = [tool["name"] for tool in TOOL_REGISTRY.schemas()]
+    assert len(names) == len(set(names)) == len(TOOL_REGISTRY)
+    assert TOOL_REGISTRY.get("get_stock_history").required == ["symbol"]
+    assert TOOL_REGISTRY.get("echo").cost == CHEAP
+
+
+def test_missing_and_unknown_arguments():
+    """缺少必填参数时报错，未声明的参数被忽略"""
+    spec = TOOL_REGISTRY.get("get_stock_history")
+    try:
+        spec.bind({})
+    except ValueError as e:
+        assert "Missing 'symbol' argument" in str(e)
+    else:
+        raise AssertionError("缺少参数时应抛出 ValueError")
+    assert spec.bind({"symbol": "000001", "foo": 1}) == {"symbol": "000001"}
+    assert TOOL_REGISTRY.get("get_stock_spot").bind(None) == {"symbol": ""}
+
+
+def test_results_cached_by_declared_ttl():
+    """声明了有效期的工具，相同参数只执行一次；出错结果不缓存"""
+    calls = []
+
+    def quote(symbol):
+        calls.append(symbol)
+        return ErrorText(f"获取行情出错: {symbol}") if symbol == "bad" else f"{symbol} 涨跌幅 -1.5%（较昨日失败的突破）"
+
+    registry = ToolRegistry([ToolSpec("quote", "行情", quote, properties={"symbol": {"type": "string"}},
+                                      required=["symbol"], cache_ttl=60, uses_data_modules=False)])
+    server = FixedMCPServer(max_concurrency=2, registry=registry)
+
+    first = _call(server, "quote", {"symbol": "000001"})
+    second = _call(server, "quote", {"symbol": "000001"})
+    bad = _call(server, "quote", {"symbol": "bad"})
+    _call(server, "quote", {"symbol": "bad"})
+    server.shutdown()
+
+    # 出错由 isError 标记，而不是从文本中猜测：正常结果的文本中出现“失败”仍会缓存
+    assert first["result"] == second["result"] == {
+        "content": [{"type": "text", "text": "000001 涨跌幅 -1.5%（较昨日失败的突破）"}]}
+    assert bad["result"] == {"content": [{"type": "text", "text": "获取行情出错: bad"}], "isError": True}
+    assert calls == ["000001", "bad", "bad"]
+
+
+def test_timeout_returns_error():
+    """超过声明的超时时间返回错误响应"""
+    registry = ToolRegistry([ToolSpec("slow", "慢工具", lambda: time.sleep(0.5), cost=NETWORK,
+                                      timeout=0.05, uses_data_modules=False)])
+    server = FixedMCPServer(max_concurrency=2, registry=registry)
+
+    response = _call(server, "slow", {})
+    unknown = _call(server, "nope", {})
+    server.shutdown()
+
+    assert "timed out" in response["error"]["message"]
+    assert unknown["error"]["message"] == "Tool execution failed: Unknown tool: nope"
+
+
+def test_output_formats_rendered_once_and_cached_per_format():
+    """数据工具按 format 参数返回文本表格、JSON 记录或按列数组，每种格式的结果分别缓存"""
+    calls = []
+
+    def history(symbol):
+        calls.append(symbol)
+        frame = pd.DataFrame({
+            "日期": pd.to_datetime(["2025-01-02", "2025-01-03"]),
+            "收盘": [10.5, float("nan")],
+            "成交量": [1200, 1300],
+        })
+        return [DataResult(f"股票 {symbol} 历史数据", frame=frame)]
+
+    registry = ToolRegistry([ToolSpec("history", "历史", history, properties={"symbol": {"type": "string"}},
+                                      required=["symbol"], cache_ttl=60, uses_data_modules=False,
+                                      output_formats=True)])
+    server = FixedMCPServer(max_concurrency=2, registry=registry)
+
+    def text(arguments):
+        return _call(server, "history", arguments)["result"]["content"][0]["text"]
+
+    plain = text({"symbol": "000001"})
+    records = json.loads(text({"symbol": "000001", "format": "json"}))
+    columnar = json.loads(text({"symbol": "000001", "format": "columnar"}))
+    text({"symbol": "000001", "format": "columnar"})
+    invalid = _call(server, "history", {"symbol": "000001", "format": "xml"})
+    server.shutdown()
+
+    assert plain.startswith("股票 000001 历史数据:\n") and "10.5" in plain
+    assert records["records"][0] == {"日期": "2025-01-02T00:00:00", "收盘": 10.5, "成交量": 1200}
+    assert records["records"][1]["收盘"] is None
+    assert columnar == {
+        "title": "股票 000001 历史数据",
+        "columns": ["日期", "收盘", "成交量"],
+        "data": [["2025-01-02T00:00:00", "2025-01-03T00:00:00"], [10.5, None], [1200, 1300]],
+    }
+    assert calls == ["000001"] * 3
+    assert "Unsupported format 'xml'" in invalid["error"]["message"]
+    schema = registry.get("history").schema()["inputSchema"]["properties"]
+    assert schema["format"]["enum"] == ["text", "json", "columnar"]
+    assert "format" not in TOOL_REGISTRY.get("echo").schema()["inputSchema"]["properties"]
+
+
+def test_plain_text_results_wrapped_in_json_formats():
+    """没有结构化数据的结果（说明文字、错误信息）在 JSON 格式下包装为 {"text": ...}"""
+    registry = ToolRegistry([ToolSpec("note", "说明", lambda: "暂无数据", uses_data_modules=False,
+                                      output_formats=True)])
+    server = FixedMCPServer(max_concurrency=1, registry=registry)
+    response = _call(server, "note", {"format": "json"})
+    server.shutdown()
+    assert json.loads(response["result"]["content"][0]["text"]) == {"text": "暂无数据"}